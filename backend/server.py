@@ -1,20 +1,37 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Request
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, UploadFile, File, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter, ValidationError
+from typing import List, Optional, Dict, Any, Callable, Awaitable
 import uuid
 from uuid import uuid4
 from datetime import datetime, timezone, timedelta
+from email.utils import format_datetime, parsedate_to_datetime
 import shutil
 import base64
-from collections import defaultdict
+import asyncio
+import hashlib
+import json
+import socket
+import csv
+import io
+import zlib
+import math
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import user_agents
+import maxminddb
+import numpy as np
 import httpx
 
 
@@ -42,6 +59,768 @@ app.mount("/api/uploads", StaticFiles(directory=str(UPLOADS_DIR)), name="api_upl
 api_router = APIRouter(prefix="/api")
 
 
+# ==================== CACHE INVALIDATION BUS ====================
+
+# Collections whose content is cached or versioned by the API workers
+CONTENT_COLLECTIONS = [
+    "drawer_cards",
+    "team_members",
+    "partners",
+    "faq_items",
+    "utilities",
+    "navigation_items",
+    "hero_buttons",
+    "utility_nav_buttons",
+    "evolution_levels",
+    "evolution_badges",
+    "platform_settings",
+    "footer_settings",
+    "hero_settings",
+    "about_settings",
+    "community_settings",
+    "roadmap_settings",
+    "utilities_settings",
+    "cookie_consent_settings",
+]
+
+# "auto" uses change streams on a replica set and polling on a standalone mongod
+CACHE_INVALIDATION_MODE = os.environ.get('CACHE_INVALIDATION_MODE', 'auto')
+CACHE_POLL_INTERVAL_SECONDS = float(os.environ.get('CACHE_POLL_INTERVAL_SECONDS', '2'))
+# Part of every ETag, so a deploy that changes response shapes invalidates client caches.
+# Defaults to a hash of this file; set it to the release (e.g. git commit) to cover other changes.
+BUILD_ID = os.environ.get('BUILD_ID') or hashlib.sha256(Path(__file__).read_bytes()).hexdigest()[:12]
+
+class CacheInvalidationBus:
+    """
+    Keeps the per-worker caches consistent across uvicorn workers.
+    
+    Every content write bumps a version document in `cache_versions` (one per
+    collection). Each worker then learns about writes made by other workers either
+    from a change stream over the content collections (replica set) or by polling
+    the version documents (standalone mongod), and drops only the cache entries of
+    the affected collection. With change streams, writes that bypassed the API
+    get their version bumped by the first worker that sees them.
+    """
+    
+    def __init__(self, collections: List[str]):
+        self.collections = list(collections)
+        self.mode: Optional[str] = None
+        self._listeners: List[Callable[[str], None]] = []
+        self._versions: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+    
+    def subscribe(self, listener: Callable[[str], None]):
+        """Register a callback invoked with the name of every changed collection"""
+        self._listeners.append(listener)
+    
+    def dispatch(self, collection_name: str):
+        for listener in self._listeners:
+            try:
+                listener(collection_name)
+            except Exception as e:
+                logger.error(f"Cache invalidation listener failed for {collection_name}: {e}")
+    
+    async def publish(self, collection_name: str):
+        """Record a local write: bump the shared version and drop local cache entries"""
+        # Bump first so anything reloaded after the dispatch sees the new version
+        await db.cache_versions.update_one(
+            {"_id": collection_name},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        self.dispatch(collection_name)
+    
+    async def start(self):
+        """Pick the invalidation mode and start watching for writes from other workers"""
+        mode = CACHE_INVALIDATION_MODE
+        if mode == "auto":
+            try:
+                hello = await client.admin.command("hello")
+                is_replica_set = "setName" in hello or hello.get("msg") == "isdbgrid"
+            except Exception as e:
+                logger.warning(f"Could not detect MongoDB topology, falling back to polling: {e}")
+                is_replica_set = False
+            mode = "change_stream" if is_replica_set else "poll"
+        
+        # Record the current versions so only later writes trigger invalidation
+        try:
+            await self._poll_versions_once(dispatch=False)
+        except Exception as e:
+            logger.warning(f"Could not load cache versions: {e}")
+        self.mode = mode
+        runner = self._watch_changes if mode == "change_stream" else self._poll_versions
+        self._task = asyncio.create_task(runner())
+        logger.info(f"Cache invalidation bus started in {mode} mode")
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _watch_changes(self):
+        # Version bumps are watched too, so validators derived from them are refreshed
+        pipeline = [{"$match": {"ns.coll": {"$in": self.collections + ["cache_versions"]}}}]
+        while True:
+            try:
+                async with db.watch(pipeline) as stream:
+                    # Writes may have been missed while the stream was down
+                    for collection_name in self.collections:
+                        self.dispatch(collection_name)
+                    async for change in stream:
+                        collection_name = change["ns"]["coll"]
+                        if collection_name == "cache_versions":
+                            collection_name = change["documentKey"]["_id"]
+                        else:
+                            await self._bump_unpublished(collection_name, change.get("wallTime"))
+                        self.dispatch(collection_name)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Change stream failed, switching to version polling: {e}")
+                self.mode = "poll"
+                await self._poll_versions()
+                return
+    
+    async def _bump_unpublished(self, collection_name: str, written_at: Optional[datetime]):
+        """
+        Bump the version for a write that bypassed publish (seeders, manual edits).
+        Skipped when the version was already bumped after the write, so API writes
+        and the other workers seeing the same change don't bump it again.
+        """
+        # wallTime needs MongoDB 6.0; older servers bump on every content change
+        written_at = written_at or datetime.now(timezone.utc)
+        try:
+            await db.cache_versions.update_one(
+                {
+                    "_id": collection_name,
+                    "$or": [{"updated_at": {"$lt": written_at}}, {"updated_at": {"$exists": False}}]
+                },
+                {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The version document exists and is newer than the write
+            pass
+        except Exception as e:
+            logger.warning(f"Could not bump cache version for {collection_name}: {e}")
+    
+    async def _poll_versions(self):
+        while True:
+            await asyncio.sleep(CACHE_POLL_INTERVAL_SECONDS)
+            try:
+                await self._poll_versions_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache version poll failed: {e}")
+    
+    async def _poll_versions_once(self, dispatch: bool = True):
+        docs = await db.cache_versions.find(
+            {"_id": {"$in": self.collections}}
+        ).to_list(len(self.collections))
+        for doc in docs:
+            collection_name, version = doc["_id"], doc.get("version", 0)
+            if self._versions.get(collection_name) != version:
+                self._versions[collection_name] = version
+                if dispatch:
+                    self.dispatch(collection_name)
+
+
+invalidation_bus = CacheInvalidationBus(CONTENT_COLLECTIONS)
+
+
+# ==================== SETTINGS STORE ====================
+
+class SettingsStore:
+    """
+    In-process read-through cache for singleton settings documents.
+    
+    Reads are served from memory after the first load. A missing document is
+    created from its defaults with one atomic upsert, and every write goes
+    through the store so the cached copy is replaced by the updated document.
+    """
+    
+    def __init__(self):
+        self._definitions: Dict[str, Dict[str, Any]] = {}
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._generations: Dict[str, int] = defaultdict(int)
+    
+    def register(self, name: str, query: Dict[str, Any], defaults: Callable[[], Dict[str, Any]]):
+        """Register a settings collection, the query selecting its document and a defaults factory"""
+        self._definitions[name] = {"query": query, "defaults": defaults}
+        self._locks[name] = asyncio.Lock()
+    
+    @property
+    def names(self) -> List[str]:
+        return list(self._definitions)
+    
+    async def get(self, name: str) -> Dict[str, Any]:
+        """Get a settings document, loading (and creating it from defaults) on first access"""
+        cached = self._cache.get(name)
+        if cached is None:
+            async with self._locks[name]:
+                cached = self._cache.get(name)
+                if cached is None:
+                    generation = self._generations[name]
+                    cached = await self._find_and_modify(name, {})
+                    # Don't cache a document that was invalidated while it was loading
+                    if generation == self._generations[name]:
+                        self._cache[name] = cached
+        return dict(cached)
+    
+    async def update(self, name: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Set fields on a settings document in one round-trip and return the updated document"""
+        return await self.apply(name, {"$set": fields} if fields else {})
+    
+    async def apply(
+        self,
+        name: str,
+        update: Dict[str, Any],
+        query: Optional[Dict[str, Any]] = None,
+        upsert: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Apply raw update operators to a settings document and cache the result.
+        Defaults are only written when the document is created, skipping any
+        top-level field the update itself touches. Returns None when nothing matched.
+        """
+        doc = await self._find_and_modify(name, update, query, upsert)
+        if doc is None:
+            return None
+        await invalidation_bus.publish(name)
+        self._cache[name] = doc
+        return dict(doc)
+    
+    async def _find_and_modify(
+        self,
+        name: str,
+        update: Dict[str, Any],
+        query: Optional[Dict[str, Any]] = None,
+        upsert: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        definition = self._definitions[name]
+        update = dict(update)
+        if upsert:
+            touched = {path.split(".")[0] for fields in update.values() for path in fields}
+            defaults = {k: v for k, v in definition["defaults"]().items() if k not in touched}
+            if defaults:
+                update["$setOnInsert"] = defaults
+        
+        return await db[name].find_one_and_update(
+            {**definition["query"], **(query or {})},
+            update,
+            projection={"_id": False},
+            upsert=upsert,
+            return_document=ReturnDocument.AFTER
+        )
+    
+    def invalidate(self, name: Optional[str] = None):
+        """Drop one cached settings document, or all of them"""
+        names = self.names if name is None else [n for n in [name] if n in self._definitions]
+        for settings_name in names:
+            self._generations[settings_name] += 1
+            self._cache.pop(settings_name, None)
+
+
+settings_store = SettingsStore()
+invalidation_bus.subscribe(settings_store.invalidate)
+
+
+# ==================== CONDITIONAL GET ====================
+
+class ContentVersions:
+    """
+    Per-worker copy of the shared collection versions stored in `cache_versions`.
+    
+    Versions are loaded on first use and dropped by the invalidation bus, so
+    revalidation requests are answered without reading the content collections.
+    
+    Versions move on API writes (invalidation_bus.publish), on any write seen
+    by the change stream, and when a seeder bumps them. On a standalone mongod
+    a manual DB edit keeps the old versions, and clients get 304 for the old
+    content until the next API write to that collection or the next deploy
+    (BUILD_ID).
+    """
+    
+    def __init__(self):
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._generation = 0
+    
+    async def get(self, names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get version and last write time for each collection"""
+        missing = [name for name in names if name not in self._cache]
+        if missing:
+            generation = self._generation
+            versions = await self._load(missing)
+            if generation == self._generation:
+                self._cache.update(versions)
+            else:
+                # Invalidated while loading: cached names may be gone or outdated
+                # too, so answer from a fresh read of all of them and cache nothing
+                return await self._load(names)
+        return {name: self._cache[name] for name in names}
+    
+    async def _load(self, names: List[str]) -> Dict[str, Dict[str, Any]]:
+        docs = await db.cache_versions.find({"_id": {"$in": names}}).to_list(len(names))
+        loaded = {doc["_id"]: doc for doc in docs}
+        versions = {}
+        for name in names:
+            doc = loaded.get(name, {})
+            updated_at = doc.get("updated_at")
+            if updated_at is not None and updated_at.tzinfo is None:
+                updated_at = updated_at.replace(tzinfo=timezone.utc)
+            versions[name] = {"version": doc.get("version", 0), "updated_at": updated_at}
+        return versions
+    
+    def invalidate(self, name: Optional[str] = None):
+        self._generation += 1
+        if name is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(name, None)
+
+
+content_versions = ContentVersions()
+invalidation_bus.subscribe(content_versions.invalidate)
+
+
+class NotModified(Exception):
+    """Raised by conditional GET dependencies to answer 304 before the handler runs"""
+    
+    def __init__(self, headers: Dict[str, str]):
+        self.headers = headers
+
+
+@app.exception_handler(NotModified)
+async def not_modified_handler(request: Request, exc: NotModified):
+    return Response(status_code=304, headers=exc.headers)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check whether the request's If-None-Match header matches the given ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """
+    Evaluate the request's validators. If-Modified-Since is only consulted when
+    the client sent no If-None-Match, as required by RFC 9110.
+    """
+    if "if-none-match" in request.headers:
+        return etag_matches(request, etag)
+    header = request.headers.get("if-modified-since")
+    if not header or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have second precision
+    return last_modified.replace(microsecond=0) <= since
+
+async def content_validators(request: Request, collection_names: List[str]):
+    """
+    Build ETag/Last-Modified headers for a request from the versions of the
+    collections it reads. Returns the headers and the last write time.
+    """
+    versions = await content_versions.get(collection_names)
+    key = "|".join(
+        [BUILD_ID, request.url.path, str(sorted(request.query_params.multi_items()))]
+        + [f"{name}:{versions[name]['version']}" for name in collection_names]
+    )
+    # Weak: the ETag identifies content versions, not the serialized bytes
+    headers = {
+        "ETag": f'W/"{hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]}"',
+        "Cache-Control": "no-cache",
+    }
+    modified = [v["updated_at"] for v in versions.values() if v["updated_at"] is not None]
+    last_modified = max(modified) if modified else None
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    return headers, last_modified
+
+def conditional_get(*collection_names: str):
+    """
+    Route dependency adding validators derived from the versions of the given
+    collections. Requests whose validators match get 304 before the handler runs.
+    """
+    async def check_validators(request: Request, response: Response):
+        headers, last_modified = await content_validators(request, list(collection_names))
+        if is_not_modified(request, headers["ETag"], last_modified):
+            raise NotModified(headers)
+        response.headers.update(headers)
+    return check_validators
+
+
+# ==================== ORDERING ====================
+
+# Items of ordered collections sort by a fractional key instead of their integer `order`.
+# Keys are strings over ORDER_KEY_DIGITS compared lexicographically, so a key can always
+# be generated between two neighbours and moving an item only rewrites that item.
+ORDER_KEY = "order_key"
+# Order keys stay internal: responses expose positions as `order`
+CONTENT_PROJECTION = {"_id": 0, ORDER_KEY: 0}
+ORDER_KEY_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+def _order_key_midpoint(a: str, b: Optional[str]) -> str:
+    zero = ORDER_KEY_DIGITS[0]
+    if b is not None:
+        # Keep the common prefix and split the remainder
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else zero) == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _order_key_midpoint(a[n:], b[n:])
+    
+    digit_a = ORDER_KEY_DIGITS.index(a[0]) if a else 0
+    digit_b = ORDER_KEY_DIGITS.index(b[0]) if b is not None else len(ORDER_KEY_DIGITS)
+    if digit_b - digit_a > 1:
+        return ORDER_KEY_DIGITS[(digit_a + digit_b + 1) // 2]
+    if b is not None and len(b) > 1:
+        return b[:1]
+    return ORDER_KEY_DIGITS[digit_a] + _order_key_midpoint(a[1:], None)
+
+def order_key_between(before: Optional[str], after: Optional[str]) -> str:
+    """
+    Generate a key sorting strictly between two keys.
+    None stands for the start (before) or the end (after) of the list.
+    """
+    lower = before or ""
+    if after is not None and lower >= after:
+        raise ValueError(f"Order key {before!r} does not sort before {after!r}")
+    return _order_key_midpoint(lower, after)
+
+def order_key_sequence(count: int) -> List[str]:
+    """Generate `count` evenly spaced, strictly increasing keys"""
+    base = len(ORDER_KEY_DIGITS)
+    width = 1
+    while base ** width <= count:
+        width += 1
+    span = base ** width
+    
+    keys = []
+    for i in range(1, count + 1):
+        value = i * span // (count + 1)
+        digits = []
+        for _ in range(width):
+            value, digit = divmod(value, base)
+            digits.append(ORDER_KEY_DIGITS[digit])
+        # Trailing zero digits don't change the position of a key
+        keys.append("".join(reversed(digits)).rstrip(ORDER_KEY_DIGITS[0]))
+    return keys
+
+def assign_order_keys(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Give new items (e.g. seeded defaults) keys following their integer `order`"""
+    ordered = sorted(items, key=lambda item: item.get("order", 0))
+    for item, key in zip(ordered, order_key_sequence(len(ordered))):
+        item[ORDER_KEY] = key
+    return items
+
+def number_positions(items: List[Dict[str, Any]], group_field: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Expose the position of each item (sorted by key) as its `order`, counted
+    from 0, per `group_field` value when given.
+    """
+    positions = defaultdict(int)
+    for item in items:
+        group = item.get(group_field) if group_field else None
+        item["order"] = positions[group]
+        positions[group] += 1
+    return items
+
+
+class MoveRequest(BaseModel):
+    after_id: Optional[str] = None  # Item that should directly precede the moved item
+    before_id: Optional[str] = None  # Item that should directly follow the moved item
+
+
+class OrderedCollection:
+    """
+    Ordering operations for a collection sorted by ORDER_KEY.
+    
+    Integer positions sent by the admin panel (`order` on create/update) are
+    translated into a key between the neighbours at that position. Moves
+    write only the moved item and full reorders are a single bulk_write.
+    `scope_field` restricts positions to items sharing its value (e.g. a
+    partner category); keys themselves are global.
+    """
+    
+    PROJECTION = {"_id": False, "id": True, ORDER_KEY: True}
+    
+    def __init__(self, name: str, scope_field: Optional[str] = None):
+        self.name = name
+        self.scope_field = scope_field
+    
+    @property
+    def collection(self):
+        return db[self.name]
+    
+    async def key_for_position(
+        self,
+        position: Optional[int] = None,
+        exclude_id: Optional[str] = None,
+        scope: Any = None,
+        retry: bool = True
+    ) -> str:
+        """Key placing an item at a position (None appends it at the end)"""
+        query: Dict[str, Any] = {}
+        # Appending after the globally last item also appends within any scope
+        if self.scope_field and position is not None:
+            query[self.scope_field] = scope
+        if exclude_id:
+            query["id"] = {"$ne": exclude_id}
+        
+        if position is None:
+            last = await self.collection.find_one(query, self.PROJECTION, sort=[(ORDER_KEY, -1)])
+            before, after = (last or {}).get(ORDER_KEY), None
+        elif position <= 0:
+            first = await self.collection.find_one(query, self.PROJECTION, sort=[(ORDER_KEY, 1)])
+            before, after = None, (first or {}).get(ORDER_KEY)
+        else:
+            neighbours = await self.collection.find(query, self.PROJECTION).sort(
+                ORDER_KEY, 1
+            ).skip(position - 1).limit(2).to_list(2)
+            if not neighbours:
+                return await self.key_for_position(None, exclude_id, scope)
+            before = neighbours[0].get(ORDER_KEY)
+            after = neighbours[1].get(ORDER_KEY) if len(neighbours) > 1 else None
+        
+        try:
+            return order_key_between(before, after)
+        except ValueError:
+            if not retry:
+                raise
+            # Duplicate or missing keys (e.g. concurrent appends): respace and retry once
+            await self.rebalance()
+            return await self.key_for_position(position, exclude_id, scope, retry=False)
+    
+    async def move(
+        self,
+        item_id: str,
+        after_id: Optional[str] = None,
+        before_id: Optional[str] = None,
+        retry: bool = True
+    ) -> bool:
+        """
+        Move an item directly after `after_id` and/or before `before_id`, writing only
+        the moved item. Without neighbours the item moves to the end.
+        Returns False when the item or a neighbour doesn't exist.
+        """
+        neighbour_ids = [i for i in (after_id, before_id) if i]
+        keys = {}
+        if neighbour_ids:
+            docs = await self.collection.find(
+                {"id": {"$in": neighbour_ids}}, self.PROJECTION
+            ).to_list(len(neighbour_ids))
+            keys = {doc["id"]: doc.get(ORDER_KEY) for doc in docs}
+            if len(keys) != len(set(neighbour_ids)):
+                return False
+        
+        others = {"id": {"$ne": item_id}}
+        if after_id and before_id:
+            before, after = keys[after_id], keys[before_id]
+        elif after_id:
+            following = await self.collection.find_one(
+                {**others, ORDER_KEY: {"$gt": keys[after_id]}}, self.PROJECTION, sort=[(ORDER_KEY, 1)]
+            )
+            before, after = keys[after_id], (following or {}).get(ORDER_KEY)
+        elif before_id:
+            preceding = await self.collection.find_one(
+                {**others, ORDER_KEY: {"$lt": keys[before_id]}}, self.PROJECTION, sort=[(ORDER_KEY, -1)]
+            )
+            before, after = (preceding or {}).get(ORDER_KEY), keys[before_id]
+        else:
+            last = await self.collection.find_one(others, self.PROJECTION, sort=[(ORDER_KEY, -1)])
+            before, after = (last or {}).get(ORDER_KEY), None
+        
+        try:
+            key = order_key_between(before, after)
+        except ValueError:
+            if not retry:
+                raise HTTPException(status_code=400, detail="after_id must come before before_id")
+            await self.rebalance()
+            return await self.move(item_id, after_id, before_id, retry=False)
+        
+        result = await self.collection.update_one({"id": item_id}, {"$set": {ORDER_KEY: key}})
+        if result.matched_count == 0:
+            return False
+        await invalidation_bus.publish(self.name)
+        return True
+    
+    async def reorder(self, order_data: List[Dict[str, Any]], retry: bool = True):
+        """
+        Apply a list of {id, order} in one bulk_write. The listed items swap
+        their existing keys, so other items (and other scopes) keep their place.
+        """
+        ids = [item["id"] for item in sorted(order_data, key=lambda item: item.get("order", 0))]
+        docs = await self.collection.find({"id": {"$in": ids}}, self.PROJECTION).to_list(len(ids))
+        known = {doc["id"]: doc.get(ORDER_KEY) for doc in docs}
+        ids = [item_id for item_id in dict.fromkeys(ids) if item_id in known]
+        if not ids:
+            return
+        
+        keys = sorted(key for key in known.values() if key)
+        if len(set(keys)) != len(ids):
+            if retry and len(ids) < await self.collection.count_documents({}):
+                await self.rebalance()
+                return await self.reorder(order_data, retry=False)
+            keys = order_key_sequence(len(ids))
+        
+        await self.collection.bulk_write(
+            [UpdateOne({"id": item_id}, {"$set": {ORDER_KEY: key}}) for item_id, key in zip(ids, keys)],
+            ordered=False
+        )
+        await invalidation_bus.publish(self.name)
+    
+    async def rebalance(self):
+        """Respace the keys of all items, keeping their current order"""
+        docs = await self.collection.find({}, {"_id": True, ORDER_KEY: True, "order": True}).sort(
+            [(ORDER_KEY, 1), ("order", 1), ("_id", 1)]
+        ).to_list(None)
+        if not docs:
+            return
+        await self.collection.bulk_write(
+            [UpdateOne({"_id": doc["_id"]}, {"$set": {ORDER_KEY: key}})
+             for doc, key in zip(docs, order_key_sequence(len(docs)))],
+            ordered=False
+        )
+        await invalidation_bus.publish(self.name)
+    
+    async def backfill(self):
+        """Give keys to items created before ordering keys existed, following their `order`"""
+        missing = await self.collection.find(
+            {ORDER_KEY: {"$exists": False}}, {"_id": True, "order": True}
+        ).sort([("order", 1), ("_id", 1)]).to_list(None)
+        if not missing:
+            return
+        
+        last = await self.collection.find_one(
+            {ORDER_KEY: {"$exists": True}}, self.PROJECTION, sort=[(ORDER_KEY, -1)]
+        )
+        if last is None:
+            keys = order_key_sequence(len(missing))
+        else:
+            keys, key = [], last.get(ORDER_KEY)
+            for _ in missing:
+                key = order_key_between(key, None)
+                keys.append(key)
+        
+        await self.collection.bulk_write(
+            [UpdateOne({"_id": doc["_id"]}, {"$set": {ORDER_KEY: key}}) for doc, key in zip(missing, keys)],
+            ordered=False
+        )
+        await invalidation_bus.publish(self.name)
+        logger.info(f"Assigned order keys to {len(missing)} items in {self.name}")
+    
+    async def position_of(self, item: Dict[str, Any]) -> int:
+        """Position of an item among the items of its scope"""
+        query: Dict[str, Any] = {ORDER_KEY: {"$lt": item.get(ORDER_KEY) or ""}}
+        if self.scope_field:
+            query[self.scope_field] = item.get(self.scope_field)
+        return await self.collection.count_documents(query)
+
+
+ordered_collections: Dict[str, OrderedCollection] = {
+    name: OrderedCollection(name, scope_field="category" if name == "partners" else None)
+    for name in [
+        "drawer_cards",
+        "team_members",
+        "partners",
+        "faq_items",
+        "utilities",
+        "navigation_items",
+        "hero_buttons",
+        "utility_nav_buttons",
+        "evolution_levels",
+        "evolution_badges",
+    ]
+}
+
+
+# ==================== REPOSITORIES ====================
+
+class Repository:
+    """
+    Single round-trip writes for a collection of documents keyed by `id`.
+    
+    Updates go through find_one_and_update and return the updated document,
+    creates return the document that was inserted instead of reading it back.
+    Writes to cached content collections are published to the invalidation bus.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+    
+    @property
+    def collection(self):
+        return db[self.name]
+    
+    async def _publish(self):
+        if self.name in invalidation_bus.collections:
+            await invalidation_bus.publish(self.name)
+    
+    async def find(self, item_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"id": item_id}, CONTENT_PROJECTION)
+    
+    async def create(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Insert a document and return it as stored"""
+        await self.collection.insert_one(doc)
+        doc.pop("_id", None)
+        await self._publish()
+        return {key: value for key, value in doc.items() if key != ORDER_KEY}
+    
+    async def update(self, item_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Set fields on a document and return the updated document, or None when
+        it doesn't exist. Without fields the current document is returned.
+        """
+        if not fields:
+            return await self.find(item_id)
+        doc = await self.collection.find_one_and_update(
+            {"id": item_id},
+            {"$set": fields},
+            projection=CONTENT_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if doc is not None:
+            await self._publish()
+        return doc
+
+
+repositories: Dict[str, Repository] = {
+    name: Repository(name)
+    for name in [
+        "drawer_cards",
+        "team_members",
+        "partners",
+        "faq_items",
+        "utilities",
+        "navigation_items",
+        "hero_buttons",
+        "utility_nav_buttons",
+        "evolution_levels",
+        "evolution_badges",
+        "p2p_deals",
+        "arena_predictions",
+        "influence_entities",
+        "earlyland_opportunities",
+    ]
+}
+
+
 # Define Models
 class StatusCheck(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -697,10 +1476,11 @@ class UtilitiesSectionSettingsUpdate(BaseModel):
     details_label_en: Optional[str] = None
 
 
-@api_router.get("/drawer-cards", response_model=List[DrawerCard])
+@api_router.get("/drawer-cards", response_model=List[DrawerCard], dependencies=[Depends(conditional_get("drawer_cards"))])
 async def get_drawer_cards():
     """Get all drawer cards sorted by order"""
-    cards = await db.drawer_cards.find({}, {"_id": 0}).sort("order", 1).to_list(100)
+    cards = await db.drawer_cards.find({}, CONTENT_PROJECTION).sort(ORDER_KEY, 1).to_list(100)
+    number_positions(cards)
     for card in cards:
         if isinstance(card.get('created_at'), str):
             card['created_at'] = datetime.fromisoformat(card['created_at'])
@@ -708,12 +1488,13 @@ async def get_drawer_cards():
             card['updated_at'] = datetime.fromisoformat(card['updated_at'])
     return cards
 
-@api_router.get("/drawer-cards/{card_id}", response_model=DrawerCard)
+@api_router.get("/drawer-cards/{card_id}", response_model=DrawerCard, dependencies=[Depends(conditional_get("drawer_cards"))])
 async def get_drawer_card(card_id: str):
     """Get a single drawer card by ID"""
     card = await db.drawer_cards.find_one({"id": card_id}, {"_id": 0})
     if not card:
         raise HTTPException(status_code=404, detail="Card not found")
+    card["order"] = await ordered_collections["drawer_cards"].position_of(card)
     return card
 
 @api_router.post("/drawer-cards", response_model=DrawerCard)
@@ -723,21 +1504,26 @@ async def create_drawer_card(card_data: DrawerCardCreate):
     doc = card.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     doc['updated_at'] = doc['updated_at'].isoformat()
-    await db.drawer_cards.insert_one(doc)
+    # An explicit order is the position to insert at, otherwise the card is appended
+    doc[ORDER_KEY] = await ordered_collections["drawer_cards"].key_for_position(
+        card_data.order if "order" in card_data.model_fields_set else None
+    )
+    await repositories["drawer_cards"].create(doc)
     return card
 
 @api_router.put("/drawer-cards/{card_id}", response_model=DrawerCard)
 async def update_drawer_card(card_id: str, card_data: DrawerCardUpdate):
     """Update an existing drawer card"""
-    existing = await db.drawer_cards.find_one({"id": card_id})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Card not found")
-    
     update_data = {k: v for k, v in card_data.model_dump().items() if v is not None}
     update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+    if "order" in update_data:
+        update_data[ORDER_KEY] = await ordered_collections["drawer_cards"].key_for_position(
+            update_data["order"], exclude_id=card_id
+        )
     
-    await db.drawer_cards.update_one({"id": card_id}, {"$set": update_data})
-    updated = await db.drawer_cards.find_one({"id": card_id}, {"_id": 0})
+    updated = await repositories["drawer_cards"].update(card_id, update_data)
+    if not updated:
+        raise HTTPException(status_code=404, detail="Card not found")
     return updated
 
 @api_router.delete("/drawer-cards/{card_id}")
@@ -746,18 +1532,22 @@ async def delete_drawer_card(card_id: str):
     result = await db.drawer_cards.delete_one({"id": card_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Card not found")
+    await invalidation_bus.publish("drawer_cards")
     return {"message": "Card deleted successfully"}
 
 @api_router.post("/drawer-cards/reorder")
 async def reorder_drawer_cards(card_orders: List[dict]):
     """Reorder drawer cards. Expects list of {id: str, order: int}"""
-    for item in card_orders:
-        await db.drawer_cards.update_one(
-            {"id": item["id"]}, 
-            {"$set": {"order": item["order"], "updated_at": datetime.now(timezone.utc).isoformat()}}
-        )
+    await ordered_collections["drawer_cards"].reorder(card_orders)
     return {"message": "Cards reordered successfully"}
 
+@api_router.post("/drawer-cards/{card_id}/move")
+async def move_drawer_card(card_id: str, move: MoveRequest):
+    """Move a drawer card between two neighbours, rewriting only the moved card"""
+    if not await ordered_collections["drawer_cards"].move(card_id, move.after_id, move.before_id):
+        raise HTTPException(status_code=404, detail="Card not found")
+    return {"message": "Card moved successfully"}
+
 
 # ==================== IMAGE UPLOAD API ====================
 
@@ -802,12 +1592,13 @@ async def upload_image(request: Request, file: UploadFile = File(...)):
 
 # ==================== TEAM MEMBERS API ====================
 
-@api_router.get("/team-members", response_model=List[TeamMember])
+@api_router.get("/team-members", response_model=List[TeamMember], dependencies=[Depends(conditional_get("team_members"))])
 async def get_team_members():
     """Get all team members"""
     collection = db["team_members"]
     team_members = []
-    async for member in collection.find({}, {"_id": 0}).sort("order", 1):
+    async for member in collection.find({}, CONTENT_PROJECTION).sort(ORDER_KEY, 1):
+        member["order"] = len(team_members)
         team_member = TeamMember(**member)
         team_members.append(team_member)
     return team_members
@@ -815,37 +1606,39 @@ async def get_team_members():
 @api_router.post("/team-members", response_model=TeamMember)
 async def create_team_member(member_data: TeamMemberCreate):
     """Create a new team member"""
-    collection = db["team_members"]
     member = TeamMember(**member_data.model_dump())
-    await collection.insert_one(member.model_dump())
+    doc = member.model_dump()
+    doc[ORDER_KEY] = await ordered_collections["team_members"].key_for_position(
+        member_data.order if "order" in member_data.model_fields_set else None
+    )
+    await repositories["team_members"].create(doc)
     return member
 
-@api_router.get("/team-members/{member_id}", response_model=TeamMember)
+@api_router.get("/team-members/{member_id}", response_model=TeamMember, dependencies=[Depends(conditional_get("team_members"))])
 async def get_team_member(member_id: str):
     """Get a single team member by ID"""
     collection = db["team_members"]
     member = await collection.find_one({"id": member_id}, {"_id": 0})
     if not member:
         raise HTTPException(status_code=404, detail="Team member not found")
+    member["order"] = await ordered_collections["team_members"].position_of(member)
     return TeamMember(**member)
 
 @api_router.put("/team-members/{member_id}", response_model=TeamMember)
 async def update_team_member(member_id: str, update_data: TeamMemberUpdate):
     """Update a team member"""
-    collection = db["team_members"]
-    
     # Build update dict with only provided fields
     update_dict = {k: v for k, v in update_data.model_dump(exclude_unset=True).items() if v is not None}
     if update_dict:
         update_dict["updated_at"] = datetime.now(timezone.utc)
-        result = await collection.update_one(
-            {"id": member_id},
-            {"$set": update_dict}
-        )
-        if result.matched_count == 0:
-            raise HTTPException(status_code=404, detail="Team member not found")
+        if "order" in update_dict:
+            update_dict[ORDER_KEY] = await ordered_collections["team_members"].key_for_position(
+                update_dict["order"], exclude_id=member_id
+            )
     
-    updated_member = await collection.find_one({"id": member_id}, {"_id": 0})
+    updated_member = await repositories["team_members"].update(member_id, update_dict)
+    if not updated_member:
+        raise HTTPException(status_code=404, detail="Team member not found")
     return TeamMember(**updated_member)
 
 @api_router.delete("/team-members/{member_id}")
@@ -855,51 +1648,39 @@ async def delete_team_member(member_id: str):
     result = await collection.delete_one({"id": member_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Team member not found")
+    await invalidation_bus.publish("team_members")
     return {"message": "Team member deleted successfully"}
 
 @api_router.post("/team-members/reorder")
 async def reorder_team_members(order_data: List[dict]):
     """Reorder team members"""
-    collection = db["team_members"]
-    for item in order_data:
-        await collection.update_one(
-            {"id": item["id"]},
-            {"$set": {"order": item["order"]}}
-        )
+    await ordered_collections["team_members"].reorder(order_data)
     return {"message": "Team members reordered successfully"}
 
+@api_router.post("/team-members/{member_id}/move")
+async def move_team_member(member_id: str, move: MoveRequest):
+    """Move a team member between two neighbours, rewriting only the moved member"""
+    if not await ordered_collections["team_members"].move(member_id, move.after_id, move.before_id):
+        raise HTTPException(status_code=404, detail="Team member not found")
+    return {"message": "Team member moved successfully"}
+
 
 # ==================== PLATFORM SETTINGS API ====================
 
-@api_router.get("/platform-settings")
+settings_store.register(
+    "platform_settings",
+    {"id": "platform_settings"},
+    lambda: PlatformSettings().model_dump(mode="json")
+)
+
+@api_router.get("/platform-settings", dependencies=[Depends(conditional_get("platform_settings"))])
 async def get_platform_settings():
     """Get platform settings or return defaults"""
-    collection = db["platform_settings"]
-    settings = await collection.find_one({"id": "platform_settings"}, {"_id": 0})
-    
-    if not settings:
-        # Return default settings
-        default = PlatformSettings()
-        doc = default.model_dump()
-        doc['updated_at'] = doc['updated_at'].isoformat()
-        await collection.insert_one(doc)
-        settings = await collection.find_one({"id": "platform_settings"}, {"_id": 0})
-    
-    return settings
+    return await settings_store.get("platform_settings")
 
 @api_router.put("/platform-settings")
 async def update_platform_settings(update_data: PlatformSettingsUpdate):
     """Update platform settings"""
-    collection = db["platform_settings"]
-    
-    # Ensure settings exist
-    existing = await collection.find_one({"id": "platform_settings"})
-    if not existing:
-        default = PlatformSettings()
-        doc = default.model_dump()
-        doc['updated_at'] = doc['updated_at'].isoformat()
-        await collection.insert_one(doc)
-    
     # Build update dict
     update_dict = {}
     for key, value in update_data.model_dump(exclude_unset=True).items():
@@ -913,13 +1694,8 @@ async def update_platform_settings(update_data: PlatformSettingsUpdate):
     
     if update_dict:
         update_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-        await collection.update_one(
-            {"id": "platform_settings"},
-            {"$set": update_dict}
-        )
     
-    updated = await collection.find_one({"id": "platform_settings"}, {"_id": 0})
-    return updated
+    return await settings_store.update("platform_settings", update_dict)
 
 @api_router.patch("/platform-settings/stat/{stat_name}")
 async def update_single_stat(stat_name: str, stat_data: PlatformStat):
@@ -927,68 +1703,64 @@ async def update_single_stat(stat_name: str, stat_data: PlatformStat):
     if stat_name not in ['community', 'visits', 'projects', 'alerts']:
         raise HTTPException(status_code=400, detail="Invalid stat name")
     
-    collection = db["platform_settings"]
-    await collection.update_one(
-        {"id": "platform_settings"},
-        {"$set": {stat_name: stat_data.model_dump(), "updated_at": datetime.now(timezone.utc).isoformat()}}
+    await settings_store.update(
+        "platform_settings",
+        {stat_name: stat_data.model_dump(), "updated_at": datetime.now(timezone.utc).isoformat()}
     )
     return {"message": f"{stat_name} updated successfully"}
 
 @api_router.patch("/platform-settings/modules")
 async def update_service_modules(modules: List[ServiceModule]):
     """Update service modules"""
-    collection = db["platform_settings"]
-    await collection.update_one(
-        {"id": "platform_settings"},
-        {"$set": {"service_modules": [m.model_dump() for m in modules], "updated_at": datetime.now(timezone.utc).isoformat()}}
+    await settings_store.update(
+        "platform_settings",
+        {"service_modules": [m.model_dump() for m in modules], "updated_at": datetime.now(timezone.utc).isoformat()}
     )
     return {"message": "Service modules updated successfully"}
 
 @api_router.patch("/platform-settings/services")
 async def update_services_list(services: List[ServiceItem]):
     """Update services list (left column)"""
-    collection = db["platform_settings"]
-    await collection.update_one(
-        {"id": "platform_settings"},
-        {"$set": {"services_list": [s.model_dump() for s in services], "updated_at": datetime.now(timezone.utc).isoformat()}}
+    await settings_store.update(
+        "platform_settings",
+        {"services_list": [s.model_dump() for s in services], "updated_at": datetime.now(timezone.utc).isoformat()}
     )
     return {"message": "Services list updated successfully"}
 
 @api_router.patch("/platform-settings/bottom-stats")
 async def update_bottom_stats(stats: List[BottomStat]):
     """Update bottom stats"""
-    collection = db["platform_settings"]
-    await collection.update_one(
-        {"id": "platform_settings"},
-        {"$set": {"bottom_stats": [s.model_dump() for s in stats], "updated_at": datetime.now(timezone.utc).isoformat()}}
+    await settings_store.update(
+        "platform_settings",
+        {"bottom_stats": [s.model_dump() for s in stats], "updated_at": datetime.now(timezone.utc).isoformat()}
     )
     return {"message": "Bottom stats updated successfully"}
 
 
 # ==================== ROADMAP API ====================
 
-@api_router.get("/roadmap")
+def default_roadmap_settings() -> Dict[str, Any]:
+    """Default roadmap section texts with an empty task list"""
+    return {
+        "id": "roadmap_settings",
+        "section_badge_ru": "Наш Прогресс",
+        "section_badge_en": "Our Progress",
+        "section_title_ru": "Дорожная карта проекта",
+        "section_title_en": "Project Roadmap",
+        "section_subtitle_ru": "Отслеживайте наш прогресс разработки в реальном времени",
+        "section_subtitle_en": "Track our development progress in real-time",
+        "tasks": [],
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+
+settings_store.register("roadmap_settings", {"id": "roadmap_settings"}, default_roadmap_settings)
+
+@api_router.get("/roadmap", dependencies=[Depends(conditional_get("roadmap_settings"))])
 async def get_roadmap():
     """Get roadmap settings and tasks"""
     try:
         # Get settings with tasks from the same collection
-        settings_collection = db["roadmap_settings"]
-        settings = await settings_collection.find_one({"id": "roadmap_settings"}, {"_id": 0})
-        
-        if not settings:
-            # Create default settings
-            settings = {
-                "id": "roadmap_settings",
-                "section_badge_ru": "Наш Прогресс",
-                "section_badge_en": "Our Progress",
-                "section_title_ru": "Дорожная карта проекта",
-                "section_title_en": "Project Roadmap",
-                "section_subtitle_ru": "Отслеживайте наш прогресс разработки в реальном времени",
-                "section_subtitle_en": "Track our development progress in real-time",
-                "tasks": [],
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }
-            await settings_collection.insert_one(settings.copy())
+        settings = await settings_store.get("roadmap_settings")
         
         # Ensure tasks array exists and is sorted by order
         if "tasks" not in settings:
@@ -1005,8 +1777,6 @@ async def get_roadmap():
 @api_router.put("/roadmap")
 async def update_roadmap(update_data: dict):
     """Update roadmap settings (badge, title, subtitle)"""
-    collection = db["roadmap_settings"]
-    
     update_dict = {}
     for key in ['section_badge', 'section_title', 'section_subtitle']:
         if key in update_data and update_data[key] is not None:
@@ -1014,47 +1784,35 @@ async def update_roadmap(update_data: dict):
     
     if update_dict:
         update_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-        await collection.update_one(
-            {"id": "roadmap_settings"},
-            {"$set": update_dict}
-        )
     
-    return await collection.find_one({"id": "roadmap_settings"}, {"_id": 0})
+    return await settings_store.update("roadmap_settings", update_dict)
 
 @api_router.post("/roadmap/tasks")
 async def add_roadmap_task(task: RoadmapTaskCreate):
     """Add new task to roadmap"""
-    collection = db["roadmap_settings"]
-    
-    # Get current settings to find max order
-    settings = await collection.find_one({"id": "roadmap_settings"})
-    current_tasks = settings.get('tasks', []) if settings else []
+    # Tasks live in the cached settings document, so the max order needs no query
+    settings = await settings_store.get("roadmap_settings")
+    current_tasks = settings.get('tasks', [])
     max_order = max([t.get('order', 0) for t in current_tasks], default=0)
     
-    new_task = {
-        "id": str(uuid4()),
-        "name": task.name,
-        "status": task.status,
-        "category": task.category,
-        "order": task.order if task.order is not None else max_order + 1
-    }
-    
-    await collection.update_one(
-        {"id": "roadmap_settings"},
-        {
-            "$push": {"tasks": new_task},
-            "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
-        },
-        upsert=True
-    )
+    new_task = RoadmapTask(
+        name_ru=task.name_ru,
+        name_en=task.name_en,
+        status=task.status,
+        category=task.category,
+        order=task.order if task.order is not None else max_order + 1
+    ).model_dump()
+    
+    await settings_store.apply("roadmap_settings", {
+        "$push": {"tasks": new_task},
+        "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+    })
     
     return new_task
 
 @api_router.put("/roadmap/tasks/{task_id}")
 async def update_roadmap_task(task_id: str, update_data: RoadmapTaskUpdate):
     """Update a roadmap task"""
-    collection = db["roadmap_settings"]
-    
     update_dict = {}
     for key, value in update_data.model_dump(exclude_unset=True).items():
         if value is not None:
@@ -1062,11 +1820,13 @@ async def update_roadmap_task(task_id: str, update_data: RoadmapTaskUpdate):
     
     if update_dict:
         update_dict["updated_at"] = datetime.now(timezone.utc).isoformat()
-        result = await collection.update_one(
-            {"id": "roadmap_settings", "tasks.id": task_id},
-            {"$set": update_dict}
+        updated = await settings_store.apply(
+            "roadmap_settings",
+            {"$set": update_dict},
+            query={"tasks.id": task_id},
+            upsert=False
         )
-        if result.modified_count == 0:
+        if updated is None:
             raise HTTPException(status_code=404, detail="Task not found")
     
     return {"message": "Task updated successfully"}
@@ -1074,17 +1834,17 @@ async def update_roadmap_task(task_id: str, update_data: RoadmapTaskUpdate):
 @api_router.delete("/roadmap/tasks/{task_id}")
 async def delete_roadmap_task(task_id: str):
     """Delete a roadmap task"""
-    collection = db["roadmap_settings"]
-    
-    result = await collection.update_one(
-        {"id": "roadmap_settings"},
+    updated = await settings_store.apply(
+        "roadmap_settings",
         {
             "$pull": {"tasks": {"id": task_id}},
             "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
-        }
+        },
+        query={"tasks.id": task_id},
+        upsert=False
     )
     
-    if result.modified_count == 0:
+    if updated is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
     return {"message": "Task deleted successfully"}
@@ -1092,13 +1852,9 @@ async def delete_roadmap_task(task_id: str):
 @api_router.post("/roadmap/tasks/reorder")
 async def reorder_roadmap_tasks(order_data: List[dict]):
     """Reorder roadmap tasks"""
-    collection = db["roadmap_settings"]
-    
-    settings = await collection.find_one({"id": "roadmap_settings"})
-    if not settings:
-        raise HTTPException(status_code=404, detail="Roadmap not found")
+    settings = await settings_store.get("roadmap_settings")
     
-    tasks = settings.get('tasks', [])
+    tasks = [dict(task) for task in settings.get('tasks', [])]
     order_map = {item['id']: item['order'] for item in order_data}
     
     for task in tasks:
@@ -1107,9 +1863,9 @@ async def reorder_roadmap_tasks(order_data: List[dict]):
     
     tasks.sort(key=lambda t: t.get('order', 0))
     
-    await collection.update_one(
-        {"id": "roadmap_settings"},
-        {"$set": {"tasks": tasks, "updated_at": datetime.now(timezone.utc).isoformat()}}
+    await settings_store.update(
+        "roadmap_settings",
+        {"tasks": tasks, "updated_at": datetime.now(timezone.utc).isoformat()}
     )
     
     return {"message": "Tasks reordered successfully"}
@@ -1117,7 +1873,7 @@ async def reorder_roadmap_tasks(order_data: List[dict]):
 
 # ==================== PARTNERS API ====================
 
-@api_router.get("/partners")
+@api_router.get("/partners", dependencies=[Depends(conditional_get("partners"))])
 async def get_partners(category: Optional[str] = None):
     """Get all partners, optionally filtered by category"""
     collection = db["partners"]
@@ -1126,7 +1882,7 @@ async def get_partners(category: Optional[str] = None):
     if category:
         query["category"] = category
     
-    partners = await collection.find(query, {"_id": 0}).sort("order", 1).to_list(1000)
+    partners = await collection.find(query, CONTENT_PROJECTION).sort(ORDER_KEY, 1).to_list(1000)
     
     # If no partners exist, create some defaults
     if not partners:
@@ -1141,22 +1897,17 @@ async def get_partners(category: Optional[str] = None):
         ]
         for p in default_partners:
             p["created_at"] = datetime.now(timezone.utc).isoformat()
-        await collection.insert_many(default_partners)
-        partners = await collection.find(query, {"_id": 0}).sort("order", 1).to_list(1000)
+        await collection.insert_many(assign_order_keys(default_partners))
+        await invalidation_bus.publish("partners")
+        partners = await collection.find(query, CONTENT_PROJECTION).sort(ORDER_KEY, 1).to_list(1000)
     
-    return partners
+    return number_positions(partners, group_field="category")
 
 @api_router.post("/partners")
 async def create_partner(partner: PartnerCreate):
     """Create a new partner"""
-    collection = db["partners"]
-    
-    # Get max order for this category
-    max_order_partner = await collection.find_one(
-        {"category": partner.category},
-        sort=[("order", -1)]
-    )
-    max_order = max_order_partner.get("order", 0) if max_order_partner else 0
+    # Position within the category, appended at the end unless an order is given
+    order_key = await ordered_collections["partners"].key_for_position(partner.order, scope=partner.category)
     
     new_partner = {
         "id": str(uuid4()),
@@ -1168,33 +1919,37 @@ async def create_partner(partner: PartnerCreate):
         "image_url_hover": partner.image_url_hover,
         "link": partner.link,
         "category": partner.category,
-        "order": partner.order if partner.order is not None else max_order + 1,
+        "order": partner.order if partner.order is not None else await ordered_collections["partners"].position_of(
+            {"category": partner.category, ORDER_KEY: order_key}
+        ),
+        ORDER_KEY: order_key,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    await collection.insert_one(new_partner)
-    new_partner.pop("_id", None)
-    return new_partner
+    return await repositories["partners"].create(new_partner)
 
 @api_router.put("/partners/{partner_id}")
 async def update_partner(partner_id: str, update_data: PartnerUpdate):
     """Update a partner"""
-    collection = db["partners"]
-    
     update_dict = {}
     for key, value in update_data.model_dump(exclude_unset=True).items():
         if value is not None:
             update_dict[key] = value
     
     if update_dict:
-        result = await collection.update_one(
-            {"id": partner_id},
-            {"$set": update_dict}
-        )
-        if result.modified_count == 0:
-            raise HTTPException(status_code=404, detail="Partner not found")
+        if "order" in update_dict:
+            # Positions are counted within the partner's (possibly new) category
+            category = update_dict.get("category")
+            if category is None:
+                existing = await repositories["partners"].find(partner_id)
+                category = (existing or {}).get("category")
+            update_dict[ORDER_KEY] = await ordered_collections["partners"].key_for_position(
+                update_dict["order"], exclude_id=partner_id, scope=category
+            )
     
-    updated = await collection.find_one({"id": partner_id}, {"_id": 0})
+    updated = await repositories["partners"].update(partner_id, update_dict)
+    if not updated:
+        raise HTTPException(status_code=404, detail="Partner not found")
     return updated
 
 @api_router.delete("/partners/{partner_id}")
@@ -1206,19 +1961,22 @@ async def delete_partner(partner_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Partner not found")
     
+    await invalidation_bus.publish("partners")
     return {"message": "Partner deleted successfully"}
 
 @api_router.post("/partners/reorder")
 async def reorder_partners(order_data: List[dict]):
     """Reorder partners"""
-    collection = db["partners"]
-    for item in order_data:
-        await collection.update_one(
-            {"id": item["id"]},
-            {"$set": {"order": item["order"]}}
-        )
+    await ordered_collections["partners"].reorder(order_data)
     return {"message": "Partners reordered successfully"}
 
+@api_router.post("/partners/{partner_id}/move")
+async def move_partner(partner_id: str, move: MoveRequest):
+    """Move a partner between two neighbours, rewriting only the moved partner"""
+    if not await ordered_collections["partners"].move(partner_id, move.after_id, move.before_id):
+        raise HTTPException(status_code=404, detail="Partner not found")
+    return {"message": "Partner moved successfully"}
+
 
 @api_router.post("/partners/seed-defaults")
 async def seed_default_partners():
@@ -1310,7 +2068,8 @@ async def seed_default_partners():
     existing_count = await collection.count_documents({})
     if existing_count < len(default_partners):
         await collection.delete_many({})  # Clear existing
-        await collection.insert_many(default_partners)
+        await collection.insert_many(assign_order_keys(default_partners))
+        await invalidation_bus.publish("partners")
         return {"message": f"Seeded {len(default_partners)} default partners", "count": len(default_partners)}
     
     return {"message": "Partners already exist", "count": existing_count}
@@ -1318,38 +2077,20 @@ async def seed_default_partners():
 
 # ==================== FOOTER SETTINGS API ====================
 
-@api_router.get("/footer-settings")
+settings_store.register(
+    "footer_settings",
+    {"id": "footer_settings"},
+    lambda: FooterSettings().model_dump(mode="json")
+)
+
+@api_router.get("/footer-settings", dependencies=[Depends(conditional_get("footer_settings"))])
 async def get_footer_settings():
     """Get footer settings or return defaults"""
-    collection = db["footer_settings"]
-    settings = await collection.find_one({"id": "footer_settings"}, {"_id": 0})
-    
-    if not settings:
-        # Return default settings
-        default = FooterSettings()
-        doc = default.model_dump()
-        doc['updated_at'] = doc['updated_at'].isoformat()
-        # Convert social_media list properly
-        doc['social_media'] = [sm.model_dump() if hasattr(sm, 'model_dump') else sm for sm in default.social_media]
-        await collection.insert_one(doc)
-        settings = await collection.find_one({"id": "footer_settings"}, {"_id": 0})
-    
-    return settings
+    return await settings_store.get("footer_settings")
 
 @api_router.put("/footer-settings")
 async def update_footer_settings(update_data: FooterSettingsUpdate):
     """Update footer settings"""
-    collection = db["footer_settings"]
-    
-    # Ensure settings exist
-    existing = await collection.find_one({"id": "footer_settings"})
-    if not existing:
-        default = FooterSettings()
-        doc = default.model_dump()
-        doc['updated_at'] = doc['updated_at'].isoformat()
-        doc['social_media'] = [sm.model_dump() if hasattr(sm, 'model_dump') else sm for sm in default.social_media]
-        await collection.insert_one(doc)
-    
     # Build update dict
     update_dict = {}
     for key, value in update_data.model_dump(exclude_unset=True).items():
@@ -1362,31 +2103,24 @@ async def update_footer_settings(update_data: FooterSettingsUpdate):
     
     if update_dict:
         update_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-        await collection.update_one(
-            {"id": "footer_settings"},
-            {"$set": update_dict}
-        )
     
-    updated = await collection.find_one({"id": "footer_settings"}, {"_id": 0})
-    return updated
+    return await settings_store.update("footer_settings", update_dict)
 
 
 
 
 # ==================== FAQ API ====================
 
-@api_router.get("/faq")
+@api_router.get("/faq", dependencies=[Depends(conditional_get("faq_items"))])
 async def get_faq_items():
     """Get all FAQ items sorted by order"""
     collection = db["faq_items"]
-    items = await collection.find({}, {"_id": 0}).sort("order", 1).to_list(100)
-    return items
+    items = await collection.find({}, CONTENT_PROJECTION).sort(ORDER_KEY, 1).to_list(100)
+    return number_positions(items)
 
 @api_router.post("/faq")
 async def create_faq_item(item: FAQItemCreate):
     """Create a new FAQ item"""
-    collection = db["faq_items"]
-    
     new_item = FAQItem(
         question=item.question,
         answer=item.answer,
@@ -1395,15 +2129,16 @@ async def create_faq_item(item: FAQItemCreate):
     
     doc = new_item.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
+    doc[ORDER_KEY] = await ordered_collections["faq_items"].key_for_position(
+        item.order if "order" in item.model_fields_set else None
+    )
     
-    await collection.insert_one(doc)
+    await repositories["faq_items"].create(doc)
     return new_item
 
 @api_router.put("/faq/{item_id}")
 async def update_faq_item(item_id: str, update_data: FAQItemUpdate):
     """Update an FAQ item"""
-    collection = db["faq_items"]
-    
     update_dict = {}
     for key, value in update_data.model_dump(exclude_unset=True).items():
         if value is not None:
@@ -1411,16 +2146,14 @@ async def update_faq_item(item_id: str, update_data: FAQItemUpdate):
     
     if not update_dict:
         raise HTTPException(status_code=400, detail="No fields to update")
+    if "order" in update_dict:
+        update_dict[ORDER_KEY] = await ordered_collections["faq_items"].key_for_position(
+            update_dict["order"], exclude_id=item_id
+        )
     
-    result = await collection.update_one(
-        {"id": item_id},
-        {"$set": update_dict}
-    )
-    
-    if result.matched_count == 0:
+    updated = await repositories["faq_items"].update(item_id, update_dict)
+    if not updated:
         raise HTTPException(status_code=404, detail="FAQ item not found")
-    
-    updated = await collection.find_one({"id": item_id}, {"_id": 0})
     return updated
 
 @api_router.delete("/faq/{item_id}")
@@ -1433,44 +2166,35 @@ async def delete_faq_item(item_id: str):
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="FAQ item not found")
     
+    await invalidation_bus.publish("faq_items")
     return {"message": "FAQ item deleted successfully"}
 
+@api_router.post("/faq/{item_id}/move")
+async def move_faq_item(item_id: str, move: MoveRequest):
+    """Move an FAQ item between two neighbours, rewriting only the moved item"""
+    if not await ordered_collections["faq_items"].move(item_id, move.after_id, move.before_id):
+        raise HTTPException(status_code=404, detail="FAQ item not found")
+    return {"message": "FAQ item moved successfully"}
+
 
 
 
 # ==================== COMMUNITY SETTINGS API ====================
 
-@api_router.get("/community-settings")
+settings_store.register(
+    "community_settings",
+    {"id": "community_settings"},
+    lambda: CommunitySettings().model_dump(mode="json")
+)
+
+@api_router.get("/community-settings", dependencies=[Depends(conditional_get("community_settings"))])
 async def get_community_settings():
     """Get community settings or return defaults"""
-    collection = db["community_settings"]
-    settings = await collection.find_one({"id": "community_settings"}, {"_id": 0})
-    
-    if not settings:
-        # Return default settings
-        default = CommunitySettings()
-        doc = default.model_dump()
-        doc['updated_at'] = doc['updated_at'].isoformat()
-        doc['socials'] = [s.model_dump() if hasattr(s, 'model_dump') else s for s in default.socials]
-        await collection.insert_one(doc)
-        settings = await collection.find_one({"id": "community_settings"}, {"_id": 0})
-    
-    return settings
+    return await settings_store.get("community_settings")
 
 @api_router.put("/community-settings")
 async def update_community_settings(update_data: CommunitySettingsUpdate):
     """Update community settings"""
-    collection = db["community_settings"]
-    
-    # Ensure settings exist
-    existing = await collection.find_one({"id": "community_settings"})
-    if not existing:
-        default = CommunitySettings()
-        doc = default.model_dump()
-        doc['updated_at'] = doc['updated_at'].isoformat()
-        doc['socials'] = [s.model_dump() if hasattr(s, 'model_dump') else s for s in default.socials]
-        await collection.insert_one(doc)
-    
     # Build update dict
     update_dict = {}
     for key, value in update_data.model_dump(exclude_unset=True).items():
@@ -1482,44 +2206,26 @@ async def update_community_settings(update_data: CommunitySettingsUpdate):
     
     if update_dict:
         update_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-        await collection.update_one(
-            {"id": "community_settings"},
-            {"$set": update_dict}
-        )
     
-    updated = await collection.find_one({"id": "community_settings"}, {"_id": 0})
-    return updated
+    return await settings_store.update("community_settings", update_dict)
 
 
 # ==================== HERO SETTINGS API ====================
 
-@api_router.get("/hero-settings")
+settings_store.register(
+    "hero_settings",
+    {"id": "hero_settings"},
+    lambda: HeroSettings().model_dump(mode="json")
+)
+
+@api_router.get("/hero-settings", dependencies=[Depends(conditional_get("hero_settings"))])
 async def get_hero_settings():
     """Get hero section settings including stats and NFT settings"""
-    collection = db.hero_settings
-    settings = await collection.find_one({"id": "hero_settings"}, {"_id": 0})
-    
-    if not settings:
-        # Create default settings
-        default_settings = HeroSettings()
-        settings_dict = default_settings.model_dump()
-        settings_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-        await collection.insert_one(settings_dict)
-        return settings_dict
-    
-    return settings
+    return await settings_store.get("hero_settings")
 
 @api_router.put("/hero-settings")
 async def update_hero_settings(update_data: HeroSettingsUpdate):
     """Update hero section settings"""
-    collection = db.hero_settings
-    
-    # Ensure document exists
-    existing = await collection.find_one({"id": "hero_settings"})
-    if not existing:
-        default_settings = HeroSettings()
-        await collection.insert_one(default_settings.model_dump())
-    
     # Build update dict
     update_dict = {}
     for key, value in update_data.model_dump(exclude_unset=True).items():
@@ -1533,58 +2239,113 @@ async def update_hero_settings(update_data: HeroSettingsUpdate):
     
     if update_dict:
         update_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-        await collection.update_one(
-            {"id": "hero_settings"},
-            {"$set": update_dict}
-        )
     
-    updated = await collection.find_one({"id": "hero_settings"}, {"_id": 0})
-    return updated
+    return await settings_store.update("hero_settings", update_dict)
 
 
 
 # ==================== ABOUT SETTINGS API ====================
 
-@api_router.get("/about-settings")
+settings_store.register(
+    "about_settings",
+    {"id": "about_settings"},
+    lambda: AboutSettings().model_dump(mode="json")
+)
+
+@api_router.get("/about-settings", dependencies=[Depends(conditional_get("about_settings"))])
 async def get_about_settings():
     """Get About section settings"""
-    collection = db.about_settings
-    settings = await collection.find_one({"id": "about_settings"}, {"_id": 0})
-    
-    if not settings:
-        # Create default settings
-        default_settings = AboutSettings().model_dump()
-        await collection.insert_one(default_settings)
-        settings = default_settings
-    
-    return settings
+    return await settings_store.get("about_settings")
 
 @api_router.put("/about-settings")
 async def update_about_settings(settings_update: AboutSettingsUpdate):
     """Update About section settings"""
-    collection = db.about_settings
-    
     # Remove None values
     update_dict = {k: v for k, v in settings_update.model_dump().items() if v is not None}
     update_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
     
-    # Check if settings exist
-    existing = await collection.find_one({"id": "about_settings"})
-    
-    if existing:
-        # Update existing
-        await collection.update_one(
-            {"id": "about_settings"},
-            {"$set": update_dict}
+    return await settings_store.update("about_settings", update_dict)
+
+
+# ==================== LANDING BUNDLE API ====================
+
+# Collections read by the landing bundle, used to derive its cache key
+LANDING_COLLECTIONS = [
+    "drawer_cards",
+    "team_members",
+    "platform_settings",
+    "roadmap_settings",
+    "partners",
+    "footer_settings",
+    "faq_items",
+    "community_settings",
+    "hero_settings",
+]
+
+# Serialized landing bundle, reused while the collection versions are unchanged
+landing_bundle_cache: Dict[str, Any] = {}
+
+def json_with_etag(content: Any):
+    """Serialize content once and compute a strong ETag over the exact bytes"""
+    body = json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+    return body, f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+@api_router.get("/landing")
+async def get_landing_bundle(request: Request):
+    """
+    Get all content needed by the landing page in a single request.
+    Sections are loaded concurrently and returned as one payload with a strong ETag.
+    The serialized payload is reused until one of the landing collections changes.
+    """
+    headers, last_modified = await content_validators(request, LANDING_COLLECTIONS)
+    versions_key = headers["ETag"]
+    
+    cached = landing_bundle_cache.get("bundle")
+    if cached is None or cached["versions_key"] != versions_key:
+        (
+            cards,
+            team_members,
+            platform_settings,
+            roadmap,
+            partners,
+            footer_settings,
+            faq,
+            community_settings,
+            hero_settings,
+        ) = await asyncio.gather(
+            get_drawer_cards(),
+            get_team_members(),
+            get_platform_settings(),
+            get_roadmap(),
+            get_partners(),
+            get_footer_settings(),
+            get_faq_items(),
+            get_community_settings(),
+            get_hero_settings(),
         )
-    else:
-        # Create new with defaults and updates
-        new_settings = AboutSettings().model_dump()
-        new_settings.update(update_dict)
-        await collection.insert_one(new_settings)
-    
-    updated = await collection.find_one({"id": "about_settings"}, {"_id": 0})
-    return updated
+        
+        body, etag = json_with_etag({
+            "drawer_cards": [DrawerCard(**card) for card in cards],
+            "team_members": team_members,
+            "platform_settings": platform_settings,
+            "roadmap": roadmap,
+            "partners": partners,
+            "footer_settings": footer_settings,
+            "faq": faq,
+            "community_settings": community_settings,
+            "hero_settings": hero_settings,
+        })
+        cached = {"versions_key": versions_key, "body": body, "etag": etag}
+        landing_bundle_cache["bundle"] = cached
+    
+    headers["ETag"] = cached["etag"]
+    if is_not_modified(request, cached["etag"], last_modified):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached["body"], media_type="application/json", headers=headers)
 
 
 # ==================== ADMIN AUTH API ====================
@@ -1613,6 +2374,17 @@ async def admin_login(login_data: AdminLogin):
     else:
         raise HTTPException(status_code=401, detail="Invalid password")
 
+def require_admin_bearer(request: Request):
+    """Reject requests without an admin Bearer token"""
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
+    
+    token = auth_header.split(" ")[1]
+    # Simple admin check (in production use proper JWT)
+    if not token or len(token) < 20:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
 @api_router.post("/admin/verify")
 async def verify_admin_token(token: dict):
     """Verify admin token"""
@@ -1680,6 +2452,8 @@ class AnalyticsEventCreate(BaseModel):
     conversion_type: Optional[str] = None
     conversion_value: Optional[float] = None
 
+analytics_events_adapter = TypeAdapter(List[AnalyticsEventCreate])
+
 class AnalyticsStats(BaseModel):
     # Overview stats
     page_views: int = 0
@@ -1744,15 +2518,171 @@ def parse_user_agent(user_agent_string: str) -> Dict[str, str]:
             "os": "Unknown"
         }
 
-def determine_traffic_source(referrer: Optional[str]) -> Dict[str, str]:
-    """Determine traffic source from referrer"""
-    if not referrer or referrer == "":
-        return {"traffic_source": "direct", "source_detail": "Direct"}
-    
-    # Check if it's a search engine
-    search_engines = ["google", "bing", "yahoo", "duckduckgo", "yandex", "baidu"]
-    referrer_lower = referrer.lower()
-    
+class LRUCache:
+    """Bounded mapping that evicts the least recently used key, with hit/miss counters"""
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def get(self, key, default=None):
+        if key in self._data:
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+        self.misses += 1
+        return default
+    
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+UA_CACHE_SIZE = int(os.environ.get('UA_CACHE_SIZE', '10000'))
+UA_PARSER_THREADS = int(os.environ.get('UA_PARSER_THREADS', '2'))
+
+class UserAgentClassifier:
+    """
+    Memoized parse_user_agent. Real traffic has few distinct UA strings, so
+    most lookups are cache hits; misses are parsed in a small thread pool
+    instead of on the event loop, and concurrent misses for the same string
+    share one parse.
+    """
+    
+    def __init__(self, cache_size: int, threads: int):
+        self.cache = LRUCache(cache_size)
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="ua-parser")
+        self._pending: Dict[str, asyncio.Future] = {}
+    
+    async def classify(self, user_agent_string: str) -> Dict[str, str]:
+        info = self.cache.get(user_agent_string)
+        if info is not None:
+            return info
+        
+        pending = self._pending.get(user_agent_string)
+        if pending is None:
+            pending = asyncio.get_running_loop().run_in_executor(
+                self._executor, parse_user_agent, user_agent_string
+            )
+            self._pending[user_agent_string] = pending
+            try:
+                info = await pending
+                self.cache.put(user_agent_string, info)
+            finally:
+                del self._pending[user_agent_string]
+            return info
+        return await asyncio.shield(pending)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "parsing": len(self._pending)}
+
+
+ua_classifier = UserAgentClassifier(UA_CACHE_SIZE, UA_PARSER_THREADS)
+
+GEOIP_DB_PATH = os.environ.get('GEOIP_DB_PATH', '')
+GEOIP_CACHE_SIZE = int(os.environ.get('GEOIP_CACHE_SIZE', '50000'))
+# Reverse proxies in front of the backend that append to X-Forwarded-For (0: clients connect directly)
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '1'))
+
+def client_ip(request: Request) -> str:
+    """
+    Address of the visitor. Behind proxies it is the X-Forwarded-For entry
+    added by the outermost trusted proxy; entries left of it come from the
+    client and can be forged.
+    """
+    if TRUSTED_PROXY_HOPS > 0:
+        forwarded = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if forwarded:
+            return forwarded[-min(TRUSTED_PROXY_HOPS, len(forwarded))]
+    return request.client.host if request.client else "Unknown"
+UNKNOWN_LOCATION = ("Unknown", "Unknown")
+
+class GeoIPResolver:
+    """
+    Country/city lookup from a local MaxMind .mmdb database (GeoLite2 or
+    GeoIP2, City or Country edition). The file is memory-mapped, so all
+    workers share the same pages from the OS cache; recent IPs are memoized.
+    Without a database every address resolves to Unknown.
+    """
+    
+    def __init__(self, path: str, cache_size: int):
+        self.path = path
+        self.cache = LRUCache(cache_size)
+        self._reader = None
+    
+    def open(self):
+        if not self.path:
+            return
+        try:
+            self._reader = maxminddb.open_database(self.path, maxminddb.MODE_AUTO)
+            logger.info(f"GeoIP database loaded: {self._reader.metadata().database_type}")
+        except (OSError, ValueError, maxminddb.InvalidDatabaseError) as e:
+            logger.error(f"Could not open GeoIP database {self.path}: {e}")
+    
+    def close(self):
+        if self._reader:
+            self._reader.close()
+            self._reader = None
+    
+    def lookup(self, ip_address: str) -> tuple:
+        """(country, city) names for an IP address"""
+        if self._reader is None:
+            return UNKNOWN_LOCATION
+        location = self.cache.get(ip_address)
+        if location is None:
+            location = self._resolve(ip_address)
+            self.cache.put(ip_address, location)
+        return location
+    
+    def _resolve(self, ip_address: str) -> tuple:
+        try:
+            record = self._reader.get(ip_address)
+        except ValueError:
+            # Not an IP address (e.g. a unix socket peer)
+            return UNKNOWN_LOCATION
+        if not record:
+            return UNKNOWN_LOCATION
+        country = record.get("country") or record.get("registered_country") or {}
+        city = record.get("city") or {}
+        return (
+            country.get("names", {}).get("en", "Unknown"),
+            city.get("names", {}).get("en", "Unknown"),
+        )
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.cache.stats(),
+            "database": self._reader.metadata().database_type if self._reader else None,
+        }
+
+
+geoip = GeoIPResolver(GEOIP_DB_PATH, GEOIP_CACHE_SIZE)
+
+def determine_traffic_source(referrer: Optional[str]) -> Dict[str, str]:
+    """Determine traffic source from referrer"""
+    if not referrer or referrer == "":
+        return {"traffic_source": "direct", "source_detail": "Direct"}
+    
+    # Check if it's a search engine
+    search_engines = ["google", "bing", "yahoo", "duckduckgo", "yandex", "baidu"]
+    referrer_lower = referrer.lower()
+    
     for engine in search_engines:
         if engine in referrer_lower:
             return {"traffic_source": "search", "source_detail": engine.capitalize()}
@@ -1766,205 +2696,1190 @@ def determine_traffic_source(referrer: Optional[str]) -> Dict[str, str]:
         return {"traffic_source": "referral", "source_detail": referrer}
 
 
-# ==================== ANALYTICS API ====================
+# ==================== ANALYTICS PARTITIONS ====================
 
-@api_router.post("/analytics/track")
-async def track_analytics_event(event_data: AnalyticsEventCreate, request: Request):
+# "none" keeps every event in analytics_events, "monthly" splits them per month
+ANALYTICS_PARTITIONING = os.environ.get('ANALYTICS_PARTITIONING', 'none')
+ANALYTICS_PARTITION_MAINTENANCE_SECONDS = 6 * 3600
+
+def month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def next_month(moment: datetime) -> datetime:
+    moment = month_start(moment)
+    return moment.replace(year=moment.year + 1, month=1) if moment.month == 12 else moment.replace(month=moment.month + 1)
+
+class AnalyticsPartitions:
     """
-    Track an analytics event (pageview, click, conversion, etc.)
+    Routes analytics events to the collection they are stored in.
+    
+    In monthly mode every month has its own collection (analytics_events_2026_10):
+    writes go to the partition of the event's month, reads fan out only over
+    the partitions overlapping the requested period, and expired months are
+    dropped whole instead of deleted document by document. Without
+    partitioning everything stays in the single base collection.
     """
-    # Parse user agent
-    user_agent_str = event_data.user_agent or request.headers.get("user-agent", "")
-    ua_info = parse_user_agent(user_agent_str)
-    
-    # Determine traffic source
-    traffic_info = determine_traffic_source(event_data.referrer)
-    
-    # Get IP address (simplified - in production use proper IP extraction)
-    ip_address = request.client.host if request.client else "Unknown"
-    
-    # Create event
-    event = AnalyticsEvent(
-        **event_data.model_dump(),
-        user_agent=user_agent_str,
-        device_type=ua_info["device_type"],
-        browser=ua_info["browser"],
-        os=ua_info["os"],
-        traffic_source=traffic_info["traffic_source"],
-        source_detail=traffic_info["source_detail"],
-        ip_address=ip_address,
-        # Location would be determined via IP geolocation service in production
-        country="Unknown",
-        city="Unknown"
-    )
     
-    # Check if returning visitor
-    existing_session = await db.analytics_events.find_one({
-        "session_id": event_data.session_id,
-        "event_type": "pageview"
-    })
+    def __init__(self, base_name: str, mode: str):
+        if mode not in ("none", "monthly"):
+            raise ValueError(f"Unknown analytics partitioning mode: {mode}")
+        self.base_name = base_name
+        self.mode = mode
+        self._indexed: set = set()
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def partitioned(self) -> bool:
+        return self.mode == "monthly"
+    
+    def name_for(self, moment: datetime) -> str:
+        if not self.partitioned:
+            return self.base_name
+        return f"{self.base_name}_{moment.year:04d}_{moment.month:02d}"
+    
+    def names_between(self, start: datetime, end: datetime) -> List[str]:
+        """Collections that can hold events of [start, end]"""
+        if not self.partitioned:
+            return [self.base_name]
+        names = []
+        month = month_start(start)
+        while month <= end:
+            names.append(self.name_for(month))
+            month = next_month(month)
+        return names
+    
+    async def partitions(self) -> List[str]:
+        """Existing monthly partitions, oldest first"""
+        names = await db.list_collection_names(
+            filter={"name": {"$regex": f"^{self.base_name}_[0-9]{{4}}_[0-9]{{2}}$"}}
+        )
+        return sorted(names)
+    
+    def partition_indexes(self) -> List[IndexModel]:
+        # Same keys as the base collection; partitions expire by drop(), not TTL
+        return [IndexModel(list(index.document["key"].items())) for index in INDEX_REGISTRY[self.base_name]]
+    
+    async def collection_for_write(self, name: str):
+        """Collection to insert into, with its indexes created on first use"""
+        if self.partitioned and name not in self._indexed:
+            await db[name].create_indexes(self.partition_indexes())
+            self._indexed.add(name)
+        return db[name]
+    
+    def split(self, docs: List[Dict[str, Any]]) -> List[tuple]:
+        """Group events by target collection, as (name, docs) pairs"""
+        groups: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for doc in docs:
+            groups[self.name_for(utc_datetime(doc["timestamp"]))].append(doc)
+        return list(groups.items())
+    
+    def aggregate(self, start: datetime, end: datetime, pipeline: List[Dict[str, Any]]):
+        """
+        Run a pipeline over the events of [start, end]. The timestamp $match is
+        applied per partition, the partitions are combined with $unionWith.
+        """
+        match = {"$match": {"timestamp": {"$gte": start, "$lte": end}}}
+        first, *others = self.names_between(start, end)
+        stages = [match] + [{"$unionWith": {"coll": name, "pipeline": [match]}} for name in others]
+        return db[first].aggregate(stages + pipeline, allowDiskUse=True)
+    
+    async def clear(self) -> int:
+        """Delete all events; partitions are dropped"""
+        result = await db[self.base_name].delete_many({})
+        deleted = result.deleted_count
+        if self.partitioned:
+            for name in await self.partitions():
+                deleted += await db[name].estimated_document_count()
+                await db[name].drop()
+            self._indexed.clear()
+        return deleted
+    
+    async def drop_expired(self, retention_days: int) -> List[str]:
+        """Drop the partitions whose whole month is past the retention window"""
+        if not self.partitioned or retention_days <= 0:
+            return []
+        cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+        dropped = []
+        for name in await self.partitions():
+            year, month = map(int, name[len(self.base_name) + 1:].split("_"))
+            if next_month(datetime(year, month, 1, tzinfo=timezone.utc)) <= cutoff:
+                await db[name].drop()
+                self._indexed.discard(name)
+                dropped.append(name)
+        if dropped:
+            logger.info(f"Dropped expired analytics partitions: {', '.join(dropped)}")
+        return dropped
+    
+    async def absorb_legacy(self, batch_size: int = 1000) -> int:
+        """Move events from the unpartitioned collection into their monthly partitions"""
+        if not self.partitioned:
+            return 0
+        moved = 0
+        legacy = db[self.base_name]
+        while True:
+            docs = await legacy.find({"timestamp": {"$type": "date"}}) \
+                .sort("_id", ASCENDING).limit(batch_size).to_list(batch_size)
+            if not docs:
+                break
+            for name, group in self.split(docs):
+                collection = await self.collection_for_write(name)
+                try:
+                    await collection.insert_many(group, ordered=False)
+                except BulkWriteError as e:
+                    # Already copied by an interrupted earlier run
+                    if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+                        raise
+            await legacy.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+            moved += len(docs)
+        if moved:
+            logger.info(f"Moved {moved} analytics events into monthly partitions")
+        return moved
+    
+    async def start(self):
+        if self.partitioned:
+            self._task = asyncio.create_task(self._maintain())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+    
+    async def _maintain(self):
+        """Expire old months and prepare next month's partition ahead of time"""
+        while True:
+            try:
+                await self.drop_expired(ANALYTICS_RETENTION_DAYS)
+                await self.collection_for_write(self.name_for(next_month(datetime.now(timezone.utc))))
+            except Exception as e:
+                logger.error(f"Analytics partition maintenance failed: {e}")
+            await asyncio.sleep(ANALYTICS_PARTITION_MAINTENANCE_SECONDS)
+
+
+analytics_partitions = AnalyticsPartitions("analytics_events", ANALYTICS_PARTITIONING)
+
+
+# ==================== ANALYTICS ROLLUPS ====================
+
+# Event fields counted per value in every rollup bucket
+ROLLUP_DIMENSIONS = {
+    "event_type": None,
+    "device_type": "desktop",
+    "traffic_source": "direct",
+    "source_detail": "Direct",
+    "country": "Unknown",
+    "city": "Unknown",
+}
+ROLLUP_GRANULARITIES = ("hour", "day")
+
+def rollup_key(value: Any) -> str:
+    """Encode a dimension value as a field name ('.' and '$' are not allowed in paths)"""
+    value = str(value)
+    if not value:
+        return "%"
+    return value.replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+def rollup_value(key: str) -> str:
+    if key == "%":
+        return ""
+    return key.replace("%24", "$").replace("%2E", ".").replace("%25", "%")
+
+def utc_datetime(value: Any) -> datetime:
+    """Event timestamp as an aware UTC datetime (legacy events store ISO strings)"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        moment = moment.replace(hour=0)
+    return moment
+
+class HyperLogLog:
+    """
+    HyperLogLog sketch for counting distinct session ids in constant memory.
     
-    if existing_session:
-        event.is_returning = True
-        event.is_new_visitor = False
+    Registers are kept sparse as {index: rank}, which maps directly onto a
+    bucket sub-document updated with $max, so sketches written concurrently
+    by several workers merge atomically. Precision 12 gives 4096 registers
+    and about 1.6% standard error.
+    """
     
-    # Save to database
-    doc = event.model_dump()
-    doc['timestamp'] = doc['timestamp'].isoformat()
-    await db.analytics_events.insert_one(doc)
+    PRECISION = 12
+    REGISTERS = 1 << PRECISION
+    
+    def __init__(self, registers: Optional[Dict[int, int]] = None):
+        self.registers: Dict[int, int] = registers or {}
+    
+    @staticmethod
+    def hash_value(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+    
+    @classmethod
+    def register_for(cls, value: str) -> tuple:
+        """(register index, rank) a value sets"""
+        hashed = cls.hash_value(value)
+        index = hashed >> (64 - cls.PRECISION)
+        rest = hashed & ((1 << (64 - cls.PRECISION)) - 1)
+        rank = (64 - cls.PRECISION) - rest.bit_length() + 1
+        return index, rank
+    
+    def add(self, value: str):
+        index, rank = self.register_for(value)
+        if rank > self.registers.get(index, 0):
+            self.registers[index] = rank
+    
+    def merge(self, registers: Dict[Any, int]):
+        for index, rank in registers.items():
+            index = int(index)
+            if rank > self.registers.get(index, 0):
+                self.registers[index] = rank
+    
+    def count(self) -> int:
+        m = self.REGISTERS
+        alpha = 0.7213 / (1 + 1.079 / m)
+        zeros = m - len(self.registers)
+        estimate = alpha * m * m / (zeros + sum(2.0 ** -rank for rank in self.registers.values()))
+        if estimate <= 2.5 * m and zeros:
+            # Small range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+class AnalyticsRollups:
+    """
+    Pre-aggregated analytics counters per hour and per day.
+    
+    Each bucket document holds the event count, session duration totals,
+    a counter per value of every ROLLUP_DIMENSIONS field and a HyperLogLog
+    sketch of its session ids. Buckets are updated
+    with $inc upserts when the ingestion buffer writes events, so stats read
+    O(days) documents instead of scanning raw events.
+    """
     
-    return {"success": True, "event_id": event.id}
+    def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+    
+    @property
+    def collection(self):
+        return db[self.collection_name]
+    
+    def increments(self, docs: List[Dict[str, Any]]) -> Dict[tuple, Dict[str, Dict[str, int]]]:
+        """$inc and $max (session sketch) documents per (granularity, bucket) for a list of events"""
+        result: Dict[tuple, Dict[str, Dict[str, int]]] = defaultdict(
+            lambda: {"$inc": defaultdict(int), "$max": {}}
+        )
+        for doc in docs:
+            if doc.get("timestamp") is None:
+                continue
+            timestamp = utc_datetime(doc["timestamp"])
+            
+            counters = {"events": 1}
+            for field, default in ROLLUP_DIMENSIONS.items():
+                value = doc.get(field)
+                counters[f"{field}.{rollup_key(value if value is not None else default)}"] = 1
+            if doc.get("event_type") == "pageview":
+                if doc.get("is_new_visitor"):
+                    counters["visitors.new"] = 1
+                if doc.get("is_returning"):
+                    counters["visitors.returning"] = 1
+            if doc.get("session_duration"):
+                counters["duration_total"] = doc["session_duration"]
+                counters["duration_count"] = 1
+            session_register = HyperLogLog.register_for(doc["session_id"]) if doc.get("session_id") else None
+            
+            for granularity in ROLLUP_GRANULARITIES:
+                update = result[(granularity, bucket_start(timestamp, granularity))]
+                for path, amount in counters.items():
+                    update["$inc"][path] += amount
+                if session_register:
+                    index, rank = session_register
+                    path = f"sessions_hll.{index}"
+                    update["$max"][path] = max(update["$max"].get(path, 0), rank)
+        return result
+    
+    async def record(self, docs: List[Dict[str, Any]]):
+        """Add events to their hourly and daily buckets in one bulk write"""
+        operations = [
+            UpdateOne(
+                {"granularity": granularity, "bucket": bucket},
+                {operator: dict(fields) for operator, fields in update.items() if fields},
+                upsert=True
+            )
+            for (granularity, bucket), update in self.increments(docs).items()
+        ]
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+    
+    async def load(self, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        """
+        Buckets covering [start, end) at hour resolution: whole days come from
+        daily buckets, the partial days at both ends from hourly ones.
+        """
+        start = bucket_start(start, "hour")
+        first_day = bucket_start(start, "day")
+        if first_day < start:
+            first_day += timedelta(days=1)
+        last_day = bucket_start(end, "day")
+        
+        if first_day < last_day:
+            ranges = [
+                {"granularity": "hour", "bucket": {"$gte": start, "$lt": first_day}},
+                {"granularity": "day", "bucket": {"$gte": first_day, "$lt": last_day}},
+                {"granularity": "hour", "bucket": {"$gte": last_day, "$lt": end}},
+            ]
+        else:
+            ranges = [{"granularity": "hour", "bucket": {"$gte": start, "$lt": end}}]
+        return await self.collection.find({"$or": ranges}, {"_id": 0}).to_list(None)
+    
+    @staticmethod
+    def merge(buckets: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Sum bucket documents into one set of counters with decoded values"""
+        totals: Dict[str, Any] = {
+            "events": 0, "duration_total": 0, "duration_count": 0,
+            "sessions": HyperLogLog(),
+            "visitors": defaultdict(int),
+            **{field: defaultdict(int) for field in ROLLUP_DIMENSIONS}
+        }
+        for bucket in buckets:
+            for field in ("events", "duration_total", "duration_count"):
+                totals[field] += bucket.get(field, 0)
+            for key, count in bucket.get("visitors", {}).items():
+                totals["visitors"][key] += count
+            totals["sessions"].merge(bucket.get("sessions_hll", {}))
+            for field in ROLLUP_DIMENSIONS:
+                for key, count in bucket.get(field, {}).items():
+                    totals[field][rollup_value(key)] += count
+        return totals
+    
+    async def rebuild(self, start: datetime, end: datetime, batch_size: int = 5000) -> int:
+        """
+        Recompute the buckets of [start, end) from raw events. Both ends must be
+        day boundaries, so that the daily buckets are rebuilt whole.
+        """
+        await self.collection.delete_many({"bucket": {"$gte": start, "$lt": end}})
+        
+        projection = {"_id": 0, "timestamp": 1, "session_id": 1, "session_duration": 1, "is_new_visitor": 1, "is_returning": 1,
+                      **{field: 1 for field in ROLLUP_DIMENSIONS}}
+        
+        count = 0
+        batch = []
+        for name in analytics_partitions.names_between(start, end):
+            cursor = db[name].find({"timestamp": {"$gte": start, "$lt": end}}, projection).batch_size(batch_size)
+            async for doc in cursor:
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    await self.record(batch)
+                    count += len(batch)
+                    batch = []
+        if batch:
+            await self.record(batch)
+            count += len(batch)
+        return count
 
 
-@api_router.get("/analytics/stats")
-async def get_analytics_stats(period: int = 30):
+analytics_rollups = AnalyticsRollups("analytics_rollups")
+
+
+# ==================== ANALYTICS REALTIME ====================
+
+ANALYTICS_REALTIME_CAPACITY = int(os.environ.get('ANALYTICS_REALTIME_CAPACITY', '200000'))
+ANALYTICS_REALTIME_MAX_MINUTES = 24 * 60
+
+class ValueCodes:
     """
-    Get analytics statistics for a given period (days)
-    period: 7, 30, or 90 days
+    Dictionary encoding of a string column into uint16 codes. Once all codes
+    are taken, new values share the overflow code, so memory stays bounded.
     """
-    # Calculate date range
-    end_date = datetime.now(timezone.utc)
-    start_date = end_date - timedelta(days=period)
     
-    # Query events in period
-    events = await db.analytics_events.find({
-        "timestamp": {
-            "$gte": start_date.isoformat(),
-            "$lte": end_date.isoformat()
-        }
-    }, {"_id": 0}).to_list(100000)
+    OVERFLOW = "(other)"
+    LIMIT = 1 << 16
     
-    if not events:
-        return AnalyticsStats()
+    def __init__(self):
+        self.values: List[str] = [self.OVERFLOW]
+        self._codes: Dict[str, int] = {self.OVERFLOW: 0}
     
-    # Initialize stats
-    stats = AnalyticsStats()
-    
-    # Track unique sessions
-    unique_sessions = set()
-    session_durations = []
-    countries = defaultdict(int)
-    cities = defaultdict(int)
-    devices = defaultdict(int)
-    traffic_sources = defaultdict(int)
-    source_details = defaultdict(int)
-    new_visitors = 0
-    returning_visitors = 0
-    
-    # Process events
-    for event in events:
-        session_id = event.get("session_id")
-        event_type = event.get("event_type")
+    def code(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            if len(self.values) >= self.LIMIT:
+                return 0
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+class RecentEvents:
+    """
+    Fixed-size columnar ring buffer of the events this worker accepted.
+    
+    Every column is a preallocated NumPy array (timestamps in ms, dimension
+    fields as dictionary codes, visitor flags, durations and session hashes),
+    so memory is set by the capacity alone. Window stats are vectorized
+    reductions producing a document shaped like a rollup bucket, which merges
+    with persisted rollups for anything older than the buffer holds.
+    """
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.size = 0
+        self._head = 0
+        # Every event accepted since this time is in the buffer
+        self.since = datetime.now(timezone.utc)
+        self._timestamps = np.zeros(capacity, dtype=np.int64)
+        self._codes = {field: np.zeros(capacity, dtype=np.uint16) for field in ROLLUP_DIMENSIONS}
+        self._dictionaries = {field: ValueCodes() for field in ROLLUP_DIMENSIONS}
+        self._new_visitor = np.zeros(capacity, dtype=bool)
+        self._returning = np.zeros(capacity, dtype=bool)
+        self._duration = np.zeros(capacity, dtype=np.int32)
+        self._has_session = np.zeros(capacity, dtype=bool)
+        self._session_hash = np.zeros(capacity, dtype=np.uint64)
+    
+    def clear(self):
+        self.size = 0
+        self._head = 0
+        self.since = datetime.now(timezone.utc)
+    
+    def append(self, docs: List[Dict[str, Any]]):
+        overwrites = self.size + len(docs) > self.capacity
+        docs = docs[-self.capacity:]
+        count = len(docs)
+        if not count:
+            return
+        positions = (self._head + np.arange(count)) % self.capacity
         
-        # Count unique sessions
-        if session_id:
-            unique_sessions.add(session_id)
+        self._timestamps[positions] = [int(utc_datetime(doc["timestamp"]).timestamp() * 1000) for doc in docs]
+        for field, default in ROLLUP_DIMENSIONS.items():
+            dictionary = self._dictionaries[field]
+            self._codes[field][positions] = [
+                dictionary.code(str(doc.get(field) if doc.get(field) is not None else default)) for doc in docs
+            ]
+        is_pageview = np.array([doc.get("event_type") == "pageview" for doc in docs])
+        self._new_visitor[positions] = is_pageview & [bool(doc.get("is_new_visitor")) for doc in docs]
+        self._returning[positions] = is_pageview & [bool(doc.get("is_returning")) for doc in docs]
+        self._duration[positions] = [doc.get("session_duration") or 0 for doc in docs]
+        self._has_session[positions] = [bool(doc.get("session_id")) for doc in docs]
+        self._session_hash[positions] = np.array([
+            HyperLogLog.hash_value(doc["session_id"]) if doc.get("session_id") else 0 for doc in docs
+        ], dtype=np.uint64)
         
-        # Page views
-        if event_type == "pageview":
-            stats.page_views += 1
-            
-            # Visitor type
-            if event.get("is_new_visitor"):
-                new_visitors += 1
-            if event.get("is_returning"):
-                returning_visitors += 1
+        self._head = (self._head + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+        if overwrites:
+            oldest = int(self._timestamps[self._head])
+            self.since = datetime.fromtimestamp(oldest / 1000, tz=timezone.utc)
+    
+    def bucket(self, start: datetime, end: datetime) -> tuple:
+        """(rollup-shaped counters, exact unique session count) for [start, end)"""
+        size = self.size
+        timestamps = self._timestamps[:size]
+        mask = (timestamps >= int(start.timestamp() * 1000)) & (timestamps < int(end.timestamp() * 1000))
         
-        # Button clicks
-        if event_type == "click":
-            stats.button_clicks += 1
+        bucket: Dict[str, Any] = {
+            "events": int(mask.sum()),
+            "duration_total": int(self._duration[:size][mask].sum()),
+            "duration_count": int((self._duration[:size][mask] > 0).sum()),
+            "visitors": {
+                "new": int(self._new_visitor[:size][mask].sum()),
+                "returning": int(self._returning[:size][mask].sum()),
+            },
+        }
+        for field in ROLLUP_DIMENSIONS:
+            values = self._dictionaries[field].values
+            counts = np.bincount(self._codes[field][:size][mask], minlength=len(values))
+            bucket[field] = {rollup_key(values[code]): int(counts[code]) for code in np.flatnonzero(counts)}
         
-        # Conversions
-        if event_type == "conversion":
-            stats.conversions += 1
+        hashes = self._session_hash[:size][mask & self._has_session[:size]]
+        bucket["sessions_hll"] = self.sketch(hashes)
+        return bucket, int(np.unique(hashes).size)
+    
+    @staticmethod
+    def sketch(hashes: np.ndarray) -> Dict[int, int]:
+        """HyperLogLog registers of session hashes, same layout as HyperLogLog.register_for"""
+        rest_bits = 64 - HyperLogLog.PRECISION
+        index = (hashes >> np.uint64(rest_bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << rest_bits) - 1)
+        # rest < 2**52 converts to float exactly, so frexp's exponent is its bit length
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (rest_bits - bit_length + 1).astype(np.uint8)
+        registers = np.zeros(HyperLogLog.REGISTERS, dtype=np.uint8)
+        np.maximum.at(registers, index, rank)
+        return {int(i): int(registers[i]) for i in np.flatnonzero(registers)}
+
+
+recent_events = RecentEvents(ANALYTICS_REALTIME_CAPACITY)
+
+
+# ==================== ANALYTICS INGESTION ====================
+
+ANALYTICS_BUFFER_MAX_EVENTS = int(os.environ.get('ANALYTICS_BUFFER_MAX_EVENTS', '20000'))
+ANALYTICS_FLUSH_BATCH_SIZE = int(os.environ.get('ANALYTICS_FLUSH_BATCH_SIZE', '500'))
+ANALYTICS_FLUSH_INTERVAL_SECONDS = float(os.environ.get('ANALYTICS_FLUSH_INTERVAL_SECONDS', '1'))
+ANALYTICS_MAX_BATCH_EVENTS = int(os.environ.get('ANALYTICS_MAX_BATCH_EVENTS', '500'))
+# Checked while the body is read, before it is parsed
+ANALYTICS_MAX_BATCH_BYTES = int(os.environ.get('ANALYTICS_MAX_BATCH_BYTES', str(1024 * 1024)))
+# How long a request waits for buffer space before it's rejected with 503
+ANALYTICS_ENQUEUE_TIMEOUT_SECONDS = float(os.environ.get('ANALYTICS_ENQUEUE_TIMEOUT_SECONDS', '0.5'))
+
+class AnalyticsBuffer:
+    """
+    In-process write buffer for analytics events.
+    
+    Requests only append to memory; a background writer flushes the buffer with
+    insert_many(ordered=False) once a batch is full or the flush interval has
+    passed. When the buffer is full (Mongo slower than the incoming traffic)
+    submitters wait briefly for space and are then rejected, so memory stays
+    bounded. Remaining events are written on shutdown.
+    """
+    
+    def __init__(self, max_events: int, batch_size: int, flush_interval: float):
+        self.max_events = max_events
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._events: List[Dict[str, Any]] = []
+        self._space = asyncio.Condition()
+        self._flush_requested = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"accepted": 0, "rejected": 0, "written": 0, "failed": 0, "flushes": 0}
+    
+    def __len__(self):
+        return len(self._events)
+    
+    async def submit(self, docs: List[Dict[str, Any]]) -> bool:
+        """Queue documents for writing. Returns False when there was no room in time."""
+        if len(docs) > self.max_events:
+            self.stats["rejected"] += len(docs)
+            return False
         
-        # Session duration
-        if event.get("session_duration"):
-            session_durations.append(event["session_duration"])
+        async with self._space:
+            try:
+                await asyncio.wait_for(
+                    self._space.wait_for(lambda: len(self._events) + len(docs) <= self.max_events),
+                    ANALYTICS_ENQUEUE_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                self.stats["rejected"] += len(docs)
+                return False
+            self._events.extend(docs)
         
-        # Device tracking
-        device = event.get("device_type", "desktop")
-        devices[device] += 1
+        self.stats["accepted"] += len(docs)
+        if len(self._events) >= self.batch_size:
+            self._flush_requested.set()
+        return True
+    
+    async def start(self):
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the writer and write whatever is still buffered"""
+        if self._task:
+            # Not cancelled: a cancel in the middle of insert_many would lose the batch
+            self._stopping.set()
+            self._flush_requested.set()
+            await self._task
+            self._task = None
+        else:
+            await self.flush()
+        if self._events:
+            logger.error(f"Dropped {len(self._events)} analytics events on shutdown")
+    
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            if self._stopping.is_set():
+                break
+            if not await self.flush():
+                # Mongo unavailable: keep the events and back off for one interval
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+        # Final flush on shutdown
+        await self.flush()
+    
+    async def flush(self) -> bool:
+        """Write all buffered events in batches. Returns False if a batch could not be written."""
+        while self._events:
+            batch = self._events[:self.batch_size]
+            del self._events[:self.batch_size]
+            written = []
+            groups = analytics_partitions.split(batch)
+            try:
+                # One insert per partition; a batch spans two only around a month boundary
+                while groups:
+                    name, group = groups[0]
+                    collection = await analytics_partitions.collection_for_write(name)
+                    try:
+                        await collection.insert_many(group, ordered=False)
+                        written += group
+                    except BulkWriteError as e:
+                        # Individual documents were rejected (e.g. duplicate ids), the rest are written
+                        failed = {error["index"] for error in e.details.get("writeErrors", [])}
+                        written += [doc for i, doc in enumerate(group) if i not in failed]
+                        self.stats["failed"] += len(failed)
+                        logger.warning(f"{len(failed)} analytics events were rejected by MongoDB")
+                    groups.pop(0)
+            except Exception as e:
+                unwritten = [doc for _, group in groups for doc in group]
+                logger.error(f"Could not write {len(unwritten)} analytics events: {e}")
+                # Put them back in front, they're written on the next flush
+                self._events[:0] = unwritten
+            except BaseException:
+                # Cancelled mid-write: keep the unwritten events buffered for whoever flushes next
+                self._events[:0] = [doc for _, group in groups for doc in group]
+                self.stats["written"] += len(written)
+                try:
+                    await analytics_rollups.record(written)
+                except Exception as e:
+                    logger.error(f"Could not update analytics rollups: {e}")
+                raise
+            finally:
+                self.stats["flushes"] += 1
+                async with self._space:
+                    self._space.notify_all()
+            
+            self.stats["written"] += len(written)
+            try:
+                await analytics_rollups.record(written)
+            except Exception as e:
+                # The raw events are stored; a rollup rebuild restores the counters
+                logger.error(f"Could not update analytics rollups: {e}")
+            if groups:
+                return False
+        return True
+
+
+analytics_buffer = AnalyticsBuffer(
+    ANALYTICS_BUFFER_MAX_EVENTS,
+    ANALYTICS_FLUSH_BATCH_SIZE,
+    ANALYTICS_FLUSH_INTERVAL_SECONDS
+)
+
+
+ANALYTICS_SESSION_TTL_HOURS = float(os.environ.get('ANALYTICS_SESSION_TTL_HOURS', '24'))
+ANALYTICS_SEEN_SESSIONS_MAX = int(os.environ.get('ANALYTICS_SEEN_SESSIONS_MAX', '500000'))
+
+class SeenSessions:
+    """
+    Sessions that already had a pageview, used to tell returning visitors apart.
+    
+    Kept in memory ordered by last pageview, so expired and overflowing entries
+    are always at the front. Rebuilt from the recent pageviews on startup. Each
+    worker has its own copy; a session whose earlier pageview went to another
+    worker since startup is counted as new.
+    """
+    
+    def __init__(self, ttl_seconds: float, max_sessions: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, float]" = OrderedDict()
+    
+    def __len__(self):
+        return len(self._sessions)
+    
+    def __contains__(self, session_id: str) -> bool:
+        last_seen = self._sessions.get(session_id)
+        return last_seen is not None and time.monotonic() - last_seen < self.ttl_seconds
+    
+    def add(self, session_id: str):
+        self._sessions[session_id] = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        self._prune()
+    
+    def clear(self):
+        self._sessions.clear()
+    
+    def _prune(self):
+        expires = time.monotonic() - self.ttl_seconds
+        while self._sessions:
+            session_id, last_seen = next(iter(self._sessions.items()))
+            if last_seen >= expires and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+    
+    async def load(self):
+        """Rebuild from the pageviews stored within the TTL"""
+        now = datetime.now(timezone.utc)
+        cutoff = now - timedelta(seconds=self.ttl_seconds)
+        pipeline = [
+            {"$match": {"event_type": "pageview"}},
+            {"$group": {"_id": "$session_id", "last_seen": {"$max": "$timestamp"}}},
+            {"$sort": {"last_seen": -1}},
+            {"$limit": self.max_sessions},
+            {"$sort": {"last_seen": 1}}
+        ]
+        now_monotonic = time.monotonic()
+        self.clear()
+        async for row in analytics_partitions.aggregate(cutoff, now, pipeline):
+            age = (now - utc_datetime(row["last_seen"])).total_seconds()
+            self._sessions[row["_id"]] = now_monotonic - age
+        logger.info(f"Loaded {len(self._sessions)} seen analytics sessions")
+
+
+seen_sessions = SeenSessions(ANALYTICS_SESSION_TTL_HOURS * 3600, ANALYTICS_SEEN_SESSIONS_MAX)
+
+async def migrate_analytics_timestamps(batch_size: int = 1000) -> int:
+    """
+    Convert events stored with ISO string timestamps to BSON dates, one batch
+    at a time in _id order. Safe to interrupt: the next run continues with
+    whatever is still a string.
+    """
+    converted = 0
+    last_id = None
+    while True:
+        query: Dict[str, Any] = {"timestamp": {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = await db.analytics_events.find(query, {"_id": 1, "timestamp": 1}) \
+            .sort("_id", ASCENDING).limit(batch_size).to_list(batch_size)
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+        
+        operations = []
+        for doc in docs:
+            try:
+                timestamp = utc_datetime(doc["timestamp"])
+            except ValueError:
+                logger.warning(f"Skipping analytics event {doc['_id']} with invalid timestamp {doc['timestamp']!r}")
+                continue
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"timestamp": timestamp}}))
+        if operations:
+            await db.analytics_events.bulk_write(operations, ordered=False)
+            converted += len(operations)
+    
+    if converted:
+        logger.info(f"Converted {converted} analytics event timestamps to dates")
+    return converted
+
+async def migrate_analytics_events():
+    """Startup migration of stored events: dates first, then partitions"""
+    try:
+        await migrate_analytics_timestamps()
+        await analytics_partitions.absorb_legacy()
+    except Exception as e:
+        logger.error(f"Analytics event migration failed: {e}")
+
+analytics_migration_task: Optional[asyncio.Task] = None
+
+
+# ==================== ANALYTICS API ====================
+
+async def build_analytics_events(events: List[AnalyticsEventCreate], request: Request) -> List[AnalyticsEvent]:
+    """
+    Enrich tracked events with device, traffic source and visitor info.
+    Returning visitors are looked up in seen_sessions, without a query.
+    UA parsing and referrer classification run once per distinct value.
+    """
+    ip_address = client_ip(request)
+    country, city = geoip.lookup(ip_address)
+    header_user_agent = request.headers.get("user-agent", "")
+    
+    user_agent_strings = list({event_data.user_agent or header_user_agent for event_data in events})
+    ua_infos = dict(zip(
+        user_agent_strings,
+        await asyncio.gather(*(ua_classifier.classify(ua) for ua in user_agent_strings))
+    ))
+    traffic_infos: Dict[Optional[str], Dict[str, str]] = {}
+    
+    result = []
+    for event_data in events:
+        user_agent_str = event_data.user_agent or header_user_agent
+        ua_info = ua_infos[user_agent_str]
         
-        # Geography
-        country = event.get("country", "Unknown")
-        city = event.get("city", "Unknown")
-        if country != "Unknown":
-            countries[country] += 1
-        if city != "Unknown":
-            cities[city] += 1
+        if event_data.referrer not in traffic_infos:
+            traffic_infos[event_data.referrer] = determine_traffic_source(event_data.referrer)
+        traffic_info = traffic_infos[event_data.referrer]
         
-        # Traffic sources
-        traffic_source = event.get("traffic_source", "direct")
-        source_detail = event.get("source_detail", "Direct")
-        traffic_sources[traffic_source] += 1
-        source_details[source_detail] += 1
+        # Sessions that already had a pageview are returning visitors
+        is_returning = event_data.session_id in seen_sessions
+        event = AnalyticsEvent(
+            **event_data.model_dump(exclude={"user_agent"}),
+            user_agent=user_agent_str,
+            device_type=ua_info["device_type"],
+            browser=ua_info["browser"],
+            os=ua_info["os"],
+            traffic_source=traffic_info["traffic_source"],
+            source_detail=traffic_info["source_detail"],
+            ip_address=ip_address,
+            country=country,
+            city=city,
+            is_returning=is_returning,
+            is_new_visitor=not is_returning
+        )
+        if event.event_type == "pageview":
+            seen_sessions.add(event.session_id)
+        result.append(event)
     
-    # Calculate metrics
-    stats.unique_sessions = len(unique_sessions)
+    return result
+
+async def enqueue_analytics_events(events: List[AnalyticsEvent]):
+    """Queue events for the background writer, 503 when the buffer has no room"""
+    docs = [event.model_dump() for event in events]
+    if not await analytics_buffer.submit(docs):
+        raise HTTPException(
+            status_code=503,
+            detail="Analytics ingestion is overloaded, retry later",
+            headers={"Retry-After": "1"}
+        )
+    recent_events.append(docs)
+
+@api_router.post("/analytics/track", status_code=202)
+async def track_analytics_event(event_data: AnalyticsEventCreate, request: Request):
+    """
+    Track an analytics event (pageview, click, conversion, etc.)
+    The event is accepted into the ingestion buffer and written in the background.
+    """
+    events = await build_analytics_events([event_data], request)
+    await enqueue_analytics_events(events)
+    
+    return {"success": True, "event_id": events[0].id}
+
+async def read_limited_body(request: Request, limit: int) -> bytes:
+    """Request body, rejected with 413 as soon as it is known to exceed limit bytes"""
+    too_large = HTTPException(status_code=413, detail=f"Body is larger than {limit} bytes")
+    try:
+        declared = int(request.headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length")
+    if declared > limit:
+        raise too_large
+    
+    # Content-Length may be missing (chunked) or wrong, so count while reading
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise too_large
+    return bytes(body)
+
+@api_router.post("/analytics/track/batch", status_code=202)
+async def track_analytics_events_batch(request: Request):
+    """
+    Track several events in one request.
+    Accepts a JSON array of events (or {"events": [...]}). The body is parsed
+    regardless of Content-Type, so navigator.sendBeacon can send it as
+    text/plain without a CORS preflight.
+    """
+    try:
+        payload = json.loads(await read_limited_body(request, ANALYTICS_MAX_BATCH_BYTES) or b"null")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be JSON")
+    
+    if isinstance(payload, dict):
+        payload = payload.get("events")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Expected an array of events")
+    if len(payload) > ANALYTICS_MAX_BATCH_EVENTS:
+        raise HTTPException(status_code=413, detail=f"At most {ANALYTICS_MAX_BATCH_EVENTS} events per batch")
+    if not payload:
+        return {"success": True, "accepted": 0, "event_ids": []}
+    
+    try:
+        events_data = analytics_events_adapter.validate_python(payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=jsonable_encoder(e.errors(include_url=False)))
+    
+    events = await build_analytics_events(events_data, request)
+    await enqueue_analytics_events(events)
+    
+    return {"success": True, "accepted": len(events), "event_ids": [e.id for e in events]}
+
+
+def percent(part: int, total: int) -> float:
+    return round((part / total) * 100, 2) if total else 0.0
+
+def top_counts(counts: Dict[str, int], limit: int = 10, skip=("Unknown",)) -> List[tuple]:
+    """Most frequent values, ties broken by name"""
+    items = [(value, count) for value, count in counts.items() if value not in skip and count]
+    return sorted(items, key=lambda x: (-x[1], x[0]))[:limit]
+
+def analytics_stats_from_totals(totals: Dict[str, Any], unique_sessions: int) -> AnalyticsStats:
+    """Build the stats response from merged rollup counters"""
+    if not totals["events"]:
+        return AnalyticsStats()
+    
+    total_events = totals["events"]
+    event_types = totals["event_type"]
+    stats = AnalyticsStats(
+        page_views=event_types.get("pageview", 0),
+        unique_sessions=unique_sessions,
+        button_clicks=event_types.get("click", 0),
+        conversions=event_types.get("conversion", 0),
+    )
     
     # Conversion rate
-    if stats.unique_sessions > 0:
-        stats.conversion_rate = round((stats.conversions / stats.unique_sessions) * 100, 2)
+    stats.conversion_rate = percent(stats.conversions, stats.unique_sessions)
     
     # Average session duration
-    if session_durations:
-        stats.avg_session_duration = int(sum(session_durations) / len(session_durations))
+    if totals["duration_count"]:
+        stats.avg_session_duration = int(totals["duration_total"] / totals["duration_count"])
     
     # Visitor types
-    total_visitors = new_visitors + returning_visitors
-    if total_visitors > 0:
-        stats.new_visitors = new_visitors
-        stats.returning_visitors = returning_visitors
-        stats.new_visitors_percent = round((new_visitors / total_visitors) * 100, 2)
-        stats.returning_visitors_percent = round((returning_visitors / total_visitors) * 100, 2)
+    stats.new_visitors = totals["visitors"]["new"]
+    stats.returning_visitors = totals["visitors"]["returning"]
+    total_visitors = stats.new_visitors + stats.returning_visitors
+    stats.new_visitors_percent = percent(stats.new_visitors, total_visitors)
+    stats.returning_visitors_percent = percent(stats.returning_visitors, total_visitors)
     
     # Device breakdown
-    total_device_events = sum(devices.values())
-    if total_device_events > 0:
-        stats.desktop_visitors = devices.get("desktop", 0)
-        stats.mobile_visitors = devices.get("mobile", 0)
-        stats.tablet_visitors = devices.get("tablet", 0)
-        stats.desktop_percent = round((stats.desktop_visitors / total_device_events) * 100, 2)
-        stats.mobile_percent = round((stats.mobile_visitors / total_device_events) * 100, 2)
-        stats.tablet_percent = round((stats.tablet_visitors / total_device_events) * 100, 2)
-    
-    # Top countries
-    stats.top_countries = [
-        {"name": country, "count": count}
-        for country, count in sorted(countries.items(), key=lambda x: x[1], reverse=True)[:10]
-    ]
+    devices = totals["device_type"]
+    stats.desktop_visitors = devices.get("desktop", 0)
+    stats.mobile_visitors = devices.get("mobile", 0)
+    stats.tablet_visitors = devices.get("tablet", 0)
+    stats.desktop_percent = percent(stats.desktop_visitors, total_events)
+    stats.mobile_percent = percent(stats.mobile_visitors, total_events)
+    stats.tablet_percent = percent(stats.tablet_visitors, total_events)
     
-    # Top cities
-    stats.top_cities = [
-        {"name": city, "count": count}
-        for city, count in sorted(cities.items(), key=lambda x: x[1], reverse=True)[:10]
-    ]
+    # Geography
+    stats.top_countries = [{"name": name, "count": count} for name, count in top_counts(totals["country"])]
+    stats.top_cities = [{"name": name, "count": count} for name, count in top_counts(totals["city"])]
     
     # Traffic sources
-    total_traffic = sum(traffic_sources.values())
-    if total_traffic > 0:
-        stats.direct_traffic = traffic_sources.get("direct", 0)
-        stats.referral_traffic = traffic_sources.get("referral", 0)
-        stats.search_traffic = traffic_sources.get("search", 0)
-        stats.direct_percent = round((stats.direct_traffic / total_traffic) * 100, 2)
-        stats.referral_percent = round((stats.referral_traffic / total_traffic) * 100, 2)
-        stats.search_percent = round((stats.search_traffic / total_traffic) * 100, 2)
+    sources = totals["traffic_source"]
+    stats.direct_traffic = sources.get("direct", 0)
+    stats.referral_traffic = sources.get("referral", 0)
+    stats.search_traffic = sources.get("search", 0)
+    stats.direct_percent = percent(stats.direct_traffic, total_events)
+    stats.referral_percent = percent(stats.referral_traffic, total_events)
+    stats.search_percent = percent(stats.search_traffic, total_events)
     
     # Detailed sources
     stats.detailed_sources = [
-        {"source": source, "count": count, "percent": round((count / total_traffic) * 100, 2)}
-        for source, count in sorted(source_details.items(), key=lambda x: x[1], reverse=True)[:10]
+        {"source": source, "count": count, "percent": percent(count, total_events)}
+        for source, count in top_counts(totals["source_detail"], skip=())
     ]
     
     return stats
 
+@api_router.get("/analytics/stats")
+async def get_analytics_stats(period: int = 30, exact: bool = False):
+    """
+    Get analytics statistics for a given period (days)
+    period: 7, 30, or 90 days
+    exact: count unique sessions from raw events instead of the rollup
+    HyperLogLog sketches (periods up to ANALYTICS_EXACT_SESSIONS_MAX_DAYS)
+    All other counters come from the hourly/daily rollups.
+    """
+    if exact and period > ANALYTICS_EXACT_SESSIONS_MAX_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Exact session counts are limited to {ANALYTICS_EXACT_SESSIONS_MAX_DAYS} days"
+        )
+    
+    # Calculate date range
+    end_date = datetime.now(timezone.utc)
+    start_date = end_date - timedelta(days=period)
+    
+    totals = AnalyticsRollups.merge(await analytics_rollups.load(start_date, end_date))
+    if not totals["events"]:
+        return AnalyticsStats()
+    
+    if exact:
+        # Matched on the timestamp index of every partition in the period
+        sessions = await analytics_partitions.aggregate(bucket_start(start_date, "hour"), end_date, [
+            {"$group": {"_id": "$session_id"}},
+            {"$match": {"_id": {"$nin": [None, ""]}}},
+            {"$count": "count"}
+        ]).to_list(1)
+        unique_sessions = sessions[0]["count"] if sessions else 0
+    else:
+        unique_sessions = totals["sessions"].count()
+    
+    return analytics_stats_from_totals(totals, unique_sessions)
+
+
+def prorate_bucket(bucket: Dict[str, Any], fraction: float) -> Dict[str, Any]:
+    """Counters of a bucket scaled to the part of it inside a window (sketch kept as is)"""
+    scaled = {**bucket}
+    for field in ("events", "duration_total", "duration_count"):
+        scaled[field] = round(bucket.get(field, 0) * fraction)
+    for field in ("visitors", *ROLLUP_DIMENSIONS):
+        scaled[field] = {key: round(count * fraction) for key, count in bucket.get(field, {}).items()}
+    return scaled
+
+async def rollup_window(start: datetime, end: datetime) -> tuple:
+    """
+    (totals, unique sessions) of [start, end) from the hourly rollups of all
+    workers. The hour start falls in is prorated by the part of it inside
+    the window, assuming events spread evenly over it.
+    """
+    first_hour = bucket_start(start, "hour")
+    buckets = await analytics_rollups.load(first_hour, end)
+    fraction = 1 - (start - first_hour) / timedelta(hours=1)
+    first = [bucket for bucket in buckets if utc_datetime(bucket["bucket"]) == first_hour]
+    rest = [bucket for bucket in buckets if utc_datetime(bucket["bucket"]) != first_hour]
+    
+    totals = AnalyticsRollups.merge(rest + [prorate_bucket(bucket, fraction) for bucket in first])
+    # Sessions are not additive: take the share of the first hour's sessions, at most the union
+    first_sessions = AnalyticsRollups.merge(first)["sessions"].count()
+    rest_sessions = AnalyticsRollups.merge(rest)["sessions"].count()
+    unique_sessions = min(totals["sessions"].count(), rest_sessions + round(first_sessions * fraction))
+    return totals, unique_sessions
+
+@api_router.get("/analytics/realtime")
+async def get_realtime_analytics(minutes: int = 60):
+    """
+    Stats of the last `minutes` (up to a day).
+    
+    While this worker's buffer of recent events covers the window, they are
+    computed from it without querying MongoDB, and count only the events
+    this worker accepted (scope "worker"). Otherwise (e.g. shortly after a
+    restart) they come from the hourly rollups of all workers, with the
+    first hour prorated (scope "all").
+    """
+    if not 1 <= minutes <= ANALYTICS_REALTIME_MAX_MINUTES:
+        raise HTTPException(status_code=400, detail=f"minutes must be between 1 and {ANALYTICS_REALTIME_MAX_MINUTES}")
+    
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(minutes=minutes)
+    
+    if start >= recent_events.since:
+        bucket, unique_sessions = recent_events.bucket(start, end)
+        totals = AnalyticsRollups.merge([bucket])
+        scope = "worker"
+    else:
+        totals, unique_sessions = await rollup_window(start, end)
+        scope = "all"
+    
+    return {
+        **analytics_stats_from_totals(totals, unique_sessions).model_dump(),
+        "scope": scope,
+        "window_start": start,
+        "window_end": end,
+    }
 
 @api_router.delete("/analytics/clear")
 async def clear_analytics_data():
     """Clear all analytics data (admin only)"""
-    result = await db.analytics_events.delete_many({})
-    return {"success": True, "deleted_count": result.deleted_count}
+    deleted_count = await analytics_partitions.clear()
+    await analytics_rollups.collection.delete_many({})
+    seen_sessions.clear()
+    recent_events.clear()
+    return {"success": True, "deleted_count": deleted_count}
+
+ANALYTICS_EXPORT_FIELDS = [name for name in AnalyticsEvent.model_fields]
+# Visitor IPs are personal data: exported only when listed in `fields` explicitly
+ANALYTICS_EXPORT_DEFAULT_FIELDS = [name for name in ANALYTICS_EXPORT_FIELDS if name != "ip_address"]
+ANALYTICS_EXPORT_CHUNK_EVENTS = 1000
+
+def export_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return utc_datetime(value).isoformat()
+    return value
+
+async def export_analytics_chunks(start: datetime, end: datetime, fields: List[str],
+                                  export_format: str, compress: bool):
+    """
+    Encoded export chunks of about ANALYTICS_EXPORT_CHUNK_EVENTS events each,
+    read partition by partition from server-side cursors in timestamp order.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None  # 31: gzip container
+    
+    def encode(text: str) -> bytes:
+        data = text.encode()
+        return compressor.compress(data) if compressor else data
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == "csv" else None
+    if writer:
+        writer.writerow(fields)
+    
+    rows = 0
+    projection = {"_id": 0, **{field: 1 for field in fields}}
+    for name in analytics_partitions.names_between(start, end):
+        cursor = db[name].find({"timestamp": {"$gte": start, "$lt": end}}, projection) \
+            .sort("timestamp", ASCENDING).batch_size(ANALYTICS_EXPORT_CHUNK_EVENTS)
+        async for doc in cursor:
+            if writer:
+                writer.writerow([export_value(doc.get(field)) for field in fields])
+            else:
+                buffer.write(json.dumps({field: export_value(doc.get(field)) for field in fields}))
+                buffer.write("\n")
+            rows += 1
+            if rows % ANALYTICS_EXPORT_CHUNK_EVENTS == 0:
+                chunk = encode(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate()
+                if chunk:
+                    yield chunk
+    
+    chunk = encode(buffer.getvalue())
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+
+@api_router.get("/admin/analytics/export", dependencies=[Depends(require_admin_bearer)])
+async def export_analytics_events(
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    format: str = "ndjson",
+    fields: Optional[str] = None,
+    gzip: bool = False
+):
+    """
+    Stream raw analytics events of [from, to) as NDJSON or CSV (admin only).
+    Defaults to the last 24 hours. fields: comma separated subset of event
+    fields, all but ip_address by default. gzip: compress the download (.gz file).
+    """
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    
+    end = utc_datetime(to) if to else datetime.now(timezone.utc)
+    start = utc_datetime(from_) if from_ else end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="from must be before to")
+    
+    selected = ANALYTICS_EXPORT_DEFAULT_FIELDS
+    if fields:
+        selected = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in selected if field not in ANALYTICS_EXPORT_FIELDS]
+        if unknown or not selected:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    
+    filename = f"analytics_{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}.{format}"
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    return StreamingResponse(
+        export_analytics_chunks(start, end, selected, format, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@api_router.post("/admin/analytics/rollups/rebuild")
+async def rebuild_analytics_rollups(days: int = 90):
+    """
+    Rebuild the rollups of the last `days` full days from raw events.
+    Today's buckets are kept as they are, they're still being written by ingestion.
+    """
+    if days < 1:
+        raise HTTPException(status_code=400, detail="days must be positive")
+    end = bucket_start(datetime.now(timezone.utc), "day")
+    start = end - timedelta(days=days)
+    events = await analytics_rollups.rebuild(start, end)
+    return {"success": True, "start": start.isoformat(), "end": end.isoformat(), "events": events}
+
+@api_router.get("/admin/analytics/ingestion")
+async def get_analytics_ingestion_stats():
+    """Counters of the ingestion buffer and enrichment caches of this worker"""
+    return {
+        "buffer": {**analytics_buffer.stats, "queued": len(analytics_buffer), "max_events": analytics_buffer.max_events},
+        "seen_sessions": len(seen_sessions),
+        "recent_events": {"size": recent_events.size, "capacity": recent_events.capacity, "since": recent_events.since},
+        "user_agents": ua_classifier.stats(),
+        "geoip": geoip.stats(),
+    }
 
 
 # ==================== EXISTING ROUTES ====================
@@ -2056,9 +3971,9 @@ class EvolutionLevelUpdate(BaseModel):
     gradient_to: Optional[str] = None
     order: Optional[int] = None
 
-@api_router.get("/evolution-levels")
+@api_router.get("/evolution-levels", dependencies=[Depends(conditional_get("evolution_levels"))])
 async def get_evolution_levels():
-    levels = await db.evolution_levels.find({}, {"_id": 0}).to_list(100)
+    levels = await db.evolution_levels.find({}, CONTENT_PROJECTION).sort(ORDER_KEY, 1).to_list(100)
     if not levels:
         # Default levels
         default_levels = [
@@ -2069,29 +3984,33 @@ async def get_evolution_levels():
             {"id": str(uuid4()), "rank": "Astral Sage", "fomo_score_min": 800, "fomo_score_max": 899, "next_level": "Universal Enlightenment (900)", "description": "You are now a recognized guide in the FOMO cosmos.", "animation_type": "astral", "gradient_from": "#ec4899", "gradient_to": "#db2777", "order": 4},
             {"id": str(uuid4()), "rank": "Universal Enlightenment", "fomo_score_min": 900, "fomo_score_max": 1000, "next_level": "Max level achieved!", "description": "You've reached the ultimate level. A symbol of cosmic influence.", "animation_type": "universal", "gradient_from": "#10b981", "gradient_to": "#059669", "order": 5},
         ]
-        for level in default_levels:
-            await db.evolution_levels.insert_one(level)
-        levels = default_levels
-    return sorted(levels, key=lambda x: x.get('order', 0))
+        await db.evolution_levels.insert_many(assign_order_keys(default_levels))
+        await invalidation_bus.publish("evolution_levels")
+        levels = await db.evolution_levels.find({}, CONTENT_PROJECTION).sort(ORDER_KEY, 1).to_list(100)
+    return number_positions(levels)
 
 @api_router.post("/evolution-levels")
 async def create_evolution_level(level: EvolutionLevelCreate):
     new_level = {
         "id": str(uuid4()),
         **level.model_dump(),
+        ORDER_KEY: await ordered_collections["evolution_levels"].key_for_position(
+            level.order if "order" in level.model_fields_set else None
+        ),
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.evolution_levels.insert_one(new_level)
-    created = await db.evolution_levels.find_one({"id": new_level["id"]}, {"_id": 0})
-    return created
+    return await repositories["evolution_levels"].create(new_level)
 
 @api_router.put("/evolution-levels/{level_id}")
 async def update_evolution_level(level_id: str, update: EvolutionLevelUpdate):
     update_dict = {k: v for k, v in update.model_dump().items() if v is not None}
     if update_dict:
         update_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-        await db.evolution_levels.update_one({"id": level_id}, {"$set": update_dict})
-    updated = await db.evolution_levels.find_one({"id": level_id}, {"_id": 0})
+        if "order" in update_dict:
+            update_dict[ORDER_KEY] = await ordered_collections["evolution_levels"].key_for_position(
+                update_dict["order"], exclude_id=level_id
+            )
+    updated = await repositories["evolution_levels"].update(level_id, update_dict)
     if not updated:
         raise HTTPException(status_code=404, detail="Level not found")
     return updated
@@ -2101,8 +4020,16 @@ async def delete_evolution_level(level_id: str):
     result = await db.evolution_levels.delete_one({"id": level_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Level not found")
+    await invalidation_bus.publish("evolution_levels")
     return {"message": "Level deleted"}
 
+@api_router.post("/evolution-levels/{level_id}/move")
+async def move_evolution_level(level_id: str, move: MoveRequest):
+    """Move a level between two neighbours, rewriting only the moved level"""
+    if not await ordered_collections["evolution_levels"].move(level_id, move.after_id, move.before_id):
+        raise HTTPException(status_code=404, detail="Level not found")
+    return {"message": "Level moved"}
+
 
 # ==================== EVOLUTION BADGES API ====================
 
@@ -2178,9 +4105,9 @@ class EvolutionBadgeUpdate(BaseModel):
     gradient_to: Optional[str] = None
     order: Optional[int] = None
 
-@api_router.get("/evolution-badges")
+@api_router.get("/evolution-badges", dependencies=[Depends(conditional_get("evolution_badges"))])
 async def get_evolution_badges():
-    badges = await db.evolution_badges.find({}, {"_id": 0}).to_list(100)
+    badges = await db.evolution_badges.find({}, CONTENT_PROJECTION).sort(ORDER_KEY, 1).to_list(100)
     if not badges:
         # Default badges with icons
         default_badges = [
@@ -2194,29 +4121,33 @@ async def get_evolution_badges():
             {"id": str(uuid4()), "name": "Community Star", "icon": "⚡", "xp_requirement": 35000, "condition": "through 20+ comments/discussions and earn ≥100 likes", "description": "The crowd listens when you speak — your contributions have earned trust and applause", "animation_type": "community", "gradient_from": "#ec4899", "gradient_to": "#db2777", "order": 7},
             {"id": str(uuid4()), "name": "Singularity", "icon": "👑", "xp_requirement": 100000, "condition": "unlock all 8 previous badges — singularity=true will be permanently linked to your NFT", "description": "You're one of a kind. All badges unlocked. The singularity=true tag is now forever part of your legacy", "animation_type": "singularity", "gradient_from": "#14b8a6", "gradient_to": "#0d9488", "order": 8},
         ]
-        for badge in default_badges:
-            await db.evolution_badges.insert_one(badge)
-        badges = default_badges
-    return sorted(badges, key=lambda x: x.get('order', 0))
+        await db.evolution_badges.insert_many(assign_order_keys(default_badges))
+        await invalidation_bus.publish("evolution_badges")
+        badges = await db.evolution_badges.find({}, CONTENT_PROJECTION).sort(ORDER_KEY, 1).to_list(100)
+    return number_positions(badges)
 
 @api_router.post("/evolution-badges")
 async def create_evolution_badge(badge: EvolutionBadgeCreate):
     new_badge = {
         "id": str(uuid4()),
         **badge.model_dump(),
+        ORDER_KEY: await ordered_collections["evolution_badges"].key_for_position(
+            badge.order if "order" in badge.model_fields_set else None
+        ),
         "created_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.evolution_badges.insert_one(new_badge)
-    created = await db.evolution_badges.find_one({"id": new_badge["id"]}, {"_id": 0})
-    return created
+    return await repositories["evolution_badges"].create(new_badge)
 
 @api_router.put("/evolution-badges/{badge_id}")
 async def update_evolution_badge(badge_id: str, update: EvolutionBadgeUpdate):
     update_dict = {k: v for k, v in update.model_dump().items() if v is not None}
     if update_dict:
         update_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-        await db.evolution_badges.update_one({"id": badge_id}, {"$set": update_dict})
-    updated = await db.evolution_badges.find_one({"id": badge_id}, {"_id": 0})
+        if "order" in update_dict:
+            update_dict[ORDER_KEY] = await ordered_collections["evolution_badges"].key_for_position(
+                update_dict["order"], exclude_id=badge_id
+            )
+    updated = await repositories["evolution_badges"].update(badge_id, update_dict)
     if not updated:
         raise HTTPException(status_code=404, detail="Badge not found")
     return updated
@@ -2226,8 +4157,16 @@ async def delete_evolution_badge(badge_id: str):
     result = await db.evolution_badges.delete_one({"id": badge_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Badge not found")
+    await invalidation_bus.publish("evolution_badges")
     return {"message": "Badge deleted"}
 
+@api_router.post("/evolution-badges/{badge_id}/move")
+async def move_evolution_badge(badge_id: str, move: MoveRequest):
+    """Move a badge between two neighbours, rewriting only the moved badge"""
+    if not await ordered_collections["evolution_badges"].move(badge_id, move.after_id, move.before_id):
+        raise HTTPException(status_code=404, detail="Badge not found")
+    return {"message": "Badge moved"}
+
 
 # ==================== OTC P2P MARKET MODELS ====================
 
@@ -2493,17 +4432,14 @@ async def create_p2p_deal(deal: P2PDealCreate):
         "created_at": datetime.now(timezone.utc).isoformat(),
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.p2p_deals.insert_one(new_deal)
-    created = await db.p2p_deals.find_one({"id": new_deal["id"]}, {"_id": 0})
-    return created
+    return await repositories["p2p_deals"].create(new_deal)
 
 @api_router.put("/p2p-deals/{deal_id}", response_model=P2PDeal)
 async def update_p2p_deal(deal_id: str, update: P2PDealUpdate):
     update_dict = {k: v for k, v in update.model_dump().items() if v is not None}
     if update_dict:
         update_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-        await db.p2p_deals.update_one({"id": deal_id}, {"$set": update_dict})
-    updated = await db.p2p_deals.find_one({"id": deal_id}, {"_id": 0})
+    updated = await repositories["p2p_deals"].update(deal_id, update_dict)
     if not updated:
         raise HTTPException(status_code=404, detail="Deal not found")
     return updated
@@ -2568,17 +4504,14 @@ async def create_arena_prediction(prediction: ArenaPredictionCreate):
         "created_at": datetime.now(timezone.utc).isoformat(),
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.arena_predictions.insert_one(new_prediction)
-    created = await db.arena_predictions.find_one({"id": new_prediction["id"]}, {"_id": 0})
-    return created
+    return await repositories["arena_predictions"].create(new_prediction)
 
 @api_router.put("/arena-predictions/{prediction_id}", response_model=ArenaPrediction)
 async def update_arena_prediction(prediction_id: str, update: ArenaPredictionUpdate):
     update_dict = {k: v for k, v in update.model_dump().items() if v is not None}
     if update_dict:
         update_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-        await db.arena_predictions.update_one({"id": prediction_id}, {"$set": update_dict})
-    updated = await db.arena_predictions.find_one({"id": prediction_id}, {"_id": 0})
+    updated = await repositories["arena_predictions"].update(prediction_id, update_dict)
     if not updated:
         raise HTTPException(status_code=404, detail="Prediction not found")
     return updated
@@ -2648,17 +4581,14 @@ async def create_influence_entity(entity: InfluenceEntityCreate):
         "created_at": datetime.now(timezone.utc).isoformat(),
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.influence_entities.insert_one(new_entity)
-    created = await db.influence_entities.find_one({"id": new_entity["id"]}, {"_id": 0})
-    return created
+    return await repositories["influence_entities"].create(new_entity)
 
 @api_router.put("/influence-entities/{entity_id}", response_model=InfluenceEntity)
 async def update_influence_entity(entity_id: str, update: InfluenceEntityUpdate):
     update_dict = {k: v for k, v in update.model_dump().items() if v is not None}
     if update_dict:
         update_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-        await db.influence_entities.update_one({"id": entity_id}, {"$set": update_dict})
-    updated = await db.influence_entities.find_one({"id": entity_id}, {"_id": 0})
+    updated = await repositories["influence_entities"].update(entity_id, update_dict)
     if not updated:
         raise HTTPException(status_code=404, detail="Entity not found")
     return updated
@@ -2725,17 +4655,14 @@ async def create_earlyland_opportunity(opportunity: EarlylandOpportunityCreate):
         "created_at": datetime.now(timezone.utc).isoformat(),
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.earlyland_opportunities.insert_one(new_opportunity)
-    created = await db.earlyland_opportunities.find_one({"id": new_opportunity["id"]}, {"_id": 0})
-    return created
+    return await repositories["earlyland_opportunities"].create(new_opportunity)
 
 @api_router.put("/earlyland-opportunities/{opportunity_id}", response_model=EarlylandOpportunity)
 async def update_earlyland_opportunity(opportunity_id: str, update: EarlylandOpportunityUpdate):
     update_dict = {k: v for k, v in update.model_dump().items() if v is not None}
     if update_dict:
         update_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-        await db.earlyland_opportunities.update_one({"id": opportunity_id}, {"$set": update_dict})
-    updated = await db.earlyland_opportunities.find_one({"id": opportunity_id}, {"_id": 0})
+    updated = await repositories["earlyland_opportunities"].update(opportunity_id, update_dict)
     if not updated:
         raise HTTPException(status_code=404, detail="Opportunity not found")
     return updated
@@ -2776,9 +4703,9 @@ class HeroButtonUpdate(BaseModel):
     order: Optional[int] = None
     is_active: Optional[bool] = None
 
-@api_router.get("/hero-buttons", response_model=List[HeroButton])
+@api_router.get("/hero-buttons", response_model=List[HeroButton], dependencies=[Depends(conditional_get("hero_buttons"))])
 async def get_hero_buttons():
-    buttons = await db.hero_buttons.find({"is_active": True}, {"_id": 0}).sort("order", 1).to_list(100)
+    buttons = await db.hero_buttons.find({"is_active": True}, CONTENT_PROJECTION).sort(ORDER_KEY, 1).to_list(100)
     if not buttons:
         # Default hero buttons (max 2)
         default_buttons = [
@@ -2803,30 +4730,34 @@ async def get_hero_buttons():
                 "updated_at": datetime.now(timezone.utc).isoformat()
             }
         ]
-        for button in default_buttons:
-            await db.hero_buttons.insert_one(button)
+        await db.hero_buttons.insert_many(assign_order_keys(default_buttons))
+        await invalidation_bus.publish("hero_buttons")
         buttons = default_buttons
-    return buttons
+    return number_positions(buttons)
 
 @api_router.post("/hero-buttons", response_model=HeroButton)
 async def create_hero_button(button: HeroButtonCreate):
     new_button = {
         "id": str(uuid4()),
         **button.model_dump(),
+        ORDER_KEY: await ordered_collections["hero_buttons"].key_for_position(
+            button.order if "order" in button.model_fields_set else None
+        ),
         "created_at": datetime.now(timezone.utc).isoformat(),
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.hero_buttons.insert_one(new_button)
-    created = await db.hero_buttons.find_one({"id": new_button["id"]}, {"_id": 0})
-    return created
+    return await repositories["hero_buttons"].create(new_button)
 
 @api_router.put("/hero-buttons/{button_id}", response_model=HeroButton)
 async def update_hero_button(button_id: str, update: HeroButtonUpdate):
     update_dict = {k: v for k, v in update.model_dump().items() if v is not None}
     if update_dict:
         update_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-        await db.hero_buttons.update_one({"id": button_id}, {"$set": update_dict})
-    updated = await db.hero_buttons.find_one({"id": button_id}, {"_id": 0})
+        if "order" in update_dict:
+            update_dict[ORDER_KEY] = await ordered_collections["hero_buttons"].key_for_position(
+                update_dict["order"], exclude_id=button_id
+            )
+    updated = await repositories["hero_buttons"].update(button_id, update_dict)
     if not updated:
         raise HTTPException(status_code=404, detail="Hero button not found")
     return updated
@@ -2836,8 +4767,16 @@ async def delete_hero_button(button_id: str):
     result = await db.hero_buttons.delete_one({"id": button_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Hero button not found")
+    await invalidation_bus.publish("hero_buttons")
     return {"message": "Hero button deleted"}
 
+@api_router.post("/hero-buttons/{button_id}/move")
+async def move_hero_button(button_id: str, move: MoveRequest):
+    """Move a hero button between two neighbours, rewriting only the moved button"""
+    if not await ordered_collections["hero_buttons"].move(button_id, move.after_id, move.before_id):
+        raise HTTPException(status_code=404, detail="Hero button not found")
+    return {"message": "Hero button moved"}
+
 
 # ==================== NAVIGATION SETTINGS ====================
 
@@ -2870,9 +4809,9 @@ class NavigationItemUpdate(BaseModel):
     order: Optional[int] = None
     is_active: Optional[bool] = None
 
-@api_router.get("/navigation-items", response_model=List[NavigationItem])
+@api_router.get("/navigation-items", response_model=List[NavigationItem], dependencies=[Depends(conditional_get("navigation_items"))])
 async def get_navigation_items():
-    items = await db.navigation_items.find({"is_active": True}, {"_id": 0}).sort("order", 1).to_list(100)
+    items = await db.navigation_items.find({"is_active": True}, CONTENT_PROJECTION).sort(ORDER_KEY, 1).to_list(100)
     if not items:
         # Default navigation items
         default_items = [
@@ -2943,30 +4882,34 @@ async def get_navigation_items():
                 "updated_at": datetime.now(timezone.utc).isoformat()
             }
         ]
-        for item in default_items:
-            await db.navigation_items.insert_one(item)
+        await db.navigation_items.insert_many(assign_order_keys(default_items))
+        await invalidation_bus.publish("navigation_items")
         items = default_items
-    return items
+    return number_positions(items)
 
 @api_router.post("/navigation-items", response_model=NavigationItem)
 async def create_navigation_item(item: NavigationItemCreate):
     new_item = {
         "id": str(uuid4()),
         **item.model_dump(),
+        ORDER_KEY: await ordered_collections["navigation_items"].key_for_position(
+            item.order if "order" in item.model_fields_set else None
+        ),
         "created_at": datetime.now(timezone.utc).isoformat(),
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
-    await db.navigation_items.insert_one(new_item)
-    created = await db.navigation_items.find_one({"id": new_item["id"]}, {"_id": 0})
-    return created
+    return await repositories["navigation_items"].create(new_item)
 
 @api_router.put("/navigation-items/{item_id}", response_model=NavigationItem)
 async def update_navigation_item(item_id: str, update: NavigationItemUpdate):
     update_dict = {k: v for k, v in update.model_dump().items() if v is not None}
     if update_dict:
         update_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-        await db.navigation_items.update_one({"id": item_id}, {"$set": update_dict})
-    updated = await db.navigation_items.find_one({"id": item_id}, {"_id": 0})
+        if "order" in update_dict:
+            update_dict[ORDER_KEY] = await ordered_collections["navigation_items"].key_for_position(
+                update_dict["order"], exclude_id=item_id
+            )
+    updated = await repositories["navigation_items"].update(item_id, update_dict)
     if not updated:
         raise HTTPException(status_code=404, detail="Navigation item not found")
     return updated
@@ -2976,29 +4919,38 @@ async def delete_navigation_item(item_id: str):
     result = await db.navigation_items.delete_one({"id": item_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Navigation item not found")
+    await invalidation_bus.publish("navigation_items")
     return {"message": "Navigation item deleted"}
 
+@api_router.post("/navigation-items/{item_id}/move")
+async def move_navigation_item(item_id: str, move: MoveRequest):
+    """Move a navigation item between two neighbours, rewriting only the moved item"""
+    if not await ordered_collections["navigation_items"].move(item_id, move.after_id, move.before_id):
+        raise HTTPException(status_code=404, detail="Navigation item not found")
+    return {"message": "Navigation item moved"}
+
 
 # ==================== UTILITIES API ====================
 
-@api_router.get("/utilities", response_model=List[Utility])
+@api_router.get("/utilities", response_model=List[Utility], dependencies=[Depends(conditional_get("utilities"))])
 async def get_utilities():
     """Get all active utilities sorted by order"""
-    utilities = await db.utilities.find({"is_active": True}, {"_id": 0}).sort("order", 1).to_list(100)
-    return utilities
+    utilities = await db.utilities.find({"is_active": True}, CONTENT_PROJECTION).sort(ORDER_KEY, 1).to_list(100)
+    return number_positions(utilities)
 
-@api_router.get("/utilities/all", response_model=List[Utility])
+@api_router.get("/utilities/all", response_model=List[Utility], dependencies=[Depends(conditional_get("utilities"))])
 async def get_all_utilities():
     """Get all utilities (including inactive) for admin panel"""
-    utilities = await db.utilities.find({}, {"_id": 0}).sort("order", 1).to_list(100)
-    return utilities
+    utilities = await db.utilities.find({}, CONTENT_PROJECTION).sort(ORDER_KEY, 1).to_list(100)
+    return number_positions(utilities)
 
-@api_router.get("/utilities/{utility_id}", response_model=Utility)
+@api_router.get("/utilities/{utility_id}", response_model=Utility, dependencies=[Depends(conditional_get("utilities"))])
 async def get_utility(utility_id: str):
     """Get a single utility by ID"""
     utility = await db.utilities.find_one({"id": utility_id}, {"_id": 0})
     if not utility:
         raise HTTPException(status_code=404, detail="Utility not found")
+    utility["order"] = await ordered_collections["utilities"].position_of(utility)
     return utility
 
 @api_router.post("/utilities", response_model=Utility)
@@ -3010,25 +4962,32 @@ async def create_utility(utility_data: UtilityCreate):
         created_at=datetime.now(timezone.utc),
         updated_at=datetime.now(timezone.utc)
     )
-    await db.utilities.insert_one(utility.model_dump())
+    doc = utility.model_dump()
+    doc[ORDER_KEY] = await ordered_collections["utilities"].key_for_position(
+        utility_data.order if "order" in utility_data.model_fields_set else None
+    )
+    await repositories["utilities"].create(doc)
     return utility
 
+@api_router.put("/utilities/reorder")
+async def reorder_utilities(utility_orders: List[dict]):
+    """Reorder utilities"""
+    await ordered_collections["utilities"].reorder(utility_orders)
+    return {"message": "Utilities reordered successfully"}
+
 @api_router.put("/utilities/{utility_id}", response_model=Utility)
 async def update_utility(utility_id: str, utility_data: UtilityUpdate):
     """Update an existing utility"""
-    existing = await db.utilities.find_one({"id": utility_id})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Utility not found")
-    
     update_dict = {k: v for k, v in utility_data.model_dump().items() if v is not None}
     update_dict["updated_at"] = datetime.now(timezone.utc).isoformat()
+    if "order" in update_dict:
+        update_dict[ORDER_KEY] = await ordered_collections["utilities"].key_for_position(
+            update_dict["order"], exclude_id=utility_id
+        )
     
-    await db.utilities.update_one(
-        {"id": utility_id},
-        {"$set": update_dict}
-    )
-    
-    updated = await db.utilities.find_one({"id": utility_id}, {"_id": 0})
+    updated = await repositories["utilities"].update(utility_id, update_dict)
+    if not updated:
+        raise HTTPException(status_code=404, detail="Utility not found")
     return updated
 
 @api_router.delete("/utilities/{utility_id}")
@@ -3037,115 +4996,705 @@ async def delete_utility(utility_id: str):
     result = await db.utilities.delete_one({"id": utility_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Utility not found")
+    await invalidation_bus.publish("utilities")
     return {"message": "Utility deleted successfully"}
 
-@api_router.put("/utilities/reorder")
-async def reorder_utilities(utility_orders: List[dict]):
-    """Reorder utilities"""
-    for item in utility_orders:
-        await db.utilities.update_one(
-            {"id": item["id"]},
-            {"$set": {"order": item["order"]}}
-        )
-    return {"message": "Utilities reordered successfully"}
+@api_router.post("/utilities/{utility_id}/move")
+async def move_utility(utility_id: str, move: MoveRequest):
+    """Move a utility between two neighbours, rewriting only the moved utility"""
+    if not await ordered_collections["utilities"].move(utility_id, move.after_id, move.before_id):
+        raise HTTPException(status_code=404, detail="Utility not found")
+    return {"message": "Utility moved successfully"}
 
 @api_router.post("/utilities/seed-defaults")
 async def seed_default_utilities():
     """Seed default utilities if none exist"""
 
 
-# ==================== CRYPTO PRICES API (with caching) ====================
+# ==================== UPSTREAM HTTP ====================
 
-# In-memory cache for crypto prices
-crypto_prices_cache = {
-    "data": None,
-    "last_updated": None
-}
-CACHE_DURATION_SECONDS = 300  # 5 minutes cache
+UPSTREAM_HTTP2 = os.environ.get('UPSTREAM_HTTP2', 'true').lower() == 'true'
+UPSTREAM_MAX_CONNECTIONS_PER_HOST = int(os.environ.get('UPSTREAM_MAX_CONNECTIONS_PER_HOST', '10'))
+UPSTREAM_MAX_KEEPALIVE_PER_HOST = int(os.environ.get('UPSTREAM_MAX_KEEPALIVE_PER_HOST', '5'))
+UPSTREAM_KEEPALIVE_SECONDS = float(os.environ.get('UPSTREAM_KEEPALIVE_SECONDS', '60'))
+UPSTREAM_TIMEOUT_SECONDS = float(os.environ.get('UPSTREAM_TIMEOUT_SECONDS', '10'))
+UPSTREAM_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT_SECONDS', '5'))
 
-@api_router.get("/crypto-prices")
-async def get_crypto_prices():
-    """Get cryptocurrency prices from CoinGecko with caching to avoid rate limits"""
-    global crypto_prices_cache
-    
-    now = datetime.now(timezone.utc)
-    
-    # Check if cache is valid
-    if crypto_prices_cache["data"] and crypto_prices_cache["last_updated"]:
-        cache_age = (now - crypto_prices_cache["last_updated"]).total_seconds()
-        if cache_age < CACHE_DURATION_SECONDS:
-            return {
-                "prices": crypto_prices_cache["data"],
-                "cached": True,
-                "cache_age_seconds": int(cache_age)
-            }
+class UpstreamHTTP:
+    """
+    Pooled HTTP clients for the external APIs, one per host so the
+    connection limits apply per host. Clients live from open() to close()
+    (app startup/shutdown) and keep connections alive between calls.
     
-    # Fetch fresh data from CoinGecko
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            # CoinGecko free API - get top cryptocurrencies
-            response = await client.get(
-                "https://api.coingecko.com/api/v3/simple/price",
-                params={
-                    "ids": "bitcoin,ethereum,zksync,binancecoin,ripple,cardano,dogecoin,polkadot,avalanche-2,chainlink",
-                    "vs_currencies": "usd",
-                    "include_24hr_change": "true",
-                    "include_market_cap": "true"
-                },
-                headers={
-                    "Accept": "application/json"
-                }
-            )
-            
-            if response.status_code == 429:
-                # Rate limited - return cached data if available, or error
-                if crypto_prices_cache["data"]:
-                    return {
-                        "prices": crypto_prices_cache["data"],
-                        "cached": True,
-                        "rate_limited": True,
-                        "message": "Rate limited, returning cached data"
-                    }
-                raise HTTPException(status_code=429, detail="CoinGecko rate limit reached and no cached data available")
+    Requests trace the connection pool: a response that came without
+    opening a new TCP connection reused a kept-alive one (or an HTTP/2
+    stream on it).
+    """
+    
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._open = False
+    
+    def open(self):
+        self._open = True
+    
+    async def close(self):
+        self._open = False
+        clients, self._clients = self._clients, {}
+        for http_client in clients.values():
+            await http_client.aclose()
+    
+    def client(self, host: str) -> httpx.AsyncClient:
+        if not self._open:
+            raise RuntimeError("Upstream HTTP clients are closed")
+        http_client = self._clients.get(host)
+        if http_client is None:
+            stats = self._stats.setdefault(host, {
+                "requests": 0, "responses": 0, "connections": 0, "reused": 0, "tls_handshakes": 0, "http2": 0
+            })
             
-            response.raise_for_status()
-            data = response.json()
+            async def on_request(request: httpx.Request):
+                stats["requests"] += 1
+                connected = request.extensions["upstream_connected"] = [False]
+                
+                async def trace(event: str, info: dict):
+                    if event == "connection.connect_tcp.complete":
+                        stats["connections"] += 1
+                        connected[0] = True
+                    elif event == "connection.start_tls.complete":
+                        stats["tls_handshakes"] += 1
+                
+                request.extensions["trace"] = trace
             
-            # Update cache
-            crypto_prices_cache["data"] = data
-            crypto_prices_cache["last_updated"] = now
+            async def on_response(response: httpx.Response):
+                stats["responses"] += 1
+                if not response.request.extensions["upstream_connected"][0]:
+                    stats["reused"] += 1
+                if response.http_version == "HTTP/2":
+                    stats["http2"] += 1
             
-            return {
-                "prices": data,
-                "cached": False,
-                "last_updated": now.isoformat()
+            http_client = httpx.AsyncClient(
+                http2=UPSTREAM_HTTP2,
+                limits=httpx.Limits(
+                    max_connections=UPSTREAM_MAX_CONNECTIONS_PER_HOST,
+                    max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE_PER_HOST,
+                    keepalive_expiry=UPSTREAM_KEEPALIVE_SECONDS
+                ),
+                timeout=httpx.Timeout(UPSTREAM_TIMEOUT_SECONDS, connect=UPSTREAM_CONNECT_TIMEOUT_SECONDS),
+                event_hooks={"request": [on_request], "response": [on_response]}
+            )
+            self._clients[host] = http_client
+        return http_client
+    
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.client(httpx.URL(url).host).get(url, **kwargs)
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        for host, stats in self._stats.items():
+            report[host] = {
+                **stats,
+                "errors": stats["requests"] - stats["responses"],
+                "reuse_rate": round(stats["reused"] / stats["responses"] * 100, 1) if stats["responses"] else 0.0,
             }
+        return report
+
+
+upstream_http = UpstreamHTTP()
+
+@api_router.get("/admin/upstream-http")
+async def get_upstream_http_stats():
+    """Connection reuse of the pooled upstream HTTP clients of this worker, and the fetches in flight"""
+    return {
+        "http2": UPSTREAM_HTTP2,
+        "max_connections_per_host": UPSTREAM_MAX_CONNECTIONS_PER_HOST,
+        "hosts": upstream_http.stats(),
+        "in_flight": upstream_flights.in_flight(),
+    }
+
+
+# ==================== PRICE PROVIDERS ====================
+
+PRICE_PROVIDER_FAILURE_THRESHOLD = int(os.environ.get('PRICE_PROVIDER_FAILURE_THRESHOLD', '3'))
+PRICE_PROVIDER_OPEN_SECONDS = float(os.environ.get('PRICE_PROVIDER_OPEN_SECONDS', '60'))
+COINGECKO_REQUESTS_PER_MINUTE = float(os.environ.get('COINGECKO_REQUESTS_PER_MINUTE', '10'))
+BINANCE_REQUESTS_PER_MINUTE = float(os.environ.get('BINANCE_REQUESTS_PER_MINUTE', '300'))
+CRYPTOCOMPARE_REQUESTS_PER_MINUTE = float(os.environ.get('CRYPTOCOMPARE_REQUESTS_PER_MINUTE', '30'))
+# Weight of the newest call in the latency and success averages
+PROVIDER_STATS_ALPHA = 0.2
+# Assumed latency of a provider that has not answered yet, so the static order holds until one has
+PROVIDER_LATENCY_PRIOR_SECONDS = 1.0
+
+# Shown by /crypto-market-data, so always tracked: symbol -> CoinGecko coin id
+MARKET_DATA_ASSETS = {"BTC": "bitcoin", "ETH": "ethereum", "ZK": "zksync"}
+
+def parse_assets(spec: str) -> Dict[str, str]:
+    """SYMBOL:coingecko-id pairs, comma separated"""
+    assets = {}
+    for pair in spec.split(","):
+        symbol, _, coin_id = pair.partition(":")
+        if symbol.strip() and coin_id.strip():
+            assets[symbol.strip().upper()] = coin_id.strip()
+    return assets
+
+# Listed by /crypto-prices
+CRYPTO_ASSETS = parse_assets(os.environ.get(
+    'CRYPTO_ASSETS',
+    'BTC:bitcoin,ETH:ethereum,ZK:zksync,BNB:binancecoin,XRP:ripple,'
+    'ADA:cardano,DOGE:dogecoin,DOT:polkadot,AVAX:avalanche-2,LINK:chainlink'
+))
+# The price cache fetches all of them in one batch
+TRACKED_ASSETS = {**MARKET_DATA_ASSETS, **CRYPTO_ASSETS}
+
+class ProviderUnavailable(Exception):
+    """The provider was skipped: its circuit is open or its quota is used up"""
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Rate limiting, server errors and network failures; these trip the circuit breaker"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+class CircuitBreaker:
+    """
+    Opens after threshold upstream failures in a row and rejects calls for
+    open_seconds. Then it lets a single probe through (half-open): success
+    closes it, failure opens it again.
+    """
+    
+    def __init__(self, threshold: int, open_seconds: float):
+        self.threshold = threshold
+        self.open_seconds = open_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.open_seconds:
+            return "open"
+        return "half_open"
+    
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+    
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+    
+    def failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self.probing = False
+    
+    def cancelled(self):
+        self.probing = False
+
+class TokenBucket:
+    """Request quota: refills at per_minute tokens a minute, holding up to a minute's worth"""
+    
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+    
+    def take(self, count: int = 1) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.per_minute, self.tokens + (now - self.updated) * self.per_minute / 60)
+        self.updated = now
+        if self.tokens < count:
+            return False
+        self.tokens -= count
+        return True
+
+class PriceProvider:
+    """
+    A price API behind a circuit breaker and a request quota.
+    
+    fetch(symbols) returns {symbol: {"price", "change_24h", "market_cap"}}
+    for the symbols it knows; cost(symbols) is the number of upstream
+    requests that takes. Other calls to the same API go through call() so
+    they share the breaker and the quota.
+    """
+    
+    def __init__(self, name: str, fetch: Callable, requests_per_minute: float, cost: Callable = lambda symbols: 1):
+        self.name = name
+        self.fetch = fetch
+        self.cost = cost
+        self.breaker = CircuitBreaker(PRICE_PROVIDER_FAILURE_THRESHOLD, PRICE_PROVIDER_OPEN_SECONDS)
+        self.quota = TokenBucket(requests_per_minute)
+        self.latency = PROVIDER_LATENCY_PRIOR_SECONDS
+        self.success_rate = 1.0
+        self.stats = {"calls": 0, "failures": 0, "cancelled": 0, "skipped": 0}
+    
+    def score(self) -> float:
+        """Expected seconds to a successful answer; lower is better"""
+        return self.latency / max(self.success_rate, 0.05)
+    
+    def observe_latency(self, seconds: float, lower_bound: bool = False):
+        # A lower bound below the average says nothing about the actual latency
+        if lower_bound and seconds <= self.latency:
+            return
+        self.latency += PROVIDER_STATS_ALPHA * (seconds - self.latency)
+    
+    async def call(self, fetch: Callable, cost: int = 1) -> Any:
+        if not self.breaker.allow():
+            self.stats["skipped"] += 1
+            raise ProviderUnavailable(f"{self.name} circuit is open")
+        if not self.quota.take(cost):
+            self.breaker.cancelled()
+            self.stats["skipped"] += 1
+            raise ProviderUnavailable(f"{self.name} quota is used up")
+        
+        self.stats["calls"] += 1
+        started = time.monotonic()
+        try:
+            result = await fetch()
+        except asyncio.CancelledError:
+            # Lost a hedge or missed the deadline: the elapsed time is a lower bound of
+            # its latency, so a provider slower than the hedge delay still moves back
+            self.breaker.cancelled()
+            self.stats["cancelled"] += 1
+            self.observe_latency(time.monotonic() - started, lower_bound=True)
+            raise
+        except Exception as e:
+            self.stats["failures"] += 1
+            self.observe_latency(time.monotonic() - started)
+            self.success_rate += PROVIDER_STATS_ALPHA * (0.0 - self.success_rate)
+            if is_upstream_failure(e):
+                self.breaker.failure()
+            else:
+                self.breaker.cancelled()
+            raise
+        
+        self.observe_latency(time.monotonic() - started)
+        self.success_rate += PROVIDER_STATS_ALPHA * (1.0 - self.success_rate)
+        self.breaker.success()
+        return result
+    
+    async def quotes(self, symbols: List[str]) -> Dict[str, dict]:
+        return await self.call(lambda: self.fetch(symbols), self.cost(symbols))
+    
+    def report(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "quota_tokens": round(self.quota.tokens, 1),
+            "latency_ms": round(self.latency * 1000),
+            "success_rate": round(self.success_rate * 100, 1),
+        }
+
+async def hedged(providers: List[tuple], delay: float) -> tuple:
+    """
+    Result of the first provider that succeeds, as (name, result).
+    The next provider starts once the previous one failed or has not
+    answered within delay; slower providers still running are cancelled.
+    """
+    waiting = list(providers)
+    running: Dict[asyncio.Task, str] = {}
+    errors = []
+    try:
+        while waiting or running:
+            if waiting:
+                name, provider = waiting.pop(0)
+                running[asyncio.create_task(provider())] = name
+            done, _ = await asyncio.wait(
+                running, timeout=delay if waiting else None, return_when=asyncio.FIRST_COMPLETED
+            )
+            # Prefer the earlier provider when several finish together
+            for task in sorted(done, key=list(running).index):
+                name = running.pop(task)
+                if task.exception() is None:
+                    return name, task.result()
+                logger.warning(f"{name} failed: {task.exception()}")
+                errors.append(f"{name}: {task.exception()}")
+    finally:
+        for task in running:
+            task.cancel()
+    raise Exception(f"All price APIs failed ({'; '.join(errors)})")
+
+class PriceProviders:
+    """Registry of price providers, tried best observed score first"""
+    
+    def __init__(self):
+        self.providers: Dict[str, PriceProvider] = {}
+    
+    def register(self, provider: PriceProvider) -> PriceProvider:
+        self.providers[provider.name] = provider
+        return provider
+    
+    def __getitem__(self, name: str) -> PriceProvider:
+        return self.providers[name]
+    
+    def ordered(self) -> List[PriceProvider]:
+        # Stable sort: registration order breaks ties
+        providers = sorted(self.providers.values(), key=PriceProvider.score)
+        # Open circuits last; they only answer once their probe is due
+        return sorted(providers, key=lambda provider: provider.breaker.state == "open")
+    
+    async def quotes(self, symbols: List[str], hedge_delay: float) -> tuple:
+        """(provider name, quotes) from the first provider that answers"""
+        return await hedged(
+            [(provider.name, lambda provider=provider: provider.quotes(symbols)) for provider in self.ordered()],
+            hedge_delay
+        )
+
+
+async def coingecko_quotes(symbols: List[str]) -> Dict[str, dict]:
+    ids = {TRACKED_ASSETS[symbol]: symbol for symbol in symbols if symbol in TRACKED_ASSETS}
+    response = await upstream_http.get(
+        "https://api.coingecko.com/api/v3/simple/price",
+        params={
+            "ids": ",".join(ids),
+            "vs_currencies": "usd",
+            "include_24hr_change": "true",
+            "include_market_cap": "true"
+        },
+        headers={
+            "Accept": "application/json"
+        }
+    )
+    response.raise_for_status()
+    return {
+        ids[coin_id]: {
+            "price": quote.get("usd", 0) or 0,
+            "change_24h": quote.get("usd_24h_change", 0) or 0,
+            "market_cap": quote.get("usd_market_cap"),
+        }
+        for coin_id, quote in response.json().items() if coin_id in ids
+    }
+
+async def binance_ticker(symbol: str) -> dict:
+    response = await upstream_http.get(
+        "https://api.binance.com/api/v3/ticker/24hr",
+        params={"symbol": f"{symbol}USDT"}
+    )
+    response.raise_for_status()
+    data = response.json()
+    return {"price": float(data.get("lastPrice", 0)), "change_24h": float(data.get("priceChangePercent", 0)), "market_cap": None}
+
+async def binance_quotes(symbols: List[str]) -> Dict[str, dict]:
+    # One ticker request per symbol; a symbol Binance does not list fails alone
+    tickers = await asyncio.gather(*(binance_ticker(symbol) for symbol in symbols), return_exceptions=True)
+    quotes = {symbol: ticker for symbol, ticker in zip(symbols, tickers) if not isinstance(ticker, BaseException)}
+    if not quotes:
+        raise tickers[0]
+    return quotes
+
+async def cryptocompare_quotes(symbols: List[str]) -> Dict[str, dict]:
+    response = await upstream_http.get(
+        "https://min-api.cryptocompare.com/data/pricemultifull",
+        params={
+            "fsyms": ",".join(symbols),
+            "tsyms": "USD"
+        }
+    )
+    response.raise_for_status()
+    raw = response.json().get("RAW", {})
+    return {
+        symbol: {
+            "price": raw[symbol]["USD"].get("PRICE", 0),
+            "change_24h": raw[symbol]["USD"].get("CHANGEPCT24HOUR", 0),
+            "market_cap": raw[symbol]["USD"].get("MKTCAP"),
+        }
+        for symbol in symbols if "USD" in raw.get(symbol, {})
+    }
+
+
+price_providers = PriceProviders()
+# Registration order is the preference until latencies are observed
+price_providers.register(PriceProvider("coingecko", coingecko_quotes, COINGECKO_REQUESTS_PER_MINUTE))
+price_providers.register(PriceProvider("binance", binance_quotes, BINANCE_REQUESTS_PER_MINUTE, cost=len))
+price_providers.register(PriceProvider("cryptocompare", cryptocompare_quotes, CRYPTOCOMPARE_REQUESTS_PER_MINUTE))
+
+@api_router.get("/admin/price-providers")
+async def get_price_provider_stats():
+    """Circuit state, quota and observed performance of the price providers, in current order"""
+    return {provider.name: provider.report() for provider in price_providers.ordered()}
+
+
+# ==================== CRYPTO PRICES API (with caching) ====================
+
+CRYPTO_PRICES_REFRESH_SECONDS = float(os.environ.get('CRYPTO_PRICES_REFRESH_SECONDS', '300'))
+MARKET_DATA_REFRESH_SECONDS = float(os.environ.get('MARKET_DATA_REFRESH_SECONDS', '3600'))
+# Upper bound on one refresh; price providers are hedged after MARKET_DATA_HEDGE_SECONDS
+MARKET_DATA_DEADLINE_SECONDS = float(os.environ.get('MARKET_DATA_DEADLINE_SECONDS', '8'))
+MARKET_DATA_HEDGE_SECONDS = float(os.environ.get('MARKET_DATA_HEDGE_SECONDS', '1.5'))
+# Retry delay after a failed refresh, when the cached value is already stale
+MARKET_REFRESH_RETRY_SECONDS = 60
+# "mongo": one worker at a time fetches from upstream, the others wait for its result
+UPSTREAM_FETCH_LEASE = os.environ.get('UPSTREAM_FETCH_LEASE', 'none')
+UPSTREAM_FETCH_LEASE_SECONDS = float(os.environ.get('UPSTREAM_FETCH_LEASE_SECONDS', '60'))
+LEASE_POLL_SECONDS = 0.5
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls per key: while a call is in flight, later
+    callers share its task instead of starting their own.
+    """
+    
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Task] = {}
+    
+    def start(self, key: str, fn: Callable) -> asyncio.Task:
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._flights.pop(key, None) if self._flights.get(key) is done else None)
+        return task
+    
+    async def do(self, key: str, fn: Callable) -> Any:
+        # shield: a cancelled waiter must not cancel the call the others wait for
+        return await asyncio.shield(self.start(key, fn))
+    
+    def in_flight(self) -> List[str]:
+        return sorted(self._flights)
+
+
+upstream_flights = SingleFlight()
+
+class MongoLease:
+    """
+    Cross-worker mutex with expiry, held in the fetch_leases collection.
+    Acquiring is one upsert: it matches only an expired lease, and when a
+    live one exists the insert fails on the _id instead.
+    """
+    
+    def __init__(self, name: str, ttl_seconds: float):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+    
+    async def acquire(self) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            await db.fetch_leases.update_one(
+                {"_id": self.name, "expires_at": {"$lt": now}},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.ttl_seconds)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+    
+    async def release(self):
+        await db.fetch_leases.delete_one({"_id": self.name, "owner": self.owner})
+
+class RefreshedCache:
+    """
+    Upstream data kept warm by a background task (stale-while-revalidate).
+    
+    Readers always get the cached value right away. Once it is older than
+    max_age a refresh starts in the background and the stale value is served
+    meanwhile; only a cold cache, with nothing fetched or stored yet, waits
+    for the fetch. fetch returns (value, updated_at); the optional load does
+    the same from storage shared by the workers, used before the first
+    fetch and to adopt a fresh value another worker already fetched.
+    """
+    
+    def __init__(self, name: str, fetch: Callable, max_age: float, load: Optional[Callable] = None):
+        self.name = name
+        self.fetch = fetch
+        self.max_age = max_age
+        self.load = load
+        # Workers can only wait on each other through a shared store
+        self.lease = MongoLease(name, UPSTREAM_FETCH_LEASE_SECONDS) if load and UPSTREAM_FETCH_LEASE == "mongo" else None
+        self.value: Any = None
+        self.updated_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self._loop_task: Optional[asyncio.Task] = None
+    
+    def age(self) -> Optional[float]:
+        if self.updated_at is None:
+            return None
+        return (datetime.now(timezone.utc) - self.updated_at).total_seconds()
+    
+    def is_stale(self) -> bool:
+        return self.updated_at is None or self.age() >= self.max_age
+    
+    def set(self, value: Any, updated_at: datetime):
+        self.value = value
+        self.updated_at = updated_at
+        self.last_error = None
+    
+    def refresh(self, fetch: Optional[Callable] = None) -> asyncio.Task:
+        """
+        Start a refresh, or join the one already in flight; returns its task.
+        Passing fetch forces it, without adopting a stored value first.
+        """
+        return upstream_flights.start(self.name, lambda: self._refresh(fetch))
+    
+    async def refresh_and_wait(self, fetch: Optional[Callable] = None) -> bool:
+        """Like refresh, but wait for the result; cancelling the waiter leaves the refresh running"""
+        return await upstream_flights.do(self.name, lambda: self._refresh(fetch))
+    
+    async def _refresh(self, fetch: Optional[Callable]) -> bool:
+        try:
+            if fetch is None:
+                if self.load and await self._adopt():
+                    return True
+                fetch = self.fetch
+            if self.lease:
+                self.set(*await self._fetch_with_lease(fetch))
+            else:
+                self.set(*await fetch())
+            return True
+        except Exception as e:
+            self.last_error = str(e)
+            logger.warning(f"Refreshing {self.name} failed: {e}")
+            return False
+    
+    async def _fetch_with_lease(self, fetch: Callable) -> tuple:
+        """Fetch while holding the lease, or wait for the holder's result in the shared store"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.lease.ttl_seconds
+        while True:
+            if await self.lease.acquire():
+                try:
+                    return await fetch()
+                finally:
+                    await self.lease.release()
             
-    except httpx.TimeoutException:
-        if crypto_prices_cache["data"]:
-            return {
-                "prices": crypto_prices_cache["data"],
-                "cached": True,
-                "error": "Timeout, returning cached data"
-            }
-        raise HTTPException(status_code=504, detail="CoinGecko request timeout")
-    except httpx.HTTPStatusError as e:
-        if crypto_prices_cache["data"]:
-            return {
-                "prices": crypto_prices_cache["data"],
-                "cached": True,
-                "error": f"API error: {e.response.status_code}, returning cached data"
-            }
-        raise HTTPException(status_code=502, detail=f"CoinGecko API error: {str(e)}")
+            await asyncio.sleep(LEASE_POLL_SECONDS)
+            stored = await self.load()
+            if stored and stored[0] is not None and (self.updated_at is None or stored[1] > self.updated_at):
+                return stored
+            if loop.time() > deadline:
+                raise TimeoutError(f"No {self.name} from the worker holding the fetch lease")
+    
+    async def get(self) -> Any:
+        if self.value is None:
+            if self.load and await self._load():
+                if self.is_stale():
+                    self.refresh()
+                return self.value
+            await self.refresh_and_wait()
+        elif self.is_stale():
+            self.refresh()
+        return self.value
+    
+    async def _adopt(self) -> bool:
+        stored = await self.load()
+        if not stored or stored[0] is None:
+            return False
+        if self.updated_at is not None and stored[1] <= self.updated_at:
+            return False
+        if (datetime.now(timezone.utc) - stored[1]).total_seconds() >= self.max_age:
+            return False
+        self.set(*stored)
+        return True
+    
+    async def _load(self) -> bool:
+        try:
+            stored = await self.load()
+        except Exception as e:
+            logger.warning(f"Loading stored {self.name} failed: {e}")
+            return False
+        if stored and stored[0] is not None:
+            self.set(*stored)
+            return True
+        return False
+    
+    async def start(self):
+        if self.load:
+            await self._load()
+        self._loop_task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+    
+    async def _run(self):
+        while True:
+            if self.is_stale():
+                await self.refresh_and_wait()
+            if self.is_stale():
+                delay = MARKET_REFRESH_RETRY_SECONDS
+            else:
+                delay = self.max_age - self.age()
+            await asyncio.sleep(max(delay, 1))
+
+async def store_crypto_cache(key: str, value: dict, updated_at: datetime):
+    """Second cache tier: crypto_cache documents shared by all workers"""
+    try:
+        await db["crypto_cache"].update_one(
+            {"id": key},
+            {"$set": {**value, "updated_at": updated_at}},
+            upsert=True
+        )
     except Exception as e:
-        if crypto_prices_cache["data"]:
-            return {
-                "prices": crypto_prices_cache["data"],
-                "cached": True,
-                "error": f"Error: {str(e)}, returning cached data"
-            }
-        raise HTTPException(status_code=500, detail=f"Failed to fetch crypto prices: {str(e)}")
+        logger.warning(f"Storing {key} in crypto_cache failed: {e}")
 
+async def fetch_prices() -> tuple:
+    """
+    Quotes of every tracked asset, in one batched request to the first
+    price provider that answers within MARKET_DATA_DEADLINE_SECONDS
+    """
+    # When every provider fails (429 included), the cached prices are kept
+    source, quotes = await asyncio.wait_for(
+        price_providers.quotes(list(TRACKED_ASSETS), MARKET_DATA_HEDGE_SECONDS),
+        MARKET_DATA_DEADLINE_SECONDS
+    )
+    prices = {"quotes": quotes, "source": source}
+    updated_at = datetime.now(timezone.utc)
+    await store_crypto_cache("prices", prices, updated_at)
+    return prices, updated_at
+
+async def load_prices() -> Optional[tuple]:
+    cached = await db["crypto_cache"].find_one({"id": "prices"}, {"_id": 0})
+    if not cached or not cached.get("updated_at"):
+        return None
+    return {"quotes": cached["quotes"], "source": cached.get("source")}, utc_datetime(cached["updated_at"])
+
+# L1 in this worker, L2 in crypto_cache; both crypto endpoints are views of it
+price_cache = RefreshedCache("prices", fetch_prices, CRYPTO_PRICES_REFRESH_SECONDS, load=load_prices)
+
+@api_router.get("/crypto-prices")
+async def get_crypto_prices():
+    """
+    Get cryptocurrency prices of the CRYPTO_ASSETS, keyed by CoinGecko coin id.
+    Served from the background-refreshed price cache, stale prices while a refresh runs.
+    """
+    cached = await price_cache.get()
+    if cached is None:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Failed to fetch crypto prices: {price_cache.last_error}"
+        )
+    
+    prices = {}
+    for symbol, coin_id in CRYPTO_ASSETS.items():
+        quote = cached["quotes"].get(symbol)
+        if quote is None:
+            continue
+        prices[coin_id] = {"usd": quote["price"], "usd_24h_change": quote["change_24h"]}
+        if quote.get("market_cap") is not None:
+            prices[coin_id]["usd_market_cap"] = quote["market_cap"]
+    
+    response = {
+        "prices": prices,
+        "cached": True,
+        "cache_age_seconds": int(price_cache.age()),
+        "last_updated": price_cache.updated_at.isoformat(),
+        "stale": price_cache.is_stale()
+    }
+    if price_cache.last_error:
+        response["error"] = f"{price_cache.last_error}, returning cached data"
+    return response
 
 # ==================== UTILITY NAVIGATION BUTTONS API ====================
 
@@ -3166,35 +5715,49 @@ class UtilityNavButtonUpdate(BaseModel):
     url: Optional[str] = None
     order: Optional[int] = None
 
-@api_router.get("/utility-nav-buttons")
+@api_router.get("/utility-nav-buttons", dependencies=[Depends(conditional_get("utility_nav_buttons"))])
 async def get_utility_nav_buttons():
     """Get all utility navigation buttons"""
     collection = db["utility_nav_buttons"]
-    buttons = await collection.find({}, {"_id": 0}).sort("order", 1).to_list(100)
-    return buttons
+    buttons = await collection.find({}, CONTENT_PROJECTION).sort(ORDER_KEY, 1).to_list(100)
+    return number_positions(buttons)
 
 @api_router.post("/utility-nav-buttons")
 async def create_utility_nav_button(button: UtilityNavButtonCreate):
     """Create a new utility navigation button"""
-    collection = db["utility_nav_buttons"]
     new_button = UtilityNavButton(**button.model_dump())
-    await collection.insert_one(new_button.model_dump())
+    doc = new_button.model_dump()
+    doc[ORDER_KEY] = await ordered_collections["utility_nav_buttons"].key_for_position(
+        button.order if "order" in button.model_fields_set else None
+    )
+    await repositories["utility_nav_buttons"].create(doc)
     return {"message": "Button created", "id": new_button.id}
 
 @api_router.put("/utility-nav-buttons/{button_id}")
 async def update_utility_nav_button(button_id: str, button: UtilityNavButtonUpdate):
     """Update a utility navigation button"""
-    collection = db["utility_nav_buttons"]
     update_data = {k: v for k, v in button.model_dump().items() if v is not None}
     if update_data:
-        await collection.update_one({"id": button_id}, {"$set": update_data})
+        if "order" in update_data:
+            update_data[ORDER_KEY] = await ordered_collections["utility_nav_buttons"].key_for_position(
+                update_data["order"], exclude_id=button_id
+            )
+        await repositories["utility_nav_buttons"].update(button_id, update_data)
     return {"message": "Button updated"}
 
+@api_router.post("/utility-nav-buttons/{button_id}/move")
+async def move_utility_nav_button(button_id: str, move: MoveRequest):
+    """Move a utility navigation button between two neighbours, rewriting only the moved button"""
+    if not await ordered_collections["utility_nav_buttons"].move(button_id, move.after_id, move.before_id):
+        raise HTTPException(status_code=404, detail="Button not found")
+    return {"message": "Button moved"}
+
 @api_router.delete("/utility-nav-buttons/{button_id}")
 async def delete_utility_nav_button(button_id: str):
     """Delete a utility navigation button"""
     collection = db["utility_nav_buttons"]
     await collection.delete_one({"id": button_id})
+    await invalidation_bus.publish("utility_nav_buttons")
     return {"message": "Button deleted"}
 
     existing = await db.utilities.count_documents({})
@@ -3339,289 +5902,94 @@ async def delete_utility_nav_button(button_id: str):
 
 # ==================== UTILITIES SECTION SETTINGS API ====================
 
-@api_router.get("/utilities-settings")
+# The utilities settings document has no id, the collection holds a single document
+settings_store.register("utilities_settings", {}, lambda: UtilitiesSectionSettings().model_dump())
+
+@api_router.get("/utilities-settings", dependencies=[Depends(conditional_get("utilities_settings"))])
 async def get_utilities_settings():
     """Get utilities section settings"""
-    settings = await db.utilities_settings.find_one({}, {"_id": 0})
-    if not settings:
-        # Return default settings
-        default_settings = UtilitiesSectionSettings()
-        return default_settings.model_dump()
-    return settings
+    return await settings_store.get("utilities_settings")
 
 @api_router.put("/utilities-settings")
 async def update_utilities_settings(settings_update: UtilitiesSectionSettingsUpdate):
     """Update utilities section settings"""
-    existing = await db.utilities_settings.find_one({})
-    
     update_dict = {k: v for k, v in settings_update.model_dump().items() if v is not None}
-    
-    if existing:
-        await db.utilities_settings.update_one(
-            {"_id": existing["_id"]},
-            {"$set": update_dict}
-        )
-    else:
-        # Create new settings document with defaults + updates
-        default_settings = UtilitiesSectionSettings().model_dump()
-        default_settings.update(update_dict)
-        await db.utilities_settings.insert_one(default_settings)
-    
-    updated = await db.utilities_settings.find_one({}, {"_id": 0})
-    return updated
+    return await settings_store.update("utilities_settings", update_dict)
 
 
 # ==================== CRYPTO MARKET DATA ====================
 
+async def coingecko_global() -> tuple:
+    """BTC dominance and total market cap"""
+    async def fetch_global() -> dict:
+        response = await upstream_http.get("https://api.coingecko.com/api/v3/global")
+        response.raise_for_status()
+        return response.json().get("data", {})
+    
+    # Counts against the CoinGecko quota and circuit like its prices
+    global_data = await price_providers["coingecko"].call(fetch_global)
+    return global_data.get("market_cap_percentage", {}).get("btc", 58), global_data.get("total_market_cap", {}).get("usd", 0)
+
+async def fear_greed_index() -> int:
+    # Alternative.me (always free, reliable)
+    response = await upstream_http.get("https://api.alternative.me/fng/?limit=1")
+    response.raise_for_status()
+    return int(response.json().get('data', [{}])[0].get('value', 50))
+
+async def settle(call: Awaitable, timeout: float, what: str) -> Any:
+    """Result of call, or None when it fails or misses the timeout"""
+    try:
+        return await asyncio.wait_for(call, timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"{what} missed the {timeout:.0f}s deadline")
+    except Exception as e:
+        logger.warning(f"{what} error: {e}")
+    return None
+
+async def fetch_market_indices() -> tuple:
+    """
+    Global market data and Fear & Greed, fetched concurrently within
+    MARKET_DATA_DEADLINE_SECONDS and stored in crypto_cache
+    """
+    global_data, fear_greed = await asyncio.gather(
+        settle(coingecko_global(), MARKET_DATA_DEADLINE_SECONDS, "CoinGecko global"),
+        settle(fear_greed_index(), MARKET_DATA_DEADLINE_SECONDS, "Fear & Greed API"),
+    )
+    if global_data is None and fear_greed is None:
+        raise Exception("Global market data and Fear & Greed are unavailable")
+    btc_dominance, total_market_cap = global_data or (58, 3_200_000_000_000)
+    indices = {
+        "btc_dominance": btc_dominance,
+        "total_market_cap": total_market_cap,
+        "fear_greed": 50 if fear_greed is None else fear_greed,
+    }
+    updated_at = datetime.now(timezone.utc)
+    await store_crypto_cache("market_indices", indices, updated_at)
+    logger.info(f"Market indices fetched, Fear & Greed: {indices['fear_greed']}")
+    return indices, updated_at
+
+async def load_market_indices() -> Optional[tuple]:
+    cached = await db["crypto_cache"].find_one({"id": "market_indices"}, {"_id": 0, "id": 0})
+    if not cached or not cached.get("updated_at"):
+        return None
+    updated_at = utc_datetime(cached.pop("updated_at"))
+    return cached, updated_at
+
+market_indices_cache = RefreshedCache("market indices", fetch_market_indices, MARKET_DATA_REFRESH_SECONDS, load=load_market_indices)
+
+# Used for whatever the providers did not return
+FALLBACK_MARKET_PRICES = {"BTC": (94500, 1.5), "ETH": (3350, 2.1), "ZK": (0.18, -0.5)}
+
 @api_router.get("/crypto-market-data")
 async def get_crypto_market_data():
     """
-    Get real-time crypto market data with hourly caching.
-    Uses multiple free APIs with fallback: CoinGecko -> Binance -> CryptoCompare
-    Caches data in MongoDB, updates only once per hour (24 requests/day).
+    Get crypto market data: BTC, ETH and ZK from the shared price cache,
+    indices from the hourly market indices cache. Background refreshers
+    keep both warm; requests are answered from cache, stale data while a
+    refresh runs.
     """
-    try:
-        collection = db["crypto_cache"]
-        
-        # Check if we have cached data that's less than 1 hour old
-        cached = await collection.find_one({"id": "market_data"}, {"_id": 0})
-        
-        if cached:
-            last_updated = cached.get("last_updated_timestamp", 0)
-            current_time = datetime.now(timezone.utc).timestamp()
-            age_minutes = (current_time - last_updated) / 60
-            
-            # If cache is less than 60 minutes old, return cached data
-            if age_minutes < 60:
-                cached["cache_age_minutes"] = round(age_minutes, 1)
-                cached["from_cache"] = True
-                return cached
-        
-        logger.info("Fetching fresh crypto data...")
-        
-        async with httpx.AsyncClient() as client:
-            btc_price, btc_change = 0, 0
-            eth_price, eth_change = 0, 0
-            zk_price, zk_change = 0, 0
-            btc_dominance = 58
-            total_market_cap = 3_200_000_000_000
-            source = "fallback"
-            
-            # Try CoinGecko first (free, no key)
-            try:
-                logger.info("Trying CoinGecko API...")
-                prices_response = await client.get(
-                    "https://api.coingecko.com/api/v3/simple/price",
-                    params={
-                        "ids": "bitcoin,ethereum,zksync",
-                        "vs_currencies": "usd",
-                        "include_24hr_change": "true"
-                    },
-                    timeout=10.0
-                )
-                
-                if prices_response.status_code == 200:
-                    prices = prices_response.json()
-                    btc_price = prices.get("bitcoin", {}).get("usd", 0)
-                    btc_change = prices.get("bitcoin", {}).get("usd_24h_change", 0) or 0
-                    eth_price = prices.get("ethereum", {}).get("usd", 0)
-                    eth_change = prices.get("ethereum", {}).get("usd_24h_change", 0) or 0
-                    zk_price = prices.get("zksync", {}).get("usd", 0) or 0
-                    zk_change = prices.get("zksync", {}).get("usd_24h_change", 0) or 0
-                    source = "coingecko"
-                    logger.info("CoinGecko prices fetched successfully")
-                    
-                    # Try to get global data
-                    global_response = await client.get(
-                        "https://api.coingecko.com/api/v3/global",
-                        timeout=10.0
-                    )
-                    if global_response.status_code == 200:
-                        global_data = global_response.json().get("data", {})
-                        btc_dominance = global_data.get("market_cap_percentage", {}).get("btc", 58)
-                        total_market_cap = global_data.get("total_market_cap", {}).get("usd", 0)
-                else:
-                    logger.warning(f"CoinGecko returned {prices_response.status_code}")
-                    raise Exception("CoinGecko rate limited")
-                    
-            except Exception as cg_err:
-                logger.warning(f"CoinGecko failed: {cg_err}")
-                
-                # Fallback to Binance Public API (no key required)
-                try:
-                    logger.info("Trying Binance API...")
-                    # Get BTC price
-                    btc_response = await client.get(
-                        "https://api.binance.com/api/v3/ticker/24hr",
-                        params={"symbol": "BTCUSDT"},
-                        timeout=10.0
-                    )
-                    if btc_response.status_code == 200:
-                        btc_data = btc_response.json()
-                        btc_price = float(btc_data.get("lastPrice", 0))
-                        btc_change = float(btc_data.get("priceChangePercent", 0))
-                    
-                    # Get ETH price
-                    eth_response = await client.get(
-                        "https://api.binance.com/api/v3/ticker/24hr",
-                        params={"symbol": "ETHUSDT"},
-                        timeout=10.0
-                    )
-                    if eth_response.status_code == 200:
-                        eth_data = eth_response.json()
-                        eth_price = float(eth_data.get("lastPrice", 0))
-                        eth_change = float(eth_data.get("priceChangePercent", 0))
-                    
-                    # Try ZK
-                    try:
-                        zk_response = await client.get(
-                            "https://api.binance.com/api/v3/ticker/24hr",
-                            params={"symbol": "ZKUSDT"},
-                            timeout=10.0
-                        )
-                        if zk_response.status_code == 200:
-                            zk_data = zk_response.json()
-                            zk_price = float(zk_data.get("lastPrice", 0))
-                            zk_change = float(zk_data.get("priceChangePercent", 0))
-                    except:
-                        pass
-                    
-                    if btc_price > 0:
-                        source = "binance"
-                        logger.info("Binance prices fetched successfully")
-                    else:
-                        raise Exception("Binance failed")
-                        
-                except Exception as bn_err:
-                    logger.warning(f"Binance failed: {bn_err}")
-                    
-                    # Last resort: CryptoCompare (free tier)
-                    try:
-                        logger.info("Trying CryptoCompare API...")
-                        cc_response = await client.get(
-                            "https://min-api.cryptocompare.com/data/pricemultifull",
-                            params={
-                                "fsyms": "BTC,ETH,ZK",
-                                "tsyms": "USD"
-                            },
-                            timeout=10.0
-                        )
-                        if cc_response.status_code == 200:
-                            cc_data = cc_response.json().get("RAW", {})
-                            btc_price = cc_data.get("BTC", {}).get("USD", {}).get("PRICE", 0)
-                            btc_change = cc_data.get("BTC", {}).get("USD", {}).get("CHANGEPCT24HOUR", 0)
-                            eth_price = cc_data.get("ETH", {}).get("USD", {}).get("PRICE", 0)
-                            eth_change = cc_data.get("ETH", {}).get("USD", {}).get("CHANGEPCT24HOUR", 0)
-                            zk_price = cc_data.get("ZK", {}).get("USD", {}).get("PRICE", 0)
-                            zk_change = cc_data.get("ZK", {}).get("USD", {}).get("CHANGEPCT24HOUR", 0)
-                            source = "cryptocompare"
-                            logger.info("CryptoCompare prices fetched successfully")
-                    except Exception as cc_err:
-                        logger.error(f"All price APIs failed: {cc_err}")
-            
-            # Get Fear & Greed Index from Alternative.me (always free, reliable)
-            fear_greed_value = 50
-            try:
-                fg_response = await client.get(
-                    "https://api.alternative.me/fng/?limit=1",
-                    timeout=10.0
-                )
-                if fg_response.status_code == 200:
-                    fg_data = fg_response.json()
-                    fear_greed_value = int(fg_data.get('data', [{}])[0].get('value', 50))
-                    logger.info(f"Fear & Greed: {fear_greed_value}")
-            except Exception as fg_err:
-                logger.warning(f"Fear & Greed API error: {fg_err}")
-            
-            # Calculate Altcoin Season Index based on BTC dominance
-            altcoin_season_value = int(140 - (btc_dominance * 2.1))
-            altcoin_season_value = max(0, min(100, altcoin_season_value))
-            
-            # Use fallback values if APIs failed
-            if btc_price == 0:
-                btc_price, btc_change = 94500, 1.5
-            if eth_price == 0:
-                eth_price, eth_change = 3350, 2.1
-            if zk_price == 0:
-                zk_price, zk_change = 0.18, -0.5
-            
-            # Build response data
-            market_data = {
-                "id": "market_data",
-                "cryptos": [
-                    {
-                        "symbol": "BTC",
-                        "name": "Bitcoin",
-                        "price": round(btc_price, 2),
-                        "change_24h": round(btc_change, 2),
-                        "formatted_price": f"${btc_price:,.0f}"
-                    },
-                    {
-                        "symbol": "ETH",
-                        "name": "Ethereum",
-                        "price": round(eth_price, 2),
-                        "change_24h": round(eth_change, 2),
-                        "formatted_price": f"${eth_price:,.0f}"
-                    },
-                    {
-                        "symbol": "ZKS",
-                        "name": "zkSync",
-                        "price": round(zk_price, 4),
-                        "change_24h": round(zk_change, 2),
-                        "formatted_price": f"${zk_price:.2f}"
-                    }
-                ],
-                "indices": [
-                    {
-                        "name": "Fear & Greed",
-                        "value": fear_greed_value,
-                        "label": "Index"
-                    },
-                    {
-                        "name": "Altcoin Season",
-                        "value": altcoin_season_value,
-                        "label": "Index"
-                    },
-                    {
-                        "name": "BTC Dominance",
-                        "value": round(btc_dominance, 2),
-                        "label": "%"
-                    }
-                ],
-                "market": {
-                    "total_market_cap": round(total_market_cap, 0),
-                    "formatted_market_cap": f"${total_market_cap / 1_000_000_000_000:.2f}T" if total_market_cap > 1_000_000_000_000 else f"${total_market_cap / 1_000_000_000:.1f}B"
-                },
-                "last_updated": datetime.now(timezone.utc).isoformat(),
-                "last_updated_timestamp": datetime.now(timezone.utc).timestamp(),
-                "source": source,
-                "from_cache": False,
-                "cache_age_minutes": 0
-            }
-            
-            # Save to cache
-            await collection.update_one(
-                {"id": "market_data"},
-                {"$set": market_data},
-                upsert=True
-            )
-            
-            logger.info(f"Crypto data fetched from {source} and cached successfully")
-            return market_data
-                
-    except Exception as e:
-        logger.error(f"Crypto market data error: {str(e)}")
-        
-        # Try to return cached data even if stale
-        try:
-            cached = await collection.find_one({"id": "market_data"}, {"_id": 0})
-            if cached:
-                cached["from_cache"] = True
-                cached["cache_error"] = str(e)
-                return cached
-        except:
-            pass
-        
+    prices, indices = await asyncio.gather(price_cache.get(), market_indices_cache.get())
+    if prices is None and indices is None:
         # Return fallback static data
         return {
             "cryptos": [
@@ -3638,8 +6006,81 @@ async def get_crypto_market_data():
             "last_updated": datetime.now(timezone.utc).isoformat(),
             "from_cache": False,
             "is_fallback": True,
-            "error": str(e)
+            "error": price_cache.last_error or market_indices_cache.last_error
         }
+    
+    quotes = prices["quotes"] if prices else {}
+    market_prices = {}
+    for symbol, fallback in FALLBACK_MARKET_PRICES.items():
+        quote = quotes.get(symbol, {})
+        price = quote.get("price", 0) or 0
+        market_prices[symbol] = (price, quote.get("change_24h", 0) or 0) if price else fallback
+    btc_price, btc_change = market_prices["BTC"]
+    eth_price, eth_change = market_prices["ETH"]
+    zk_price, zk_change = market_prices["ZK"]
+    
+    indices = indices or {"btc_dominance": 58, "total_market_cap": 3_200_000_000_000, "fear_greed": 50}
+    btc_dominance = indices["btc_dominance"]
+    total_market_cap = indices["total_market_cap"]
+    
+    # Calculate Altcoin Season Index based on BTC dominance
+    altcoin_season_value = int(140 - (btc_dominance * 2.1))
+    altcoin_season_value = max(0, min(100, altcoin_season_value))
+    
+    # Prices change fastest, so their age is the age of the data
+    cache = price_cache if prices else market_indices_cache
+    return {
+        "cryptos": [
+            {
+                "symbol": "BTC",
+                "name": "Bitcoin",
+                "price": round(btc_price, 2),
+                "change_24h": round(btc_change, 2),
+                "formatted_price": f"${btc_price:,.0f}"
+            },
+            {
+                "symbol": "ETH",
+                "name": "Ethereum",
+                "price": round(eth_price, 2),
+                "change_24h": round(eth_change, 2),
+                "formatted_price": f"${eth_price:,.0f}"
+            },
+            {
+                "symbol": "ZKS",
+                "name": "zkSync",
+                "price": round(zk_price, 4),
+                "change_24h": round(zk_change, 2),
+                "formatted_price": f"${zk_price:.2f}"
+            }
+        ],
+        "indices": [
+            {
+                "name": "Fear & Greed",
+                "value": indices["fear_greed"],
+                "label": "Index"
+            },
+            {
+                "name": "Altcoin Season",
+                "value": altcoin_season_value,
+                "label": "Index"
+            },
+            {
+                "name": "BTC Dominance",
+                "value": round(btc_dominance, 2),
+                "label": "%"
+            }
+        ],
+        "market": {
+            "total_market_cap": round(total_market_cap, 0),
+            "formatted_market_cap": f"${total_market_cap / 1_000_000_000_000:.2f}T" if total_market_cap > 1_000_000_000_000 else f"${total_market_cap / 1_000_000_000:.1f}B"
+        },
+        "last_updated": cache.updated_at.isoformat(),
+        "last_updated_timestamp": cache.updated_at.timestamp(),
+        "source": prices["source"] if prices else "fallback",
+        "from_cache": True,
+        "cache_age_minutes": round(cache.age() / 60, 1),
+        "stale": price_cache.is_stale() or market_indices_cache.is_stale()
+    }
 
 
 # Endpoint to force refresh crypto data (for admin use)
@@ -3647,19 +6088,18 @@ async def get_crypto_market_data():
 async def refresh_crypto_market_data():
     """Force refresh crypto market data cache"""
     try:
-        # Clear cache timestamp to force refresh
-        collection = db["crypto_cache"]
-        await collection.update_one(
-            {"id": "market_data"},
-            {"$set": {"last_updated_timestamp": 0}},
-            upsert=True
+        # Each joins the refresh in flight, if any
+        await asyncio.gather(
+            price_cache.refresh_and_wait(fetch_prices),
+            market_indices_cache.refresh_and_wait(fetch_market_indices)
         )
-        # Fetch fresh data
+        errors = [cache.last_error for cache in (price_cache, market_indices_cache) if cache.last_error]
+        if errors:
+            raise RuntimeError("; ".join(errors))
         return await get_crypto_market_data()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error refreshing data: {str(e)}")
 
-
 # ==================== WALLET REGISTRATION MODELS ====================
 
 class WalletRegistration(BaseModel):
@@ -3742,7 +6182,14 @@ async def register_wallet(registration_data: WalletRegistrationCreate):
     doc['created_at'] = doc['created_at'].isoformat()
     doc['updated_at'] = doc['updated_at'].isoformat()
     
-    await collection.insert_one(doc)
+    try:
+        await collection.insert_one(doc)
+    except DuplicateKeyError:
+        # Concurrent registration of the same wallet, rejected by the unique index
+        raise HTTPException(
+            status_code=400, 
+            detail="This wallet is already registered with an invite code"
+        )
     
     return {
         "success": True,
@@ -3810,20 +6257,13 @@ class CookieConsentUpdate(BaseModel):
     terms_content: Optional[str] = None
 
 
-@api_router.get("/cookie-consent-settings")
+# The cookie consent document has a random id, the collection holds a single document
+settings_store.register("cookie_consent_settings", {}, lambda: CookieConsentSettings().model_dump())
+
+@api_router.get("/cookie-consent-settings", dependencies=[Depends(conditional_get("cookie_consent_settings"))])
 async def get_cookie_consent_settings():
     """Get cookie consent settings"""
-    collection = db.get_collection("cookie_consent_settings")
-    settings = await collection.find_one({}, {"_id": 0})
-    
-    if not settings:
-        # Create default settings
-        default_settings = CookieConsentSettings().model_dump()
-        await collection.insert_one(default_settings)
-        # Re-fetch without _id
-        settings = await collection.find_one({}, {"_id": 0})
-    
-    return settings
+    return await settings_store.get("cookie_consent_settings")
 
 
 @api_router.put("/admin/cookie-consent-settings")
@@ -3832,41 +6272,214 @@ async def update_cookie_consent_settings(
     request: Request
 ):
     """Update cookie consent settings (admin only)"""
-    # Verify admin token
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
-    
-    token = auth_header.split(" ")[1]
-    admin_password = os.environ.get('ADMIN_PASSWORD', 'admin123')
-    expected_token = base64.b64encode(f"admin:{admin_password}:{uuid.uuid4()}".encode()).decode()
-    
-    # Simple admin check (in production use proper JWT)
-    if not token or len(token) < 20:
-        raise HTTPException(status_code=401, detail="Invalid admin token")
-    
-    collection = db.get_collection("cookie_consent_settings")
-    
-    # Get current settings
-    current = await collection.find_one({}, {"_id": 0})
-    if not current:
-        current = CookieConsentSettings().model_dump()
-        await collection.insert_one(current)
+    require_admin_bearer(request)
     
     # Update fields
     update_data = {k: v for k, v in settings.model_dump().items() if v is not None}
     update_data["updated_at"] = datetime.now(timezone.utc)
     
-    result = await collection.update_one(
-        {"id": current["id"]},
-        {"$set": update_data}
-    )
-    
-    if result.modified_count == 0 and result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Settings not found")
+    return await settings_store.update("cookie_consent_settings", update_data)
+
+
+# ==================== INDEX REGISTRY ====================
+
+# Raw analytics events are kept this many days, 0 (default) keeps them forever; rollups are kept.
+# Setting it creates a TTL index that deletes every existing event older than the window.
+ANALYTICS_RETENTION_DAYS = int(os.environ.get('ANALYTICS_RETENTION_DAYS', '0'))
+# Longest period /analytics/stats?exact=true will scan raw events for
+ANALYTICS_EXACT_SESSIONS_MAX_DAYS = int(os.environ.get('ANALYTICS_EXACT_SESSIONS_MAX_DAYS', '7'))
+# create_index errors for an existing index with the same key/name but other options
+INDEX_CONFLICT_CODES = (85, 86)
+
+def unique_id_index() -> IndexModel:
+    return IndexModel([("id", ASCENDING)], unique=True)
+
+# Indexes created idempotently at startup, per collection
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {
+    "drawer_cards": [unique_id_index(), IndexModel([(ORDER_KEY, ASCENDING)])],
+    "team_members": [unique_id_index(), IndexModel([(ORDER_KEY, ASCENDING)])],
+    "partners": [
+        unique_id_index(),
+        IndexModel([(ORDER_KEY, ASCENDING)]),
+        IndexModel([("category", ASCENDING), (ORDER_KEY, ASCENDING)]),
+    ],
+    "faq_items": [unique_id_index(), IndexModel([(ORDER_KEY, ASCENDING)])],
+    "utilities": [
+        unique_id_index(),
+        IndexModel([(ORDER_KEY, ASCENDING)]),
+        IndexModel([("is_active", ASCENDING), (ORDER_KEY, ASCENDING)]),
+    ],
+    "navigation_items": [unique_id_index(), IndexModel([("is_active", ASCENDING), (ORDER_KEY, ASCENDING)])],
+    "hero_buttons": [unique_id_index(), IndexModel([("is_active", ASCENDING), (ORDER_KEY, ASCENDING)])],
+    "utility_nav_buttons": [unique_id_index(), IndexModel([(ORDER_KEY, ASCENDING)])],
+    "evolution_levels": [unique_id_index(), IndexModel([(ORDER_KEY, ASCENDING)])],
+    "evolution_badges": [unique_id_index(), IndexModel([(ORDER_KEY, ASCENDING)])],
+    "p2p_deals": [
+        unique_id_index(),
+        IndexModel([("deal_type", ASCENDING)]),
+        IndexModel([("crypto_type", ASCENDING)]),
+        IndexModel([("status", ASCENDING)]),
+    ],
+    "arena_predictions": [
+        unique_id_index(),
+        IndexModel([("category", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("status", ASCENDING)]),
+    ],
+    "influence_entities": [
+        unique_id_index(),
+        IndexModel([("entity_type", ASCENDING)]),
+        IndexModel([("is_suggested", ASCENDING)]),
+    ],
+    "earlyland_opportunities": [
+        unique_id_index(),
+        IndexModel([("category", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("status", ASCENDING)]),
+    ],
+    "wallet_registrations": [IndexModel([("wallet_address", ASCENDING)], unique=True)],
+    "analytics_events": [
+        IndexModel([("session_id", ASCENDING), ("event_type", ASCENDING)]),
+        # TTL index: MongoDB deletes events older than the retention window
+        IndexModel(
+            [("timestamp", ASCENDING)],
+            **({"expireAfterSeconds": ANALYTICS_RETENTION_DAYS * 86400} if ANALYTICS_RETENTION_DAYS > 0 else {})
+        ),
+    ],
+    "analytics_rollups": [IndexModel([("granularity", ASCENDING), ("bucket", ASCENDING)], unique=True)],
+}
+
+# Representative filter/sort of every indexed route query, checked by the index report
+ROUTE_QUERIES: List[Dict[str, Any]] = [
+    {"route": "GET /drawer-cards", "collection": "drawer_cards", "filter": {}, "sort": [(ORDER_KEY, 1)]},
+    {"route": "GET /drawer-cards/{card_id}", "collection": "drawer_cards", "filter": {"id": ""}},
+    {"route": "GET /team-members", "collection": "team_members", "filter": {}, "sort": [(ORDER_KEY, 1)]},
+    {"route": "GET /team-members/{member_id}", "collection": "team_members", "filter": {"id": ""}},
+    {"route": "GET /partners", "collection": "partners", "filter": {}, "sort": [(ORDER_KEY, 1)]},
+    {"route": "GET /partners?category=", "collection": "partners", "filter": {"category": ""}, "sort": [(ORDER_KEY, 1)]},
+    {"route": "POST /partners", "collection": "partners", "filter": {"category": ""}, "sort": [(ORDER_KEY, -1)]},
+    {"route": "PUT /partners/{partner_id}", "collection": "partners", "filter": {"id": ""}},
+    {"route": "GET /faq", "collection": "faq_items", "filter": {}, "sort": [(ORDER_KEY, 1)]},
+    {"route": "PUT /faq/{item_id}", "collection": "faq_items", "filter": {"id": ""}},
+    {"route": "GET /utilities", "collection": "utilities", "filter": {"is_active": True}, "sort": [(ORDER_KEY, 1)]},
+    {"route": "GET /utilities/all", "collection": "utilities", "filter": {}, "sort": [(ORDER_KEY, 1)]},
+    {"route": "GET /utilities/{utility_id}", "collection": "utilities", "filter": {"id": ""}},
+    {"route": "GET /navigation-items", "collection": "navigation_items", "filter": {"is_active": True}, "sort": [(ORDER_KEY, 1)]},
+    {"route": "PUT /navigation-items/{item_id}", "collection": "navigation_items", "filter": {"id": ""}},
+    {"route": "GET /hero-buttons", "collection": "hero_buttons", "filter": {"is_active": True}, "sort": [(ORDER_KEY, 1)]},
+    {"route": "PUT /hero-buttons/{button_id}", "collection": "hero_buttons", "filter": {"id": ""}},
+    {"route": "GET /utility-nav-buttons", "collection": "utility_nav_buttons", "filter": {}, "sort": [(ORDER_KEY, 1)]},
+    {"route": "PUT /utility-nav-buttons/{button_id}", "collection": "utility_nav_buttons", "filter": {"id": ""}},
+    {"route": "GET /evolution-levels", "collection": "evolution_levels", "filter": {}, "sort": [(ORDER_KEY, 1)]},
+    {"route": "GET /evolution-badges", "collection": "evolution_badges", "filter": {}, "sort": [(ORDER_KEY, 1)]},
+    {"route": "PUT /evolution-levels/{level_id}", "collection": "evolution_levels", "filter": {"id": ""}},
+    {"route": "PUT /evolution-badges/{badge_id}", "collection": "evolution_badges", "filter": {"id": ""}},
+    {"route": "GET /p2p-deals?deal_type=", "collection": "p2p_deals", "filter": {"deal_type": ""}},
+    {"route": "GET /p2p-deals?crypto_type=", "collection": "p2p_deals", "filter": {"crypto_type": ""}},
+    {"route": "GET /p2p-deals?status=", "collection": "p2p_deals", "filter": {"status": ""}},
+    {"route": "PUT /p2p-deals/{deal_id}", "collection": "p2p_deals", "filter": {"id": ""}},
+    {"route": "GET /arena-predictions?category=&status=", "collection": "arena_predictions", "filter": {"category": "", "status": ""}},
+    {"route": "GET /arena-predictions?status=", "collection": "arena_predictions", "filter": {"status": ""}},
+    {"route": "PUT /arena-predictions/{prediction_id}", "collection": "arena_predictions", "filter": {"id": ""}},
+    {"route": "GET /influence-entities?entity_type=", "collection": "influence_entities", "filter": {"entity_type": ""}},
+    {"route": "GET /influence-entities?is_suggested=", "collection": "influence_entities", "filter": {"is_suggested": True}},
+    {"route": "PUT /influence-entities/{entity_id}", "collection": "influence_entities", "filter": {"id": ""}},
+    {"route": "GET /earlyland-opportunities?category=&status=", "collection": "earlyland_opportunities", "filter": {"category": "", "status": ""}},
+    {"route": "GET /earlyland-opportunities?status=", "collection": "earlyland_opportunities", "filter": {"status": ""}},
+    {"route": "PUT /earlyland-opportunities/{opportunity_id}", "collection": "earlyland_opportunities", "filter": {"id": ""}},
+    {"route": "GET /wallet/check/{wallet_address}", "collection": "wallet_registrations", "filter": {"wallet_address": ""}},
+    {"route": "startup: seen analytics sessions", "collection": "analytics_events", "filter": {"event_type": "pageview", "timestamp": {"$gte": datetime.min}}},
+    {"route": "GET /analytics/stats", "collection": "analytics_events", "filter": {"timestamp": {"$gte": datetime.min, "$lte": datetime.max}}},
+    {"route": "GET /analytics/stats (rollups)", "collection": "analytics_rollups", "filter": {"granularity": "day", "bucket": {"$gte": datetime.min, "$lt": datetime.max}}},
+]
+
+async def ensure_indexes():
+    """Create all registered indexes. Existing identical indexes are left untouched."""
+    for collection_name, indexes in INDEX_REGISTRY.items():
+        try:
+            try:
+                names = await db[collection_name].create_indexes(indexes)
+            except OperationFailure as e:
+                if e.code not in INDEX_CONFLICT_CODES:
+                    raise
+                names = await reconcile_indexes(collection_name, indexes)
+            logger.info(f"Indexes ready on {collection_name}: {', '.join(names)}")
+        except Exception as e:
+            # e.g. duplicate ids in existing data or an index with conflicting options
+            logger.error(f"Could not create indexes on {collection_name}: {e}")
+
+async def reconcile_indexes(collection_name: str, indexes: List[IndexModel]) -> List[str]:
+    """
+    Update indexes whose options changed in the registry (e.g. a new TTL).
+    TTL values are changed in place with collMod, anything else is rebuilt.
+    """
+    collection = db[collection_name]
+    names = []
+    for index in indexes:
+        spec = index.document
+        try:
+            names += await collection.create_indexes([index])
+            continue
+        except OperationFailure as e:
+            if e.code not in INDEX_CONFLICT_CODES:
+                raise
+        
+        existing = await collection.index_information()
+        key = list(spec["key"].items())
+        current = next((name for name, info in existing.items() if info["key"] == key), spec["name"])
+        if "expireAfterSeconds" in spec and current in existing:
+            await db.command(
+                "collMod", collection_name,
+                index={"keyPattern": dict(spec["key"]), "expireAfterSeconds": spec["expireAfterSeconds"]}
+            )
+            names.append(current)
+        else:
+            await collection.drop_index(current)
+            names += await collection.create_indexes([index])
+        logger.info(f"Updated index {current} on {collection_name}")
+    return names
+
+def plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Flatten the stage names of an explain() plan tree"""
+    stages = [plan["stage"]] if "stage" in plan else []
+    for key in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(key), dict):
+            stages += plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += plan_stages(child)
+    return stages
+
+@api_router.get("/admin/index-report")
+async def get_index_report():
+    """
+    Explain every registered route query and flag those whose winning plan
+    still scans the whole collection (COLLSCAN).
+    """
+    queries = []
+    for query in ROUTE_QUERIES:
+        collection_name = query["collection"]
+        if collection_name == analytics_partitions.base_name:
+            collection_name = analytics_partitions.name_for(datetime.now(timezone.utc))
+        cursor = db[collection_name].find(query["filter"])
+        if query.get("sort"):
+            cursor = cursor.sort(query["sort"])
+        explain = await cursor.explain()
+        stages = plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        queries.append({
+            "route": query["route"],
+            "collection": collection_name,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    
+    indexes = {}
+    for collection_name in INDEX_REGISTRY:
+        info = await db[collection_name].index_information()
+        indexes[collection_name] = sorted(info)
     
-    updated = await collection.find_one({"id": current["id"]}, {"_id": 0})
-    return updated
+    return {
+        "queries": queries,
+        "collscans": [q["route"] for q in queries if q["collscan"]],
+        "indexes": indexes,
+    }
 
 
 # Include the router in the main app
@@ -3887,6 +6500,37 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_services():
+    geoip.open()
+    await ensure_indexes()
+    for ordered_collection in ordered_collections.values():
+        try:
+            await ordered_collection.backfill()
+        except Exception as e:
+            logger.error(f"Could not assign order keys in {ordered_collection.name}: {e}")
+    await invalidation_bus.start()
+    global analytics_migration_task
+    analytics_migration_task = asyncio.create_task(migrate_analytics_events())
+    await analytics_partitions.start()
+    try:
+        await seen_sessions.load()
+    except Exception as e:
+        logger.error(f"Could not load seen analytics sessions: {e}")
+    await analytics_buffer.start()
+    upstream_http.open()
+    await price_cache.start()
+    await market_indices_cache.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await invalidation_bus.stop()
+    if analytics_migration_task:
+        analytics_migration_task.cancel()
+    await analytics_partitions.stop()
+    await analytics_buffer.stop()
+    await price_cache.stop()
+    await market_indices_cache.stop()
+    await upstream_http.close()
+    geoip.close()
     client.close()
\ No newline at end of file
@@ -9111,26 +9111,17 @@ const MainSite = () => {
   useEffect(() => {
     const fetchAllData = async () => {
       try {
-        const [cardsRes, teamRes, platformRes, roadmapRes, partnersRes, footerRes, faqRes, communityRes, heroRes] = await Promise.all([
-          axios.get(`${API}/drawer-cards`),
-          axios.get(`${API}/team-members`),
-          axios.get(`${API}/platform-settings`),
-          axios.get(`${API}/roadmap`),
-          axios.get(`${API}/partners`),
-          axios.get(`${API}/footer-settings`),
-          axios.get(`${API}/faq`),
-          axios.get(`${API}/community-settings`),
-          axios.get(`${API}/hero-settings`)
-        ]);
-        setCards(cardsRes.data);
-        setTeam(teamRes.data);
-        setPlatformSettings(platformRes.data);
-        setRoadmapData(roadmapRes.data);
-        setPartnersData(partnersRes.data);
-        setFooterSettings(footerRes.data);
-        setFaqData(faqRes.data);
-        setCommunitySettings(communityRes.data);
-        setHeroSettings(heroRes.data);
+        // Single bundled request instead of one request per section
+        const { data } = await axios.get(`${API}/landing`);
+        setCards(data.drawer_cards);
+        setTeam(data.team_members);
+        setPlatformSettings(data.platform_settings);
+        setRoadmapData(data.roadmap);
+        setPartnersData(data.partners);
+        setFooterSettings(data.footer_settings);
+        setFaqData(data.faq);
+        setCommunitySettings(data.community_settings);
+        setHeroSettings(data.hero_settings);
       } catch (err) {
         console.error('Error fetching data:', err);
       }
@@ -23,6 +23,11 @@ export const api = axios.create({
  * API endpoints grouped by feature
  */
 export const endpoints = {
+  // Landing page bundle (all public sections in one request)
+  landing: {
+    get: () => api.get('/landing'),
+  },
+  
   // Drawer Cards
   drawerCards: {
     list: () => api.get('/drawer-cards'),
@@ -30,6 +35,7 @@ export const endpoints = {
     update: (id, data) => api.put(`/drawer-cards/${id}`, data),
     delete: (id) => api.delete(`/drawer-cards/${id}`),
     reorder: (data) => api.post('/drawer-cards/reorder', data),
+    move: (id, { afterId, beforeId }) => api.post(`/drawer-cards/${id}/move`, { after_id: afterId, before_id: beforeId }),
   },
   
   // Team Members
@@ -39,6 +45,7 @@ export const endpoints = {
     update: (id, data) => api.put(`/team-members/${id}`, data),
     delete: (id) => api.delete(`/team-members/${id}`),
     reorder: (data) => api.post('/team-members/reorder', data),
+    move: (id, { afterId, beforeId }) => api.post(`/team-members/${id}/move`, { after_id: afterId, before_id: beforeId }),
   },
   
   // Partners
@@ -48,6 +55,7 @@ export const endpoints = {
     update: (id, data) => api.put(`/partners/${id}`, data),
     delete: (id) => api.delete(`/partners/${id}`),
     reorder: (data) => api.post('/partners/reorder', data),
+    move: (id, { afterId, beforeId }) => api.post(`/partners/${id}/move`, { after_id: afterId, before_id: beforeId }),
     seedDefaults: () => api.post('/partners/seed-defaults'),
   },
   
@@ -67,6 +75,7 @@ export const endpoints = {
     create: (data) => api.post('/faq', data),
     update: (id, data) => api.put(`/faq/${id}`, data),
     delete: (id) => api.delete(`/faq/${id}`),
+    move: (id, { afterId, beforeId }) => api.post(`/faq/${id}/move`, { after_id: afterId, before_id: beforeId }),
   },
   
   // Settings
@@ -92,6 +101,12 @@ export const endpoints = {
   analytics: {
     stats: (period = 30) => api.get(`/analytics/stats?period=${period}`),
     track: (data) => api.post('/analytics/track', data),
+    trackBatch: (events) => api.post('/analytics/track/batch', events),
+    // Survives page unload; text/plain avoids a CORS preflight
+    beacon: (events) => navigator.sendBeacon(
+      `${API_BASE}/analytics/track/batch`,
+      new Blob([JSON.stringify(events)], { type: 'text/plain' })
+    ),
   },
   
   // Admin
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+FOMO Platform - Index Usage Report
+This script asks the API to explain every registered route query and lists
+the queries that still scan whole collections (COLLSCAN).
+Run this after adding a new query or changing the index registry.
+
+Usage: python check_indexes.py
+
+Exits with status 1 when any COLLSCAN is found.
+"""
+
+import os
+import sys
+import httpx
+import asyncio
+
+# Configuration
+API_URL = os.environ.get("API_URL", "http://localhost:8001/api")
+
+async def main():
+    print("=" * 60)
+    print("🔎 FOMO Platform - Index Usage Report")
+    print("=" * 60)
+
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        try:
+            response = await client.get(f"{API_URL}/admin/index-report")
+            response.raise_for_status()
+        except Exception as e:
+            print(f"\n❌ Could not get index report from {API_URL}")
+            print(f"   Error: {e}")
+            return 2
+
+    report = response.json()
+
+    print("\n📦 Indexes:")
+    for collection, indexes in report["indexes"].items():
+        print(f"   {collection}: {', '.join(indexes)}")
+
+    print("\n📋 Route queries:")
+    for query in report["queries"]:
+        mark = "❌" if query["collscan"] else "✅"
+        print(f"   {mark} {query['route']} -> {' > '.join(query['stages'])}")
+
+    print("\n" + "=" * 60)
+    if report["collscans"]:
+        print(f"⚠️  {len(report['collscans'])} queries scan a whole collection:")
+        for route in report["collscans"]:
+            print(f"   - {route}")
+        return 1
+
+    print("✅ Every route query uses an index")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
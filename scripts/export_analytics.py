@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+FOMO Platform - Analytics Export
+This script downloads one UTC day of raw analytics events as gzipped NDJSON,
+streaming it straight to disk. Meant to be run nightly (e.g. from cron) to
+feed the data warehouse.
+
+Usage: python export_analytics.py [YYYY-MM-DD] [OUTPUT_DIR]
+
+YYYY-MM-DD - day to export (default: yesterday)
+OUTPUT_DIR - where to write the file (default: current directory)
+
+The export is admin only: set ADMIN_PASSWORD to the backend's admin password.
+Visitor IP addresses are not included.
+"""
+
+import os
+import sys
+import httpx
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+# Configuration
+API_URL = os.environ.get("API_URL", "http://localhost:8001/api")
+ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "admin123")
+
+async def main(day: date, output_dir: str):
+    print("=" * 60)
+    print("📤 FOMO Platform - Analytics Export")
+    print("=" * 60)
+
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    params = {
+        "from": start.isoformat(),
+        "to": (start + timedelta(days=1)).isoformat(),
+        "format": "ndjson",
+        "gzip": "true",
+    }
+    path = os.path.join(output_dir, f"analytics_{day:%Y-%m-%d}.ndjson.gz")
+    print(f"\n⏳ Exporting {day} to {path}...")
+
+    try:
+        async with httpx.AsyncClient(timeout=None) as client:
+            login = await client.post(f"{API_URL}/admin/login", json={"password": ADMIN_PASSWORD})
+            login.raise_for_status()
+            headers = {"Authorization": f"Bearer {login.json()['token']}"}
+            async with client.stream(
+                "GET", f"{API_URL}/admin/analytics/export", params=params, headers=headers
+            ) as response:
+                response.raise_for_status()
+                with open(path, "wb") as f:
+                    async for chunk in response.aiter_raw():
+                        f.write(chunk)
+    except Exception as e:
+        print(f"\n❌ Export from {API_URL} failed")
+        print(f"   Error: {e}")
+        return 1
+
+    print(f"\n✅ Done: {os.path.getsize(path)} bytes")
+    return 0
+
+if __name__ == "__main__":
+    day = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else date.today() - timedelta(days=1)
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else "."
+    sys.exit(asyncio.run(main(day, output_dir)))
@@ -200,6 +200,15 @@ If you have questions about these Terms, please contact us through the informati
 © FOMO, 2025"""
 
 
+async def publish_version(db):
+    """Bump the collection version the API builds ETags from, so clients refetch the new settings."""
+    await db.cache_versions.update_one(
+        {"_id": "cookie_consent_settings"},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+
+
 async def init_cookie_consent_settings(force_update: bool = False):
     """
     Initialize cookie consent settings with default policies.
@@ -254,6 +263,7 @@ async def init_cookie_consent_settings(force_update: bool = False):
                     }
                 }
             )
+            await publish_version(db)
             print(f"\n✅ Updated {result.modified_count} document(s)")
         else:
             print("\n⏭️  Skipping update")
@@ -273,6 +283,7 @@ async def init_cookie_consent_settings(force_update: bool = False):
     }
     
     await collection.insert_one(new_settings)
+    await publish_version(db)
     
     print("\n" + "=" * 60)
     print("✅ Cookie consent settings initialized successfully!")
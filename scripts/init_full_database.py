@@ -116,6 +116,16 @@ async def init_collection(db, collection_name, data, reset=False):
         return False
 
 
+async def publish_versions(db, collection_names):
+    """Bump the collection versions the API builds ETags from, so clients refetch the seeded content."""
+    for collection_name in collection_names:
+        await db.cache_versions.update_one(
+            {"_id": collection_name},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+
+
 async def init_database(reset=False):
     """Initialize all database collections."""
     mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
@@ -160,6 +170,7 @@ async def init_database(reset=False):
     
     initialized = 0
     skipped = 0
+    changed = []
     
     for coll_name in collection_order:
         data = seed_data.get(coll_name, [])
@@ -168,6 +179,10 @@ async def init_database(reset=False):
             initialized += 1
         else:
             skipped += 1
+        if result or reset:
+            changed.append(coll_name)
+    
+    await publish_versions(db, changed)
     
     print("-" * 40)
     print(f"\n📊 Summary:")
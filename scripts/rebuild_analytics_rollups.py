@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+FOMO Platform - Analytics Rollup Rebuild
+This script asks the API to recompute the hourly/daily analytics rollups
+from the raw events. Run it once after upgrading to rollup-based stats, or
+whenever the counters look off (e.g. after a failed rollup write).
+
+Usage: python rebuild_analytics_rollups.py [DAYS]
+
+DAYS - how many full days before today to rebuild (default: 90)
+"""
+
+import os
+import sys
+import httpx
+import asyncio
+
+# Configuration
+API_URL = os.environ.get("API_URL", "http://localhost:8001/api")
+
+async def main(days: int):
+    print("=" * 60)
+    print("📊 FOMO Platform - Analytics Rollup Rebuild")
+    print("=" * 60)
+    print(f"\n⏳ Rebuilding the last {days} days...")
+
+    async with httpx.AsyncClient(timeout=None) as client:
+        try:
+            response = await client.post(
+                f"{API_URL}/admin/analytics/rollups/rebuild",
+                params={"days": days}
+            )
+            response.raise_for_status()
+        except Exception as e:
+            print(f"\n❌ Could not rebuild rollups via {API_URL}")
+            print(f"   Error: {e}")
+            return 1
+
+    result = response.json()
+    print(f"\n✅ Rebuilt {result['start']} - {result['end']}")
+    print(f"   Events processed: {result['events']}")
+    return 0
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 90
+    sys.exit(asyncio.run(main(days)))
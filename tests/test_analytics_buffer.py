@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock_motor.AsyncMongoMockClient()["fomo_test"]
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+def events(count):
+    timestamp = datetime(2026, 1, 5, tzinfo=timezone.utc)
+    return [
+        {"id": f"event-{i}", "event_type": "pageview", "session_id": "session", "timestamp": timestamp}
+        for i in range(count)
+    ]
+
+
+def test_stop_writes_buffered_events(db):
+    buffer = server.AnalyticsBuffer(max_events=100, batch_size=10, flush_interval=60)
+
+    async def run():
+        await buffer.start()
+        await buffer.submit(events(5))
+        await buffer.stop()
+        return await db[server.analytics_partitions.base_name].count_documents({})
+
+    assert asyncio.run(run()) == 5
+    assert len(buffer) == 0
+
+
+def test_cancelled_flush_keeps_the_batch(db, monkeypatch):
+    buffer = server.AnalyticsBuffer(max_events=100, batch_size=10, flush_interval=60)
+    inserting = asyncio.Event()
+
+    class SlowCollection:
+        async def insert_many(self, docs, ordered=True):
+            inserting.set()
+            await asyncio.sleep(60)
+
+    async def collection_for_write(name):
+        return SlowCollection()
+
+    monkeypatch.setattr(server.analytics_partitions, "collection_for_write", collection_for_write)
+
+    async def run():
+        await buffer.submit(events(5))
+        task = asyncio.create_task(buffer.flush())
+        await inserting.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert len(buffer) == 5
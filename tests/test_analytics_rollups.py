@@ -0,0 +1,49 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock_motor.AsyncMongoMockClient()["fomo_test"]
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+def sketch_count(bucket):
+    sketch = server.HyperLogLog()
+    sketch.merge(bucket.get("sessions_hll", {}))
+    return sketch.count()
+
+
+def test_rebuild_restores_session_sketches(db):
+    day = datetime(2026, 1, 5, tzinfo=timezone.utc)
+    events = [
+        {
+            "id": f"event-{i}",
+            "event_type": "pageview",
+            "session_id": f"session-{i % 40}",
+            "timestamp": day + timedelta(hours=i % 24, minutes=i % 60),
+        }
+        for i in range(200)
+    ]
+    
+    async def run():
+        await db.analytics_events.insert_many(events)
+        rebuilt = await server.analytics_rollups.rebuild(day, day + timedelta(days=1))
+        hourly = await db.analytics_rollups.find(
+            {"granularity": "hour", "bucket": day + timedelta(hours=3)}
+        ).to_list(None)
+        buckets = await server.analytics_rollups.load(day, day + timedelta(days=1))
+        return rebuilt, hourly, server.AnalyticsRollups.merge(buckets)
+    
+    rebuilt, hourly, totals = asyncio.run(run())
+    assert rebuilt == 200
+    assert sketch_count(hourly[0]) > 0
+    assert totals["events"] == 200
+    assert totals["sessions"].count() == 40
@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock_motor.AsyncMongoMockClient()["fomo_test"]
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+def test_unpublished_write_bumps_version_once(db):
+    bus = server.CacheInvalidationBus(["faq_items"])
+    written_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+    async def run():
+        await db.cache_versions.insert_one(
+            {"_id": "faq_items", "version": 3, "updated_at": written_at - timedelta(hours=1)}
+        )
+        # Every worker sees the same change; only the first one bumps
+        for _ in range(3):
+            await bus._bump_unpublished("faq_items", written_at)
+        return await db.cache_versions.find_one({"_id": "faq_items"})
+
+    assert asyncio.run(run())["version"] == 4
+
+
+def test_published_write_is_not_bumped_again(db):
+    bus = server.CacheInvalidationBus(["faq_items"])
+    written_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+    async def run():
+        await bus.publish("faq_items")
+        await bus._bump_unpublished("faq_items", written_at)
+        return await db.cache_versions.find_one({"_id": "faq_items"})
+
+    assert asyncio.run(run())["version"] == 1
+
+
+def test_unpublished_write_creates_version(db):
+    bus = server.CacheInvalidationBus(["faq_items"])
+
+    async def run():
+        await bus._bump_unpublished("faq_items", datetime.now(timezone.utc))
+        return await db.cache_versions.find_one({"_id": "faq_items"})
+
+    assert asyncio.run(run())["version"] == 1
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from server import hedged
+
+
+def provider(log, name, delay, fails=False):
+    async def call():
+        log.append(("start", name))
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            log.append(("cancelled", name))
+            raise
+        if fails:
+            raise RuntimeError(f"{name} failed")
+        return name
+    return name, call
+
+
+def test_hedge_uses_first_provider_when_fast():
+    log = []
+    result = asyncio.run(hedged([provider(log, "a", 0.01), provider(log, "b", 0.01)], delay=0.5))
+    assert result == ("a", "a")
+    assert log == [("start", "a")]
+
+
+def test_hedge_starts_next_after_delay_and_cancels_loser():
+    log = []
+    
+    async def run():
+        result = await hedged([provider(log, "a", 1.0), provider(log, "b", 0.01)], delay=0.05)
+        await asyncio.sleep(0)
+        return result
+    
+    assert asyncio.run(run()) == ("b", "b")
+    assert log == [("start", "a"), ("start", "b"), ("cancelled", "a")]
+
+
+def test_hedge_moves_on_right_after_failure():
+    log = []
+    
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await hedged([provider(log, "a", 0, fails=True), provider(log, "b", 0.01)], delay=5)
+        return result, loop.time() - started
+    
+    result, elapsed = asyncio.run(run())
+    assert result == ("b", "b")
+    assert elapsed < 1
+
+
+def test_hedge_raises_when_all_fail():
+    log = []
+    with pytest.raises(Exception, match="All price APIs failed"):
+        asyncio.run(hedged([provider(log, "a", 0, fails=True), provider(log, "b", 0, fails=True)], delay=0.05))
@@ -0,0 +1,43 @@
+import pytest
+
+from server import HyperLogLog
+
+
+def sketch(values):
+    hll = HyperLogLog()
+    for value in values:
+        hll.add(value)
+    return hll
+
+
+def test_empty_sketch_counts_zero():
+    assert HyperLogLog().count() == 0
+
+
+def test_duplicates_are_counted_once():
+    assert sketch(["session-1"] * 100 + ["session-2"] * 50).count() == 2
+
+
+@pytest.mark.parametrize("n", [100, 1000, 10000, 50000])
+def test_estimate_error(n):
+    # Standard error is about 1.6%; allow four of them
+    estimate = sketch(f"session-{i}" for i in range(n)).count()
+    assert abs(estimate - n) / n < 0.065
+
+
+def test_merge_counts_the_union():
+    a = sketch(f"session-{i}" for i in range(0, 6000))
+    b = sketch(f"session-{i}" for i in range(4000, 10000))
+    merged = HyperLogLog()
+    merged.merge(a.registers)
+    merged.merge(b.registers)
+    assert merged.registers == sketch(f"session-{i}" for i in range(10000)).registers
+    assert abs(merged.count() - 10000) / 10000 < 0.065
+
+
+def test_merge_accepts_registers_stored_in_mongo():
+    # Bucket documents key the registers by string index
+    hll = sketch(["a", "b", "c"])
+    merged = HyperLogLog()
+    merged.merge({str(index): rank for index, rank in hll.registers.items()})
+    assert merged.registers == hll.registers
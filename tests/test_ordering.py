@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from server import order_key_between, order_key_sequence, assign_order_keys, ORDER_KEY
+
+
+def test_key_between_sorts_between_neighbours():
+    assert "a" < order_key_between("a", "b") < "b"
+    assert order_key_between(None, "1") < "1"
+    assert order_key_between("z", None) > "z"
+    assert order_key_between(None, None)
+
+
+def test_key_between_rejects_unordered_neighbours():
+    with pytest.raises(ValueError):
+        order_key_between("b", "a")
+    with pytest.raises(ValueError):
+        order_key_between("a", "a")
+
+
+@pytest.mark.parametrize("where", ["front", "back", "middle"])
+def test_repeated_inserts_stay_ordered_and_unique(where):
+    keys = order_key_sequence(3)
+    for _ in range(300):
+        if where == "front":
+            keys.insert(0, order_key_between(None, keys[0]))
+        elif where == "back":
+            keys.append(order_key_between(keys[-1], None))
+        else:
+            middle = len(keys) // 2
+            keys.insert(middle, order_key_between(keys[middle - 1], keys[middle]))
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+
+
+def test_random_inserts_stay_ordered_and_unique():
+    rng = random.Random(7)
+    keys = []
+    for _ in range(500):
+        position = rng.randint(0, len(keys))
+        before = keys[position - 1] if position > 0 else None
+        after = keys[position] if position < len(keys) else None
+        keys.insert(position, order_key_between(before, after))
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+
+
+def test_keys_never_end_with_zero_digit():
+    # A trailing zero would make the key equal in position to its prefix
+    keys = order_key_sequence(50)
+    for _ in range(100):
+        keys.insert(0, order_key_between(None, keys[0]))
+    assert not any(key.endswith("0") for key in keys)
+
+
+@pytest.mark.parametrize("count", [1, 2, 35, 36, 1000])
+def test_sequence_is_strictly_increasing(count):
+    keys = order_key_sequence(count)
+    assert len(keys) == count
+    assert all(a < b for a, b in zip(keys, keys[1:]))
+
+
+def test_assign_order_keys_follows_integer_order():
+    items = [{"id": "c", "order": 2}, {"id": "a", "order": 0}, {"id": "b", "order": 1}]
+    assign_order_keys(items)
+    assert [item["id"] for item in sorted(items, key=lambda item: item[ORDER_KEY])] == ["a", "b", "c"]
@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+import server
+from server import CircuitBreaker, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(server.time, "monotonic", clock)
+    return clock
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(threshold=3, open_seconds=60)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.failure()
+    assert breaker.state == "closed"
+    breaker.failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(threshold=3, open_seconds=60)
+    breaker.failure()
+    breaker.failure()
+    breaker.success()
+    breaker.failure()
+    assert breaker.state == "closed"
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(threshold=1, open_seconds=60)
+    breaker.failure()
+    clock.now += 60
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_probe_success_closes(clock):
+    breaker = CircuitBreaker(threshold=1, open_seconds=60)
+    breaker.failure()
+    clock.now += 60
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_probe_failure_reopens(clock):
+    breaker = CircuitBreaker(threshold=3, open_seconds=60)
+    for _ in range(3):
+        breaker.failure()
+    clock.now += 60
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open"
+    clock.now += 59
+    assert not breaker.allow()
+
+
+def test_cancelled_probe_frees_the_slot(clock):
+    breaker = CircuitBreaker(threshold=1, open_seconds=60)
+    breaker.failure()
+    clock.now += 60
+    assert breaker.allow()
+    breaker.cancelled()
+    assert breaker.allow()
+
+
+def test_token_bucket_refills_over_time(clock):
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.take(60)
+    assert not bucket.take()
+    clock.now += 1
+    assert bucket.take()
+    assert not bucket.take()
+    clock.now += 10
+    assert bucket.take(10)
+    assert not bucket.take()
+
+
+def test_token_bucket_holds_at_most_a_minute(clock):
+    bucket = TokenBucket(per_minute=6)
+    clock.now += 3600
+    assert bucket.take(6)
+    assert not bucket.take()
+
+
+def test_provider_losing_hedges_moves_behind_the_faster_one():
+    providers = server.PriceProviders()
+    
+    async def slow(symbols):
+        await asyncio.sleep(1)
+        return {"BTC": {"price": 1, "change_24h": 0, "market_cap": None}}
+    
+    async def fast(symbols):
+        await asyncio.sleep(0.03)
+        return {"BTC": {"price": 2, "change_24h": 0, "market_cap": None}}
+    
+    slow_provider = providers.register(server.PriceProvider("slow", slow, 1000))
+    fast_provider = providers.register(server.PriceProvider("fast", fast, 1000))
+    # Both priors are below the fast provider's latency, so the slow one is only
+    # moved back by the time it spent before being cancelled
+    slow_provider.latency = fast_provider.latency = 0.01
+    
+    async def run():
+        for _ in range(30):
+            assert (await providers.quotes(["BTC"], hedge_delay=0.02))[0] == "fast"
+    
+    asyncio.run(run())
+    assert slow_provider.stats["cancelled"] > 0
+    assert [provider.name for provider in providers.ordered()] == ["fast", "slow"]
+
+
+def test_failures_update_latency():
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("boom")
+    
+    provider = server.PriceProvider("p", None, 1000)
+    provider.latency = 0.001
+    with pytest.raises(RuntimeError):
+        asyncio.run(provider.call(failing))
+    assert provider.latency > 0.001